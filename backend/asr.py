@@ -1,75 +1,285 @@
 """
 Audio processing, VAD, and Whisper transcription.
 """
+import asyncio
+import functools
+import random
 import tempfile
 import subprocess
 import numpy as np
 import shutil
 import logging
-from faster_whisper import WhisperModel
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from settings import settings
+from utils.metrics import registry, ERRORS, RATIO_BUCKETS
+from utils.tracing import tracer
+from utils.admission import admission
+from utils.cpu_layout import plan_layout, pinned_threads
+from utils.calibration import resolve_cpu_config, word_error_rate
 
-# Initialize Whisper model once at module load with GPU/CPU fallback
-def initialize_whisper_model():
-    """Initialize Whisper model with automatic GPU/CPU fallback."""
+logger = logging.getLogger(__name__)
+
+DECODE_SECONDS = registry.histogram(
+    "captiflo_decode_seconds", "Time spent decoding WebM/Ogg to PCM16 with ffmpeg"
+)
+VAD_SECONDS = registry.histogram(
+    "captiflo_vad_seconds", "Time spent in the energy-gate VAD"
+)
+VAD_KEPT_RATIO = registry.histogram(
+    "captiflo_vad_kept_ratio", "Fraction of audio frames kept by the VAD", buckets=RATIO_BUCKETS
+)
+INFERENCE_SECONDS = registry.histogram(
+    "captiflo_inference_seconds", "Whisper transcription time per chunk", ["profile"]
+)
+INFERENCE_RTF = registry.histogram(
+    "captiflo_inference_rtf", "Whisper real-time factor (inference time / audio time)", ["profile"],
+    buckets=RATIO_BUCKETS
+)
+LANGID_SECONDS = registry.histogram(
+    "captiflo_langid_seconds", "Time spent detecting the language of lang=auto sessions"
+)
+# Per class mode and model, to compare routed checkpoints against the default on live traffic
+MODE_INFERENCE_SECONDS = registry.histogram(
+    "captiflo_mode_inference_seconds", "Whisper transcription time per chunk by class mode and model",
+    ["mode", "model"]
+)
+MODE_INFERENCE_RTF = registry.histogram(
+    "captiflo_mode_inference_rtf", "Whisper real-time factor by class mode and model", ["mode", "model"],
+    buckets=RATIO_BUCKETS
+)
+DRAFT_DECODES = registry.counter(
+    "captiflo_draft_decodes_total", "Draft-model decodes kept (accepted) or redone by the full model (redecoded)",
+    ["profile", "outcome"]
+)
+DRAFT_WER = registry.histogram(
+    "captiflo_draft_wer", "Word error rate of accepted drafts against the full model (sampled audits)", ["profile"],
+    buckets=RATIO_BUCKETS
+)
+INFERENCE_BACKLOG = registry.gauge(
+    "captiflo_inference_inflight", "Transcriptions currently running or waiting for the model"
+)
+
+# Whisper model with GPU/CPU fallback, loaded on first use (or by the startup preload)
+def initialize_whisper_model(model_name: Optional[str] = None):
+    """
+    Initialize Whisper model with automatic GPU/CPU fallback.
+
+    Args:
+        model_name: Checkpoint to load; None for the default model (WHISPER_MODEL,
+            or the calibrated one on CPU)
+    """
+    global model_layout
+    from faster_whisper import WhisperModel  # heavy (ctranslate2, tokenizers) - only imported when needed
     device = settings.WHISPER_DEVICE
+    gpu_model = model_name or settings.WHISPER_MODEL
+    layout = plan_layout()
+    model_layout = layout
+    # Admission sizes inference capacity by how many transcriptions can actually run at once
+    admission.inference_parallelism = layout.num_workers
+
+    def load_cpu():
+        cpu_model, cpu_compute_type, cpu_source = resolve_cpu_config()
+        # A routed checkpoint keeps its name; the calibrated compute type still applies
+        cpu_model = model_name or cpu_model
+        cpu_configs[model_name] = {"model": cpu_model, "compute_type": cpu_compute_type, "source": cpu_source}
+        # CTranslate2 starts its worker threads in the constructor, so they inherit the pinning
+        with pinned_threads(layout.inference_cpus, layout.pinned):
+            model = WhisperModel(
+                cpu_model,
+                device="cpu",
+                compute_type=cpu_compute_type,
+                cpu_threads=layout.cpu_threads,
+                num_workers=layout.num_workers
+            )
+        logger.info("Whisper model loaded on CPU", extra={
+            "stage": "whisper_load", "model": cpu_model, "compute_type": cpu_compute_type, "config_source": cpu_source,
+            "num_workers": layout.num_workers, "cpu_threads": layout.cpu_threads,
+            "usable_cores": layout.physical_cores - layout.reserved_cores, "physical_cores": layout.physical_cores,
+            "layout_source": layout.source, "pinned": layout.pinned})
+        return model
     
     if device == "auto":
         # Try CUDA first, fallback to CPU
         try:
             import torch
             if torch.cuda.is_available():
-                logging.info("CUDA detected, attempting to load Whisper model on GPU...")
+                logger.info("CUDA detected, attempting to load Whisper model on GPU...")
                 model = WhisperModel(
-                    settings.WHISPER_MODEL, 
+                    gpu_model, 
                     device="cuda", 
-                    compute_type=settings.WHISPER_COMPUTE_TYPE_CUDA
+                    compute_type=settings.WHISPER_COMPUTE_TYPE_CUDA,
+                    num_workers=layout.num_workers
                 )
-                logging.info(f"Whisper model '{settings.WHISPER_MODEL}' loaded successfully on GPU")
+                logger.info("Whisper model loaded on GPU", extra={"stage": "whisper_load", "model": gpu_model})
                 return model
             else:
-                logging.info("CUDA not available, loading Whisper model on CPU...")
+                logger.info("CUDA not available, loading Whisper model on CPU...")
         except Exception as e:
-            logging.warning(f"Failed to load Whisper model on GPU: {e}. Falling back to CPU...")
+            logger.warning("Failed to load Whisper model on GPU, falling back to CPU",
+                           extra={"stage": "whisper_load", "model": gpu_model, "error": str(e)})
         
         # Fallback to CPU
-        model = WhisperModel(
-            settings.WHISPER_MODEL, 
-            device="cpu", 
-            compute_type=settings.WHISPER_COMPUTE_TYPE_CPU
-        )
-        logging.info(f"Whisper model '{settings.WHISPER_MODEL}' loaded successfully on CPU")
-        return model
+        return load_cpu()
     
     elif device == "cuda":
         try:
             model = WhisperModel(
-                settings.WHISPER_MODEL, 
+                gpu_model, 
                 device="cuda", 
-                compute_type=settings.WHISPER_COMPUTE_TYPE_CUDA
+                compute_type=settings.WHISPER_COMPUTE_TYPE_CUDA,
+                num_workers=layout.num_workers
             )
-            logging.info(f"Whisper model '{settings.WHISPER_MODEL}' loaded successfully on GPU")
+            logger.info("Whisper model loaded on GPU", extra={"stage": "whisper_load", "model": gpu_model})
             return model
         except Exception as e:
-            logging.warning(f"Failed to load Whisper model on GPU: {e}. Falling back to CPU...")
-            model = WhisperModel(
-                settings.WHISPER_MODEL, 
-                device="cpu", 
-                compute_type=settings.WHISPER_COMPUTE_TYPE_CPU
-            )
-            logging.info(f"Whisper model '{settings.WHISPER_MODEL}' loaded successfully on CPU (fallback)")
-            return model
+            logger.warning("Failed to load Whisper model on GPU, falling back to CPU",
+                           extra={"stage": "whisper_load", "model": gpu_model, "error": str(e)})
+            return load_cpu()
     
     else:  # device == "cpu"
-        model = WhisperModel(
-            settings.WHISPER_MODEL, 
-            device="cpu", 
-            compute_type=settings.WHISPER_COMPUTE_TYPE_CPU
+        return load_cpu()
+
+# Loaded models by route name (None = the default model), shared by every session
+_models = {}
+_model_lock = threading.Lock()
+model_layout = None  # CpuLayout the models were built with
+cpu_configs = {}     # route name -> CPU model/compute type and where they came from (settings or calibration)
+
+def english_only(model_name: str) -> bool:
+    """Distilled (distil-large-v3, distil-small.en, ...) and *.en checkpoints only transcribe English."""
+    name = model_name.rsplit("/", 1)[-1].lower()  # also Hugging Face ids like Systran/faster-distil-whisper-large-v3
+    return name.endswith(".en") or "distil" in name
+
+def model_route(language: Optional[str]) -> Optional[str]:
+    """
+    Checkpoint for a Whisper language code from WHISPER_MODEL_ROUTES, or None
+    for the default model. Routes naming WHISPER_MODEL share the default, and
+    English-only checkpoints are never used for other languages.
+    """
+    name = settings.WHISPER_MODEL_ROUTES.get(language) if language else None
+    if name == settings.WHISPER_MODEL or (name and english_only(name) and language != "en"):
+        return None
+    return name
+
+def load_model(name: Optional[str] = None):
+    """The shared model for a route name (None = default), loaded once on first call."""
+    model = _models.get(name)
+    if model is None:
+        with _model_lock:
+            model = _models.get(name)
+            if model is None:
+                from utils.startup import startup_report
+                with startup_report.phase("whisper_model" if name is None else f"whisper_model:{name}"):
+                    model = initialize_whisper_model(name)
+                if name is None and english_only(settings.WHISPER_MODEL):
+                    logger.warning("WHISPER_MODEL is English-only; non-English modes and language "
+                                   "detection need a multilingual model",
+                                   extra={"stage": "whisper_load", "model": settings.WHISPER_MODEL})
+                _models[name] = model
+    return model
+
+def get_model(language: Optional[str] = None):
+    """
+    The shared Whisper model for ``language``.
+
+    Args:
+        language: Whisper language code the audio will be decoded as (None = default model)
+    """
+    return load_model(model_route(language))
+
+def draft_route(language: Optional[str]) -> Optional[str]:
+    """
+    Draft model name for ``language``, or None when drafting can't help: no
+    WHISPER_DRAFT_MODEL, the draft is the model it would verify against, or an
+    English-only draft for other (or undetected) languages.
+    """
+    name = settings.WHISPER_DRAFT_MODEL
+    target = model_route(language) or settings.WHISPER_MODEL
+    if not name or name == target or (english_only(name) and language != "en"):
+        return None
+    return None if name == settings.WHISPER_MODEL else name
+
+def draft_confident(segments: list) -> bool:
+    """A draft is kept only if every segment is confident and not a repetition loop."""
+    return bool(segments) and all(
+        getattr(segment, "avg_logprob", 0.0) >= settings.WHISPER_DRAFT_MIN_LOGPROB
+        and getattr(segment, "compression_ratio", 0.0) <= settings.WHISPER_DRAFT_MAX_COMPRESSION
+        for segment in segments
+    )
+
+# Accepted drafts sampled for a full-model audit are decoded here, in the
+# background; audits beyond the free slots are skipped rather than queued
+_audit_pool: Optional[ThreadPoolExecutor] = None
+_audit_slots = threading.BoundedSemaphore(4)
+
+def draft_audit_pool() -> ThreadPoolExecutor:
+    global _audit_pool
+    with _pool_lock:
+        if _audit_pool is None:
+            _audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="draft-audit")
+        return _audit_pool
+
+def audit_draft(audio: np.ndarray, language: Optional[str], options: dict, draft_text: str, profile: str):
+    """Decode an accepted draft's audio with the full model and record the draft's WER against it."""
+    try:
+        segments, _ = get_model(language).transcribe(
+            audio,
+            language=language,
+            vad_filter=False,
+            condition_on_previous_text=False,
+            **options
         )
-        logging.info(f"Whisper model '{settings.WHISPER_MODEL}' loaded successfully on CPU")
-        return model
+        DRAFT_WER.labels(profile=profile).observe(word_error_rate(segments_text(list(segments)), draft_text))
+    except Exception as e:
+        logger.warning("Draft audit failed", extra={"stage": "draft_audit", "profile": profile, "error": str(e)})
+    finally:
+        _audit_slots.release()
+
+def maybe_audit_draft(audio: np.ndarray, language: Optional[str], options: dict, drafted: list, profile: str):
+    """Queue a WHISPER_DRAFT_AUDIT_RATE sample of accepted drafts for audit_draft()."""
+    rate = settings.WHISPER_DRAFT_AUDIT_RATE
+    if rate <= 0 or random.random() >= rate or not _audit_slots.acquire(blocking=False):
+        return
+    try:
+        draft_audit_pool().submit(audit_draft, audio, language, options, segments_text(drafted), profile)
+    except RuntimeError:  # pool shut down
+        _audit_slots.release()
 
-model = initialize_whisper_model()
+def preload_models():
+    """Load the default model, every routed one and the draft model if drafting is on (startup preload)."""
+    get_model()
+    for language in settings.WHISPER_MODEL_ROUTES:
+        get_model(language)
+    if settings.WHISPER_DRAFT_PROFILES and settings.WHISPER_DRAFT_MODEL:
+        draft = draft_route("en") or draft_route(None)
+        if draft:
+            load_model(draft)
+
+def loaded_models() -> dict:
+    """Route name -> checkpoint for every loaded model."""
+    return {name or "default": cpu_configs.get(name, {}).get("model", name or settings.WHISPER_MODEL)
+            for name in _models}
+
+# Live transcriptions run here, one thread per Whisper worker: the event loop
+# stays free, and chunks beyond what the model can run at once wait in the queue
+_inference_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def inference_pool() -> ThreadPoolExecutor:
+    global _inference_pool
+    with _pool_lock:
+        if _inference_pool is None:
+            _inference_pool = ThreadPoolExecutor(max_workers=plan_layout().num_workers,
+                                                 thread_name_prefix="inference")
+        return _inference_pool
+
+async def run_inference(func, *args, **kwargs):
+    """Run a blocking VAD/transcription call on the inference pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_pool(), functools.partial(func, *args, **kwargs))
 
 class FFmpegMissing(Exception):
     """Custom exception for missing FFmpeg."""
@@ -157,7 +367,8 @@ def webm_to_pcm16(buffer: bytes) -> bytes:
         ]
         
         try:
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            with DECODE_SECONDS.time():
+                result = subprocess.run(cmd, check=True, capture_output=True, text=True)
             # Read the output file
             with open(fout.name, 'rb') as f:
                 return f.read()
@@ -175,6 +386,123 @@ def webm_to_pcm16(buffer: bytes) -> bytes:
         if fout and os.path.exists(fout.name):
             os.unlink(fout.name)
 
+class DurationExceeded(ValueError):
+    """Decoded audio ran past the allowed duration."""
+    pass
+
+class PCMStreamDecoder:
+    """
+    ffmpeg decoding an upload while it is still arriving: compressed bytes are
+    written to its stdin as they come off the socket, and 16kHz mono s16le PCM
+    is read from its stdout. Writes block when ffmpeg is behind, which keeps
+    per-request memory down to the pipe buffers.
+    """
+    def __init__(self):
+        try:
+            ffmpeg_path = find_ffmpeg()
+        except FFmpegMissing as e:
+            raise FileNotFoundError("ffmpeg_missing") from e
+
+        cmd = [
+            ffmpeg_path, "-hide_banner", "-loglevel", "error",
+            # Small probe so PCM starts flowing after the first cluster, not after 5 MB
+            "-probesize", "32768", "-analyzeduration", "1000000",
+            "-i", "pipe:0",
+            "-ar", "16000",  # 16kHz sample rate
+            "-ac", "1",      # mono
+            "-f", "s16le",   # signed 16-bit little endian
+            "pipe:1"
+        ]
+        # stderr goes to a temp file so a chatty ffmpeg can't fill the pipe and stall
+        self._stderr = tempfile.TemporaryFile()
+        self.started = time.perf_counter()
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr)
+        except FileNotFoundError as e:
+            self._stderr.close()
+            raise FileNotFoundError("ffmpeg_missing") from e
+
+    def feed(self, data: bytes):
+        """Write compressed bytes; raises BrokenPipeError if ffmpeg has stopped."""
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def finish_input(self):
+        """Signal the end of the upload."""
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def read(self, size: int) -> bytes:
+        """Read up to ``size`` bytes of PCM; b"" once ffmpeg is done."""
+        return self.proc.stdout.read(size)
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+
+    def close(self):
+        """Wait for ffmpeg and raise CalledProcessError if the decode failed."""
+        self.finish_input()
+        try:
+            returncode = self.proc.wait()
+            DECODE_SECONDS.observe(time.perf_counter() - self.started)
+            if returncode != 0:
+                self._stderr.seek(0)
+                stderr = self._stderr.read().decode("utf-8", errors="replace")
+                error_detail = f"FFmpeg decode failed: {stderr[:200] if stderr else returncode}"
+                raise subprocess.CalledProcessError(returncode, "ffmpeg", error_detail)
+        finally:
+            self.proc.stdout.close()
+            self._stderr.close()
+
+def split_at_pauses(read, segment_secs: float = 10.0, max_secs: float = 20.0, sensitivity: int = 1):
+    """
+    Cut a PCM stream into pieces at quiet 30ms frames as it is read, so each
+    piece can be transcribed while the rest is still being decoded.
+
+    Args:
+        read: Callable returning up to n bytes of 16kHz mono s16le PCM (b"" at the end)
+        segment_secs: Pieces are cut at the last pause after this much audio
+        max_secs: Hard cut (at the quietest frame) when no pause is found
+        sensitivity: VAD level whose threshold counts as a pause
+
+    Yields:
+        (offset seconds, PCM piece); pieces are cut on 30ms frame boundaries
+    """
+    frame_bytes = 480 * 2
+    threshold = [150, 300, 500, 800][max(0, min(int(sensitivity), 3))]
+    min_bytes = int(segment_secs * 16000) * 2 // frame_bytes * frame_bytes
+    max_bytes = max(int(max_secs * 16000) * 2 // frame_bytes * frame_bytes, min_bytes + frame_bytes)
+    buffer = bytearray()
+    offset = 0
+
+    while True:
+        data = read(32000)
+        if data:
+            buffer += data
+        while len(buffer) >= min_bytes + frame_bytes:
+            # Look for a pause between half a segment and what has been decoded so far
+            start = min_bytes // 2 // frame_bytes * frame_bytes
+            usable = min(len(buffer), max_bytes) // frame_bytes * frame_bytes
+            frames = np.frombuffer(bytes(buffer[start:usable]), dtype=np.int16).astype(np.float32).reshape(-1, 480)
+            rms = np.sqrt(np.mean(frames ** 2, axis=1))
+            quiet = np.flatnonzero(rms < threshold)
+            if len(quiet):
+                cut = start + (int(quiet[-1]) + 1) * frame_bytes
+            elif usable >= max_bytes:
+                cut = start + (int(np.argmin(rms)) + 1) * frame_bytes
+            else:
+                break  # still talking - wait for a pause
+            yield offset / 32000, bytes(buffer[:cut])
+            del buffer[:cut]
+            offset += cut
+        if not data:
+            break
+    if buffer:
+        yield offset / 32000, bytes(buffer)
+
 def apply_vad(pcm16: bytes, sensitivity: int) -> bytes:
     """
     Simple energy-gate VAD without native dependencies.
@@ -186,8 +514,20 @@ def apply_vad(pcm16: bytes, sensitivity: int) -> bytes:
     Returns:
         Filtered PCM data with silence removed
     """
+    return apply_vad_frames(pcm16, sensitivity)[0]
+
+def apply_vad_frames(pcm16: bytes, sensitivity: int) -> tuple:
+    """
+    Energy-gate VAD that also reports which 30ms frames were kept, so times
+    in the filtered audio can be mapped back to the original chunk.
+    
+    Returns:
+        (filtered PCM, indices of kept frames or None if nothing was kept)
+    """
     if not pcm16:
-        return b""
+        return b"", None
+    
+    started = time.perf_counter()
     
     # Clamp sensitivity to valid range
     sensitivity = max(0, min(int(sensitivity), 3))
@@ -201,7 +541,7 @@ def apply_vad(pcm16: bytes, sensitivity: int) -> bytes:
     audio = np.frombuffer(pcm16, dtype=np.int16).astype(np.float32)
     
     if len(audio) == 0:
-        return b""
+        return b"", None
     
     # Frame size: 30ms at 16kHz = 480 samples
     frame_size = 480
@@ -220,60 +560,246 @@ def apply_vad(pcm16: bytes, sensitivity: int) -> bytes:
     # Keep frames above threshold
     mask = rms >= threshold
     kept_frames = frames[mask]
+    kept_ratio = len(kept_frames) / len(frames)
+    VAD_KEPT_RATIO.observe(kept_ratio)
     
     if len(kept_frames) == 0:
-        return b""
+        VAD_SECONDS.observe(time.perf_counter() - started)
+        return b"", None
     
     # Convert back to bytes
     result = kept_frames.flatten().astype(np.int16).tobytes()
-    return result
+    VAD_SECONDS.observe(time.perf_counter() - started)
+    return result, np.flatnonzero(mask)
+
+# Decoder options per latency/accuracy trade-off. "live" suits ~1 s chunks:
+# greedy, no timestamp tokens, no temperature fallback and a short output cap
+# (a second of speech is a handful of tokens). "batch" spends beam search and
+# word alignment on 30-60 s uploads.
+DECODE_PROFILES = {
+    "live": {
+        "beam_size": 1,
+        "best_of": 1,
+        "temperature": 0.0,
+        "without_timestamps": True,
+        "word_timestamps": False,
+        "max_new_tokens": 64,
+    },
+    "balanced": {
+        "beam_size": 3,
+        "best_of": 3,
+        "temperature": (0.0, 0.2, 0.4),
+        "without_timestamps": True,
+        "word_timestamps": False,
+    },
+    "batch": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "without_timestamps": False,
+        "word_timestamps": True,
+    },
+}
+
+def pcm16_to_float32(pcm16: bytes) -> np.ndarray:
+    """Convert 16kHz mono s16le PCM to float32 samples in [-1, 1) as Whisper expects."""
+    return np.frombuffer(pcm16, dtype=np.int16).astype(np.float32) / 32768.0
 
 def map_language(lang_input: str) -> str:
     """Map language input to Whisper language code."""
     return LANGUAGE_MAP.get(lang_input, None)
 
-def transcribe_chunk(pcm16: bytes, language: str = "auto") -> str:
+def detect_language(audio: np.ndarray) -> tuple:
     """
-    Transcribe PCM audio chunk using Whisper.
+    Run Whisper language identification on float32 16kHz audio.
+    
+    Returns:
+        (language code, probability)
+    """
+    model = get_model()
+    with LANGID_SECONDS.time():
+        if hasattr(model, "detect_language"):
+            language, probability, _ = model.detect_language(audio)
+            return language, probability
+        # Older faster-whisper: transcribe() detects up front and decodes lazily,
+        # so not iterating the segments skips the decode
+        _, info = model.transcribe(audio, language=None, vad_filter=False)
+        return info.language, info.language_probability
+
+def transcribe_segments(pcm16: bytes, language: str = "auto", lang_cache=None, profile: str = "live",
+                        word_timestamps: bool = False) -> list:
+    """
+    Transcribe PCM audio chunk using Whisper, keeping segment metadata.
     
     Args:
         pcm16: Raw 16kHz mono s16le PCM data
         language: Language code or "auto" for detection
+        lang_cache: Session LanguageCache used instead of per-chunk detection for "auto"
+        profile: Decoder profile name from DECODE_PROFILES
+        word_timestamps: Align words even if the profile doesn't
     
     Returns:
-        Transcribed text, empty string if no speech detected
+        Whisper segments (start/end/text/avg_logprob/no_speech_prob/words),
+        empty list if no speech detected
     """
     if not pcm16:
-        return ""
+        return []
     
+    INFERENCE_BACKLOG.inc()
     try:
         # Convert PCM to float32 normalized audio
-        audio = np.frombuffer(pcm16, dtype=np.int16).astype(np.float32) / 32768.0
+        audio = pcm16_to_float32(pcm16)
         
         if len(audio) == 0:
-            return ""
+            return []
         
         # Map language
         whisper_lang = map_language(language)
+        cached_lang = False
+        if whisper_lang is None and lang_cache is not None:
+            window = lang_cache.feed(audio)
+            if window is not None:
+                lang_cache.update(*detect_language(window))
+            whisper_lang = lang_cache.current()
+            cached_lang = whisper_lang is not None
         
-        # Transcribe
-        segments, _ = model.transcribe(
-            audio,
-            language=whisper_lang,
-            vad_filter=False,  # We handle VAD ourselves
-            word_timestamps=False,
-            condition_on_previous_text=False
-        )
+        options = DECODE_PROFILES[profile]
+        if word_timestamps and not options["word_timestamps"]:
+            options = {**options, "word_timestamps": True}
+        
+        # Transcribe (English-only modes may route to an English/distilled checkpoint)
+        model_name = model_route(whisper_lang)
+        started = time.perf_counter()
+        segments = None
+        draft_name = draft_route(whisper_lang) if profile in settings.WHISPER_DRAFT_PROFILES else None
+        if draft_name is not None:
+            # Draft with the cheap model and keep it if it is confident; otherwise the
+            # full model decodes the chunk. Kept drafts are draft-model output - only
+            # a sampled audit (WHISPER_DRAFT_AUDIT_RATE) compares them to the full model
+            drafted, _ = load_model(draft_name).transcribe(
+                audio,
+                language=whisper_lang,
+                vad_filter=False,
+                condition_on_previous_text=False,
+                **options
+            )
+            drafted = list(drafted)
+            accepted = draft_confident(drafted)
+            DRAFT_DECODES.labels(profile=profile, outcome="accepted" if accepted else "redecoded").inc()
+            if accepted:
+                segments = drafted
+                model_name = draft_name
+                maybe_audit_draft(audio, whisper_lang, options, drafted, profile)
         
-        # Concatenate all segments
-        text = "".join(segment.text for segment in segments).strip()
-        return text
+        if segments is None:
+            segments, _ = get_model(whisper_lang).transcribe(
+                audio,
+                language=whisper_lang,
+                vad_filter=False,  # We handle VAD ourselves
+                condition_on_previous_text=False,
+                **options
+            )
+            # Segments is lazy, decoding happens here
+            segments = list(segments)
+        elapsed = time.perf_counter() - started
+        audio_seconds = len(audio) / 16000
+        INFERENCE_SECONDS.labels(profile=profile).observe(elapsed)
+        INFERENCE_RTF.labels(profile=profile).observe(elapsed / audio_seconds)
+        mode = language if language in LANGUAGE_MAP else "other"
+        MODE_INFERENCE_SECONDS.labels(mode=mode, model=model_name or "default").observe(elapsed)
+        MODE_INFERENCE_RTF.labels(mode=mode, model=model_name or "default").observe(elapsed / audio_seconds)
+        admission.record_inference(elapsed)
+        if cached_lang and segments:
+            lang_cache.observe_decode(
+                sum(getattr(segment, "avg_logprob", 0.0) for segment in segments) / len(segments)
+            )
+        return segments
         
     except Exception as e:
-        print(f"Transcription error: {e}")
-        return ""
+        ERRORS.labels(stage="transcribe").inc()
+        logger.error("Transcription failed", extra={"stage": "transcribe", "profile": profile, "error": str(e)})
+        return []
+    finally:
+        INFERENCE_BACKLOG.dec()
+
+def segments_text(segments: list) -> str:
+    """Concatenate segment texts into one caption."""
+    return "".join(segment.text for segment in segments).strip()
+
+def transcribe_chunk(pcm16: bytes, language: str = "auto", lang_cache=None, profile: str = "live") -> str:
+    """
+    Transcribe PCM audio chunk using Whisper.
+    
+    Args:
+        pcm16: Raw 16kHz mono s16le PCM data
+        language: Language code or "auto" for detection
+        lang_cache: Session LanguageCache used instead of per-chunk detection for "auto"
+        profile: Decoder profile name from DECODE_PROFILES
+    
+    Returns:
+        Transcribed text, empty string if no speech detected
+    """
+    return segments_text(transcribe_segments(pcm16, language, lang_cache=lang_cache, profile=profile))
+
+def limited_reader(read, max_seconds: float = None):
+    """Wrap a PCM read callable so it raises DurationExceeded past ``max_seconds``."""
+    decoded = 0
+    def limited_read(size: int) -> bytes:
+        nonlocal decoded
+        data = read(size)
+        decoded += len(data)
+        if max_seconds and decoded > max_seconds * 32000:
+            raise DurationExceeded(f"Audio duration ~{decoded / 32000:.1f}s exceeds {max_seconds:.0f}s limit")
+        return data
+    return limited_read
+
+def read_pcm_stream(read, max_seconds: float = None) -> bytes:
+    """Collect a whole PCM stream (for engines that need the full clip)."""
+    read = limited_reader(read, max_seconds)
+    pcm = bytearray()
+    while True:
+        data = read(32000)
+        if not data:
+            return bytes(pcm)
+        pcm += data
+
+def transcribe_pcm_stream(read, language: str = "auto", lang_cache=None, profile: str = "batch",
+                          word_timestamps: bool = False, accept=None, max_seconds: float = None) -> tuple:
+    """
+    Transcribe a PCM stream piece by piece while it is still being decoded.
+    Each piece (cut at a pause by split_at_pauses) goes through VAD and
+    Whisper as soon as it is complete.
+
+    Args:
+        read: Callable returning up to n bytes of 16kHz mono s16le PCM (b"" at the end)
+        language: Language code or "auto" for detection
+        lang_cache: Session LanguageCache for "auto"
+        profile: Decoder profile name from DECODE_PROFILES
+        word_timestamps: Align words even if the profile doesn't
+        accept: Optional post-ASR filter, called with the segments and returning those to keep
+        max_seconds: Raise DurationExceeded once more audio than this has been decoded
+
+    Returns:
+        (list of (piece offset seconds, segments, kept VAD frames), decoded seconds)
+    """
+    pieces = []
+    decoded = 0.0
+    for offset, pcm in split_at_pauses(limited_reader(read, max_seconds)):
+        decoded = offset + len(pcm) / 32000
+        filtered_pcm, kept_frames = apply_vad_frames(pcm, sensitivity=1)
+        if not filtered_pcm:
+            continue
+        segments = transcribe_segments(filtered_pcm, language, lang_cache=lang_cache, profile=profile,
+                                       word_timestamps=word_timestamps)
+        if accept is not None:
+            segments = accept(segments)
+        if segments:
+            pieces.append((offset, segments, kept_frames))
+    return pieces, decoded
 
-def transcribe_pcm16(pcm16_bytes: bytes, language: str) -> str:
+def transcribe_pcm16(pcm16_bytes: bytes, language: str, trace=None, lang_cache=None,
+                     profile: str = "live", timeline=None, chunk_start: float = 0.0, accept=None,
+                     sensitivity: int = 1) -> str:
     """
     Transcribe raw PCM16 data directly (for /ingest-raw endpoint).
     Applies VAD and then transcribes with Whisper.
@@ -281,6 +807,14 @@ def transcribe_pcm16(pcm16_bytes: bytes, language: str) -> str:
     Args:
         pcm16_bytes: Raw 16kHz mono s16le PCM data
         language: Language code or "auto" for detection
+        trace: Optional latency trace to record VAD/transcribe spans on
+        lang_cache: Session LanguageCache for "auto"
+        profile: Decoder profile name from DECODE_PROFILES
+        timeline: Session TranscriptTimeline to store segment/word timings in (opt-in)
+        chunk_start: Lecture time (s) at which the chunk's audio begins
+        accept: Optional post-ASR filter, called with the segments and returning those to keep
+        sensitivity: VAD sensitivity level (0-3) - the session's ``vad``, which the
+            client's worklet gates at too
     
     Returns:
         Transcribed text, empty string if no speech detected
@@ -288,10 +822,18 @@ def transcribe_pcm16(pcm16_bytes: bytes, language: str) -> str:
     if not pcm16_bytes:
         return ""
     
-    # Apply energy-gate VAD (using default sensitivity level 1)
-    filtered_pcm = apply_vad(pcm16_bytes, sensitivity=1)
+    # Apply energy-gate VAD
+    with tracer.span(trace, "vad"):
+        filtered_pcm, kept_frames = apply_vad_frames(pcm16_bytes, sensitivity=sensitivity)
     if not filtered_pcm:
         return ""
     
     # Transcribe the filtered audio
-    return transcribe_chunk(filtered_pcm, language)
+    with tracer.span(trace, "transcribe"):
+        segments = transcribe_segments(filtered_pcm, language, lang_cache=lang_cache, profile=profile,
+                                       word_timestamps=timeline is not None)
+    if accept is not None:
+        segments = accept(segments)
+    if timeline is not None and segments:
+        timeline.add_segments(segments, chunk_start, kept_frames)
+    return segments_text(segments)
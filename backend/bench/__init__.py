@@ -0,0 +1,5 @@
+"""
+Benchmark harnesses for the ingest/caption pipeline.
+
+Run from the backend directory, e.g. ``python -m bench.loadtest --help``.
+"""
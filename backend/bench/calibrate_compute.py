@@ -0,0 +1,69 @@
+"""
+Pick the fastest accurate Whisper compute type / model size for this CPU.
+
+Times the reference clip (CALIBRATION_AUDIO, or --audio) with every
+candidate model x compute type, scores each against the reference transcript
+by WER and writes the choice to the calibration cache that
+WHISPER_CALIBRATE=cached|startup reads (see utils/calibration.py):
+
+    cd backend
+    python -m bench.calibrate_compute --models small,medium,large-v3 --audio lecture.wav --transcript lecture.txt
+
+The models and compute types passed here must match CALIBRATION_MODELS /
+CALIBRATION_COMPUTE_TYPES at startup for the cache entry to be found.
+``--stub`` swaps in bench/stubs.py's Whisper to check the harness itself.
+"""
+import argparse
+import json
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", help="16kHz mono 16-bit WAV (default CALIBRATION_AUDIO)")
+    parser.add_argument("--transcript", help="Reference transcript file (default CALIBRATION_TRANSCRIPT)")
+    parser.add_argument("--models", help="Comma-separated models, smallest first (default CALIBRATION_MODELS)")
+    parser.add_argument("--compute-types", help="Comma-separated compute types (default CALIBRATION_COMPUTE_TYPES)")
+    parser.add_argument("--language", help="Clip language (default CALIBRATION_LANGUAGE)")
+    parser.add_argument("--tolerance", type=float, help="WER tolerance (default CALIBRATION_WER_TOLERANCE)")
+    parser.add_argument("--no-cache", action="store_true", help="Only print the result")
+    parser.add_argument("--stub", action="store_true", help="Use the stub Whisper model from bench/stubs.py")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stub:
+        from bench import stubs
+        stubs.install_whisper_stub(rtf=0.02)
+    from settings import settings
+    from utils import calibration
+
+    if args.audio:
+        settings.CALIBRATION_AUDIO = os.path.abspath(args.audio)
+    if args.transcript:
+        settings.CALIBRATION_TRANSCRIPT = os.path.abspath(args.transcript)
+    if args.models:
+        settings.CALIBRATION_MODELS = [m.strip() for m in args.models.split(",") if m.strip()]
+    if args.compute_types:
+        settings.CALIBRATION_COMPUTE_TYPES = [c.strip() for c in args.compute_types.split(",") if c.strip()]
+    if args.language:
+        settings.CALIBRATION_LANGUAGE = args.language
+    if args.tolerance is not None:
+        settings.CALIBRATION_WER_TOLERANCE = args.tolerance
+
+    audio, transcript = calibration.load_reference()
+    if audio is None:
+        sys.exit(f"No reference clip at {settings.CALIBRATION_AUDIO} (use --audio)")
+    result = calibration.calibrate(audio, transcript, language=settings.CALIBRATION_LANGUAGE or None)
+    if not args.no_cache:
+        key = calibration.cache_key(audio, calibration.candidate_models(), calibration.supported_compute_types())
+        calibration.write_cache(key, result)
+        print(f"Cached as {key} in {settings.CALIBRATION_CACHE}", file=sys.stderr)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
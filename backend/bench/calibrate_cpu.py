@@ -0,0 +1,156 @@
+"""
+Find the fastest Whisper CPU layout for this machine.
+
+CTranslate2 splits the CPU two ways: ``num_workers`` transcriptions run at
+once, each with ``cpu_threads`` intra-op threads. Few wide workers give the
+lowest single-stream latency; more narrow workers give more throughput when
+several sessions transcribe at once. This runs ``--sessions`` concurrent
+transcriptions for each split of the usable physical cores (see
+utils/cpu_layout.py) and recommends the one with the lowest aggregate
+real-time factor:
+
+    cd backend
+    python -m bench.calibrate_cpu --sessions 4 --model small --out calibration.json
+
+Put the recommended WHISPER_NUM_WORKERS / WHISPER_CPU_THREADS in .env.
+``--stub`` swaps in bench/stubs.py's Whisper to check the harness itself.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench.loadtest import SAMPLE_RATE, git_commit, load_wav, percentiles, synthesize_pcm
+
+def candidate_layouts(usable_cores: int, sessions: int) -> List[Tuple[int, int]]:
+    """(num_workers, cpu_threads) pairs that fit in ``usable_cores`` - full splits plus power-of-two thread counts."""
+    candidates = set()
+    for workers in range(1, max(1, min(usable_cores, sessions)) + 1):
+        widest = max(1, usable_cores // workers)
+        candidates.add((workers, widest))
+        threads = 1
+        while threads < widest:
+            candidates.add((workers, threads))
+            threads *= 2
+    return sorted(candidates)
+
+def measure(args, audio, workers: int, threads: int) -> dict:
+    """Load a model with this split and time ``args.sessions`` concurrent transcriptions."""
+    from faster_whisper import WhisperModel
+    from utils.cpu_layout import pinned_threads, plan_layout
+
+    layout = plan_layout(num_workers=workers, cpu_threads=threads, reserved_cores=args.reserved_cores, pin=args.pin)
+    with pinned_threads(layout.inference_cpus, layout.pinned):
+        model = WhisperModel(args.model, device="cpu", compute_type=args.compute_type,
+                             cpu_threads=threads, num_workers=workers)
+
+    def transcribe(_):
+        started = time.perf_counter()
+        segments, _info = model.transcribe(audio, language=args.language, beam_size=args.beam_size)
+        list(segments)  # decoding happens while the generator is consumed
+        return time.perf_counter() - started
+
+    transcribe(None)  # warm-up: first call pays for allocations and lazy init
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            latencies.extend(pool.map(transcribe, range(args.sessions)))
+    wall = time.perf_counter() - started
+
+    audio_seconds = len(audio) / SAMPLE_RATE * args.sessions * args.rounds
+    return {
+        "num_workers": workers,
+        "cpu_threads": threads,
+        "pinned": layout.pinned,
+        "wall_seconds": round(wall, 3),
+        "aggregate_rtf": round(wall / audio_seconds, 4),
+        "latency_ms": percentiles(latencies),
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2, help="Concurrent transcriptions to optimize for")
+    parser.add_argument("--rounds", type=int, default=2, help="Timed rounds per layout")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Seconds of audio per transcription")
+    parser.add_argument("--audio", help="16kHz mono 16-bit WAV to transcribe instead of synthetic audio")
+    parser.add_argument("--model", help="Whisper model (default WHISPER_MODEL)")
+    parser.add_argument("--compute-type", help="CTranslate2 compute type (default WHISPER_COMPUTE_TYPE_CPU)")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--beam-size", type=int, default=1)
+    parser.add_argument("--reserved-cores", type=int, help="Physical cores to leave free (default CPU_RESERVED_CORES)")
+    parser.add_argument("--pin", action="store_true", help="Pin inference threads to the usable cores")
+    parser.add_argument("--layouts", help="Only these splits, e.g. 1x8,2x4 (workers x threads)")
+    parser.add_argument("--stub", action="store_true", help="Use the stub Whisper model from bench/stubs.py")
+    parser.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stub:
+        from bench import stubs
+        stubs.install_whisper_stub(rtf=0.05)
+    import numpy as np
+    from settings import settings
+    from utils.cpu_layout import plan_layout
+
+    args.model = args.model or settings.WHISPER_MODEL
+    args.compute_type = args.compute_type or settings.WHISPER_COMPUTE_TYPE_CPU
+    pcm = load_wav(args.audio) if args.audio else synthesize_pcm(args.seconds)
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+    machine = plan_layout(num_workers=1, reserved_cores=args.reserved_cores)
+    usable = machine.physical_cores - machine.reserved_cores
+    if args.layouts:
+        layouts = [tuple(int(n) for n in item.split("x")) for item in args.layouts.split(",") if item.strip()]
+    else:
+        layouts = candidate_layouts(usable, args.sessions)
+
+    runs = []
+    for workers, threads in layouts:
+        result = measure(args, audio, workers, threads)
+        print(f"{workers} workers x {threads} threads: aggregate RTF {result['aggregate_rtf']:.3f}, "
+              f"p95 {result['latency_ms'].get('p95')} ms", file=sys.stderr)
+        runs.append(result)
+
+    best = min(runs, key=lambda run: (run["aggregate_rtf"], run["num_workers"] * run["cpu_threads"]))
+    results = {
+        "commit": git_commit(),
+        "machine": {
+            "physical_cores": machine.physical_cores,
+            "logical_cpus": machine.logical_cpus,
+            "reserved_cores": machine.reserved_cores,
+        },
+        "config": {
+            "model": args.model,
+            "compute_type": args.compute_type,
+            "sessions": args.sessions,
+            "rounds": args.rounds,
+            "audio_seconds": round(len(audio) / SAMPLE_RATE, 3),
+            "pin": args.pin,
+            "stub": args.stub,
+        },
+        "runs": runs,
+        "recommended": {
+            "WHISPER_NUM_WORKERS": best["num_workers"],
+            "WHISPER_CPU_THREADS": best["cpu_threads"],
+            "CPU_RESERVED_CORES": machine.reserved_cores,
+            "CPU_PIN_WORKERS": args.pin,
+        },
+    }
+    payload = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+if __name__ == "__main__":
+    main()
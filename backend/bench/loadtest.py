@@ -0,0 +1,467 @@
+"""
+Load test for the ingest/caption pipeline.
+
+Drives the FastAPI app in-process (or a running server via --url) with N
+synthetic sessions replaying audio at real time through /ingest, /ingest-raw
+or /batch_transcribe, and reports throughput, per-stage latency percentiles,
+event-loop lag, RSS and the largest session count that kept up.
+
+In-process runs use the deterministic stubs in bench/stubs.py, so results are
+comparable across commits:
+
+    cd backend
+    python -m bench.loadtest --endpoint ingest-raw --sessions 1,2,4,8 --out bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+import wave
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RATE = 16000
+
+def percentiles(values: List[float], scale: float = 1000.0) -> dict:
+    """p50/p95/p99/max of ``values`` (seconds) in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(math.ceil(pct / 100.0 * len(ordered))) - 1)] * scale, 3)
+
+    return {"count": len(ordered), "p50": pick(50), "p95": pick(95), "p99": pick(99),
+            "max": round(ordered[-1] * scale, 3)}
+
+def synthesize_pcm(seconds: float, seed: int = 0) -> bytes:
+    """
+    Speech-like test signal: 0.3-2s bursts of amplitude-modulated noise and
+    harmonics separated by short pauses, so the VAD keeps a realistic share.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    audio = np.zeros(total, dtype=np.float32)
+    pos = 0
+    while pos < total:
+        burst = int(rng.uniform(0.3, 2.0) * SAMPLE_RATE)
+        gap = int(rng.uniform(0.1, 0.8) * SAMPLE_RATE)
+        end = min(total, pos + burst)
+        t = np.arange(end - pos) / SAMPLE_RATE
+        pitch = rng.uniform(100, 250)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+        audio[pos:end] = (voiced * envelope + 0.1 * rng.standard_normal(end - pos)) * 4000
+        pos = end + gap
+    audio += rng.standard_normal(total).astype(np.float32) * 30  # room noise
+    return np.clip(audio, -32768, 32767).astype(np.int16).tobytes()
+
+def load_wav(path: str) -> bytes:
+    """Load a 16kHz mono 16-bit WAV file as raw PCM."""
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path} must be 16kHz mono 16-bit PCM")
+        return wav.readframes(wav.getnframes())
+
+def encode_webm(pcm: bytes) -> Optional[bytes]:
+    """Encode PCM to WebM/Opus with ffmpeg, or None if ffmpeg isn't installed."""
+    ffmpeg = shutil.which(os.environ.get("FFMPEG_BIN", "ffmpeg"))
+    if not ffmpeg:
+        return None
+    cmd = [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "s16le", "-ar", "16000", "-ac", "1",
+           "-i", "pipe:0", "-c:a", "libopus", "-f", "webm", "pipe:1"]
+    return subprocess.run(cmd, input=pcm, capture_output=True, check=True).stdout
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size in MB from /proc, else psutil, else the peak; None if nothing can tell."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import psutil  # optional dependency
+        return psutil.Process().memory_info().rss / (1024.0 * 1024.0)
+    except ImportError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak RSS in MB via getrusage (Unix only), else psutil's peak working set (Windows); None if unavailable."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil  # optional dependency
+        except ImportError:
+            return None
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return peak / (1024.0 * 1024.0) if peak is not None else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+def rss_field(mb: Optional[float]):
+    """RSS for the JSON report: MB to one decimal, or "n/a" where it can't be measured."""
+    return round(mb, 1) if mb is not None else "n/a"
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up - i.e. how long the loop was blocked."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+class RunStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.lateness: List[float] = []
+        self.status_counts: Dict[int, int] = defaultdict(int)
+        self.audio_seconds = 0.0
+        self.captions = 0
+
+    def record(self, status: int, latency: float, lateness: float, audio_seconds: float):
+        self.status_counts[status] += 1
+        self.latencies.append(latency)
+        self.lateness.append(lateness)
+        if 200 <= status < 300:
+            self.audio_seconds += audio_seconds
+
+async def consume_captions(client, session: str, in_process: bool, received: List[int]):
+    """Listen on /captions like a student's browser would, counting caption events."""
+    if in_process:
+        # httpx's ASGITransport buffers whole bodies, so drive the SSE generator directly
+        import router_asr
+        response = await router_asr.captions(session)
+        async for frame in response.body_iterator:
+            if str(frame).startswith("data:"):
+                received[0] += 1
+    else:
+        async with client.stream("GET", "/captions", params={"session": session}) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    received[0] += 1
+
+async def run_session(client, index: int, args, chunks: List[bytes], period: float, stats: RunStats):
+    session = f"bench-{index}-{uuid.uuid4().hex[:8]}"
+    await client.post("/session", params={"session": session})
+    received = [0]
+    listener = asyncio.create_task(consume_captions(client, session, not args.url, received))
+    loop = asyncio.get_running_loop()
+    # Stagger session start so requests don't arrive in lockstep
+    start = loop.time() + random.Random(index).uniform(0, period)
+    params = {"session": session}
+    if args.endpoint == "batch_transcribe":
+        params.update({"interval": args.batch_interval, "mode": "English"})
+        content_type = "audio/webm"
+    elif args.endpoint == "ingest":
+        params.update({"lang": "en", "vad": 1})
+        content_type = "audio/webm"
+    else:
+        params.update({"lang": "en", "vad": 1})
+        content_type = "application/octet-stream"
+    if args.profile:
+        params["profile"] = args.profile
+    chunk_seconds = period * args.speed
+    try:
+        for i, chunk in enumerate(chunks):
+            scheduled = start + i * period
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lateness = max(0.0, loop.time() - scheduled)
+            params["ts"] = int(time.time() * 1000)
+            t0 = time.perf_counter()
+            response = await client.post(f"/{args.endpoint}", params=params, content=chunk,
+                                         headers={"Content-Type": content_type})
+            stats.record(response.status_code, time.perf_counter() - t0, lateness, chunk_seconds)
+        # Give the caption stream one poll interval to deliver the last chunk
+        await asyncio.sleep(0.5)
+    finally:
+        listener.cancel()
+        try:
+            await listener
+        except (asyncio.CancelledError, Exception):
+            pass
+        stats.captions += received[0]
+        await client.post("/end", params={"session": session})
+
+def inference_totals() -> Optional[dict]:
+    """In-process Whisper counters: RTF sum/count, draft outcomes and audits (None for remote runs)."""
+    asr = sys.modules.get("asr")
+    if asr is None:
+        return None
+    if asr._audit_pool is not None:
+        asr.draft_audit_pool().submit(lambda: None).result()  # one thread: waits for queued audits
+    totals = {"rtf_sum": 0.0, "chunks": 0, "accepted": 0.0, "redecoded": 0.0, "wer_sum": 0.0, "audited": 0}
+    for child in list(asr.INFERENCE_RTF._children.values()):
+        totals["rtf_sum"] += child.sum
+        totals["chunks"] += child.count
+    for (_profile, outcome), child in list(asr.DRAFT_DECODES._children.items()):
+        totals[outcome] += child.value
+    for child in list(asr.DRAFT_WER._children.values()):
+        totals["wer_sum"] += child.sum
+        totals["audited"] += child.count
+    return totals
+
+def inference_delta(start: Optional[dict], end: Optional[dict]) -> dict:
+    """Mean inference RTF, draft acceptance and accepted drafts' WER against the full model over one run."""
+    if start is None or end is None:
+        return {}
+    chunks = end["chunks"] - start["chunks"]
+    accepted = int(end["accepted"] - start["accepted"])
+    redecoded = int(end["redecoded"] - start["redecoded"])
+    audited = end["audited"] - start["audited"]
+    return {
+        "chunks": chunks,
+        "mean_rtf": round((end["rtf_sum"] - start["rtf_sum"]) / chunks, 4) if chunks else None,
+        "draft_accepted": accepted,
+        "draft_redecoded": redecoded,
+        "draft_acceptance": round(accepted / (accepted + redecoded), 3) if accepted + redecoded else None,
+        "draft_audited": audited,
+        "draft_wer": round((end["wer_sum"] - start["wer_sum"]) / audited, 4) if audited else None,
+    }
+
+async def run_level(client, sessions: int, args, chunks: List[bytes], period: float, tracer) -> dict:
+    stats = RunStats()
+    if tracer is not None:
+        tracer.finished.clear()
+        tracer.latencies.clear()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    rss_start = current_rss_mb()
+    inference_start = inference_totals()
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(client, i, args, chunks, period, stats) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    stages: Dict[str, List[float]] = defaultdict(list)
+    end_to_end: List[float] = []
+    if tracer is not None:
+        for trace in tracer.finished:
+            for name, _offset, duration_ms in trace.spans:
+                if duration_ms > 0:
+                    stages[name].append(duration_ms / 1000.0)
+            if trace.e2e is not None:
+                end_to_end.append(trace.e2e)
+
+    total = sum(stats.status_counts.values())
+    ok = sum(count for status, count in stats.status_counts.items() if 200 <= status < 300)
+    latency = percentiles(stats.latencies)
+    sustainable = ok == total and total > 0 and latency["p95"] <= period * 1000
+    return {
+        "sessions": sessions,
+        "requests": total,
+        "ok": ok,
+        "status_counts": dict(stats.status_counts),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+        "audio_seconds_per_second": round(stats.audio_seconds / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": latency,
+        "send_lateness_ms": percentiles(stats.lateness),
+        "captions_received": stats.captions,
+        "stages_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+        "caption_e2e_ms": percentiles(end_to_end),
+        "inference": inference_delta(inference_start, inference_totals()),
+        "loop_lag_ms": percentiles(monitor.samples),
+        "rss_mb": {"start": rss_field(rss_start), "end": rss_field(current_rss_mb()), "peak": rss_field(peak_rss_mb())},
+        "sustainable": sustainable,
+    }
+
+def prepare_app(args):
+    """Install stubs and import the app in-process. Returns (app, tracer)."""
+    os.chdir(BACKEND_DIR)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.environ["TRANSCRIBE_ENGINE"] = args.engine
+    os.environ["TRACE_SAMPLE_RATE"] = "1.0"
+    # Admit every synthetic session; the ramp itself finds the sustainable count
+    os.environ["ADMISSION_MODE"] = "static"
+
+    from bench import stubs
+    stubs.install_whisper_stub(rtf=args.whisper_rtf, model_costs=args.model_costs)
+    stubs.install_stt_stub(latency=args.stt_latency)
+
+    from collections import deque
+    import main
+    from settings import settings
+    from utils.tracing import tracer
+
+    stubs.install_ollama_stub(latency=args.ollama_latency)
+    if args.stub_decode:
+        stubs.install_decode_stub()
+    settings.MAX_CONCURRENT_SESSIONS = max(args.sessions)
+    if args.model is not None:
+        settings.WHISPER_MODEL = args.model
+        settings.WHISPER_MODEL_ROUTES = {}
+    if args.draft_profiles is not None:
+        settings.WHISPER_DRAFT_PROFILES = args.draft_profiles
+    if args.draft_model is not None:
+        settings.WHISPER_DRAFT_MODEL = args.draft_model
+    settings.WHISPER_DRAFT_AUDIT_RATE = args.draft_audit
+    # Every synthetic session shares one client IP; measure the pipeline, not the IP budget
+    from utils.rate_limit import rate_limiter
+    rate_limiter.ip_capacity = 0.0
+    rate_limiter.global_capacity = 0.0
+    tracer.sample_rate = 1.0
+    tracer.finished = deque(maxlen=1_000_000)
+    return main.app, tracer
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main_async(args) -> dict:
+    import httpx
+
+    if args.endpoint == "batch_transcribe":
+        chunk_seconds = float(args.batch_interval)
+    else:
+        chunk_seconds = args.chunk_seconds
+    period = chunk_seconds / args.speed
+    chunk_count = max(1, int(args.duration // period))
+
+    pcm = load_wav(args.audio) if args.audio else synthesize_pcm(chunk_seconds * chunk_count, seed=args.seed)
+    step = int(chunk_seconds * SAMPLE_RATE) * 2
+    pcm_chunks = [pcm[i:i + step] for i in range(0, len(pcm), step)][:chunk_count]
+    while len(pcm_chunks) < chunk_count:  # loop short recordings
+        pcm_chunks.append(pcm_chunks[len(pcm_chunks) % max(1, len(pcm_chunks))])
+
+    tracer = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120.0)
+    else:
+        if args.endpoint != "ingest-raw" and not args.stub_decode and not shutil.which(os.environ.get("FFMPEG_BIN", "ffmpeg")):
+            print("ffmpeg not found - using the stub decoder (--stub-decode)", file=sys.stderr)
+            args.stub_decode = True
+        app, tracer = prepare_app(args)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120.0)
+
+    if args.endpoint == "ingest-raw" or args.stub_decode:
+        chunks = pcm_chunks
+    else:
+        chunks = [encode_webm(chunk) for chunk in pcm_chunks]
+
+    runs = []
+    async with client:
+        for sessions in args.sessions:
+            result = await run_level(client, sessions, args, chunks, period, tracer)
+            runs.append(result)
+            print(f"sessions={sessions:4d} rps={result['throughput_rps']:8.2f} "
+                  f"p95={result['latency_ms'].get('p95', 0):9.1f}ms "
+                  f"lag_p99={result['loop_lag_ms'].get('p99', 0):8.1f}ms "
+                  f"rss={result['rss_mb']['end']!s:>7}MB sustainable={result['sustainable']}",
+                  file=sys.stderr)
+            if args.stop_on_fail and not result["sustainable"]:
+                break
+
+    sustainable = [run["sessions"] for run in runs if run["sustainable"]]
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "endpoint": args.endpoint,
+            "mode": "remote" if args.url else "in-process",
+            "engine": args.engine,
+            "profile": args.profile,
+            "duration_s": args.duration,
+            "chunk_seconds": chunk_seconds,
+            "speed": args.speed,
+            "audio": args.audio or f"synthetic(seed={args.seed})",
+            "whisper_rtf": args.whisper_rtf,
+            "model_costs": args.model_costs,
+            "model": args.model,
+            "draft_profiles": args.draft_profiles,
+            "draft_model": args.draft_model,
+            "draft_audit": args.draft_audit,
+            "ollama_latency_s": args.ollama_latency,
+            "stt_latency_s": args.stt_latency,
+            "stub_decode": args.stub_decode,
+        },
+        "runs": runs,
+        "max_sustainable_sessions": max(sustainable) if sustainable else 0,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["ingest", "ingest-raw", "batch_transcribe"], default="ingest-raw")
+    parser.add_argument("--sessions", default="1,2,4,8",
+                        help="Comma-separated session counts to run, in order (ramp)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of audio replayed per session")
+    parser.add_argument("--chunk-seconds", type=float, default=1.0, help="Chunk length for /ingest and /ingest-raw")
+    parser.add_argument("--batch-interval", type=int, default=30, choices=[30, 60])
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (1.0 = real time)")
+    parser.add_argument("--audio", help="16kHz mono 16-bit WAV to replay instead of synthetic audio")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", choices=["live", "balanced", "batch"],
+                        help="Decoder profile to request (default: the endpoint's own)")
+    parser.add_argument("--engine", choices=["whisper", "google_stt_v2"], default="whisper")
+    parser.add_argument("--whisper-rtf", type=float, default=0.1, help="Stub Whisper real-time factor")
+    parser.add_argument("--model-costs", action="store_true",
+                        help="Scale the stub RTF per checkpoint (large-v3 = 1.0, distilled/small models cheaper)")
+    parser.add_argument("--model", help="WHISPER_MODEL for every language (disables WHISPER_MODEL_ROUTES)")
+    parser.add_argument("--draft-profiles", help="Comma-separated decoder profiles to draft first (WHISPER_DRAFT_PROFILES)")
+    parser.add_argument("--draft-model", help="Draft checkpoint (default WHISPER_DRAFT_MODEL)")
+    parser.add_argument("--draft-audit", type=float, default=1.0,
+                        help="Fraction of accepted drafts re-decoded by the full model to measure their WER")
+    parser.add_argument("--ollama-latency", type=float, default=0.5, help="Stub Ollama latency (s)")
+    parser.add_argument("--stt-latency", type=float, default=0.2, help="Stub Google STT latency (s)")
+    parser.add_argument("--stub-decode", action="store_true", help="Skip ffmpeg; treat bodies as PCM")
+    parser.add_argument("--stop-on-fail", action="store_true", help="Stop ramping at the first unsustainable level")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+    args.sessions = [int(n) for n in args.sessions.split(",") if n.strip()]
+    if args.draft_profiles is not None:
+        args.draft_profiles = [p.strip() for p in args.draft_profiles.split(",") if p.strip()]
+    # prepare_app() changes directory, so pin user paths first
+    if args.out:
+        args.out = os.path.abspath(args.out)
+    if args.audio:
+        args.audio = os.path.abspath(args.audio)
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(main_async(args))
+    payload = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Micro-benchmarks for the hot functions of the ingest/caption pipeline.
+
+Each benchmark runs at realistic sizes (1/30/60 s of audio, 1/50/500
+sessions) and reports ns/op, bytes allocated during the call (peak traced
+memory above the starting point, so temporaries count) and the blocks the
+call leaves allocated, its result included. Compare against a saved baseline
+to catch regressions:
+
+    cd backend
+    python -m bench.micro --save-baseline bench/micro_baseline.json
+    python -m bench.micro --baseline bench/micro_baseline.json --threshold 0.2 --alloc-threshold 0.2
+
+The run exits non-zero when any benchmark is slower, or allocates more bytes
+per op, than its baseline by more than the threshold (per-benchmark
+"threshold" / "alloc_threshold" entries in the baseline file win).
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUDIO_SECONDS = (1, 30, 60)
+SESSION_COUNTS = (1, 50, 500)
+
+# (name, setup) - setup returns the zero-argument callable to time
+Benchmark = Tuple[str, Callable[[], Callable[[], object]]]
+
+def measure_time(fn: Callable[[], object], min_time: float, repeat: int) -> float:
+    """Median ns/op over ``repeat`` runs of an auto-sized loop (like timeit.autorange)."""
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9 or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time * 1e9 / elapsed) + 1))
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter_ns() - start) / number)
+    return statistics.median(samples)
+
+# Allocations below this many bytes per op never count as a regression (tracemalloc noise)
+ALLOC_SLACK_BYTES = 256
+
+def measure_allocations(fn: Callable[[], object], ops: int = 20) -> Tuple[float, float]:
+    """
+    Per op, measured with tracemalloc: bytes allocated during the call (peak
+    above the starting point, so freed temporaries count) and blocks still
+    allocated when it returns - its result is kept alive until then.
+    """
+    peak, blocks = _traced_allocations(fn, ops)
+    noise_peak, noise_blocks = _traced_allocations(lambda: None, ops)
+    return max(0.0, peak - noise_peak), max(0.0, blocks - noise_blocks)
+
+def _traced_allocations(fn: Callable[[], object], ops: int) -> Tuple[float, float]:
+    fn()  # warm caches so one-off allocations don't count
+    # The snapshot's own bookkeeping isn't the benchmark's
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        peak_total = 0
+        blocks = 0
+        for _ in range(ops):
+            # Forget earlier traces (and the peak): what is traced next was allocated by fn()
+            tracemalloc.clear_traces()
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            del result
+            peak_total += peak
+            blocks += sum(stat.count for stat in after.statistics("lineno"))
+    finally:
+        tracemalloc.stop()
+    return peak_total / ops, blocks / ops
+
+def build_benchmarks() -> List[Benchmark]:
+    from bench.loadtest import encode_webm, synthesize_pcm
+    import asr
+    from utils.rate_limit import RateLimiter
+    from utils.session import SessionManager, SessionState
+
+    benchmarks: List[Benchmark] = []
+    pcm_cache: Dict[int, bytes] = {}
+
+    def pcm(seconds: int) -> bytes:
+        if seconds not in pcm_cache:
+            pcm_cache[seconds] = synthesize_pcm(seconds, seed=seconds)
+        return pcm_cache[seconds]
+
+    for seconds in AUDIO_SECONDS:
+        benchmarks.append((f"apply_vad[{seconds}s]",
+                           lambda s=seconds: (lambda data=pcm(s): asr.apply_vad(data, 1))))
+        benchmarks.append((f"pcm16_to_float32[{seconds}s]",
+                           lambda s=seconds: (lambda data=pcm(s): asr.pcm16_to_float32(data))))
+        if shutil.which(asr.settings.FFMPEG_BIN):
+            benchmarks.append((f"webm_to_pcm16[{seconds}s]",
+                               lambda s=seconds: (lambda data=encode_webm(pcm(s)): asr.webm_to_pcm16(data))))
+
+    def add_text_setup():
+        state = SessionState(session_id="bench")
+        for i in range(20):
+            state.add_text(f"caption number {i} with a handful of words")
+        return lambda: state.add_text("another caption with a handful of words")
+
+    def recent_text_setup():
+        state = SessionState(session_id="bench")
+        for i in range(20):
+            state.add_text(f"caption number {i} with a handful of words")
+        return lambda: state.get_text_from_last_seconds(10)
+
+    benchmarks.append(("SessionState.add_text", add_text_setup))
+    benchmarks.append(("SessionState.get_text_from_last_seconds", recent_text_setup))
+
+    for count in SESSION_COUNTS:
+        def limiter_setup(n=count):
+            limiter = RateLimiter(capacity=1e12, refill_rate=1e12)
+            ids = [f"session-{i}" for i in range(n)]
+            cursor = [0]
+
+            def op():
+                cursor[0] = (cursor[0] + 1) % n
+                return limiter.is_allowed(ids[cursor[0]])
+            return op
+
+        def gc_setup(n=count):
+            manager = SessionManager()
+            for i in range(n):
+                manager.sessions[f"session-{i}"] = SessionState(session_id=f"session-{i}")
+            return manager.gc
+
+        benchmarks.append((f"RateLimiter.is_allowed[{count} sessions]", limiter_setup))
+        benchmarks.append((f"SessionManager.gc[{count} sessions]", gc_setup))
+
+    return benchmarks
+
+def run(pattern: Optional[str], min_time: float, repeat: int) -> Dict[str, dict]:
+    results = {}
+    for name, setup in build_benchmarks():
+        if pattern and not re.search(pattern, name):
+            continue
+        fn = setup()
+        ns_per_op = measure_time(fn, min_time, repeat)
+        alloc_bytes, alloc_blocks = measure_allocations(fn)
+        results[name] = {
+            "ns_per_op": round(ns_per_op, 1),
+            "alloc_bytes_per_op": round(alloc_bytes, 1),
+            "alloc_blocks_per_op": round(alloc_blocks, 2),
+        }
+        print(f"{name:50s} {ns_per_op:14,.0f} ns/op {alloc_bytes:14,.0f} B/op {alloc_blocks:8.1f} blocks/op",
+              file=sys.stderr)
+    return results
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+            alloc_threshold: float = 0.2) -> List[str]:
+    """Benchmarks that got slower, or allocate more bytes per op, beyond their thresholds."""
+    failures = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        limit = reference.get("threshold", threshold)
+        ratio = current["ns_per_op"] / reference["ns_per_op"] if reference["ns_per_op"] else 1.0
+        current["baseline_ns_per_op"] = reference["ns_per_op"]
+        current["ratio"] = round(ratio, 3)
+        if ratio > 1.0 + limit:
+            failures.append(f"{name}: {ratio:.2f}x baseline (limit {1.0 + limit:.2f}x)")
+
+        if "alloc_bytes_per_op" not in reference:
+            continue
+        alloc_limit = reference.get("alloc_threshold", alloc_threshold)
+        allowed = reference["alloc_bytes_per_op"] * (1.0 + alloc_limit) + ALLOC_SLACK_BYTES
+        current["baseline_alloc_bytes_per_op"] = reference["alloc_bytes_per_op"]
+        if current["alloc_bytes_per_op"] > allowed:
+            failures.append(f"{name}: {current['alloc_bytes_per_op']:,.0f} B/op vs baseline "
+                            f"{reference['alloc_bytes_per_op']:,.0f} (limit {allowed:,.0f})")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="Only run benchmarks whose name matches this regex")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown vs baseline (0.2 = 20%%)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.2,
+                        help="Allowed growth in allocated bytes per op vs baseline (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Write these results as a new baseline")
+    parser.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+    paths = {key: os.path.abspath(getattr(args, key)) for key in ("baseline", "save_baseline", "out")
+             if getattr(args, key)}
+
+    os.chdir(BACKEND_DIR)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from bench.stubs import install_whisper_stub
+    install_whisper_stub()
+
+    results = run(args.filter, args.min_time, args.repeat)
+
+    failures = []
+    if "baseline" in paths:
+        with open(paths["baseline"]) as f:
+            baseline = json.load(f).get("benchmarks", {})
+        failures = compare(results, baseline, args.threshold, args.alloc_threshold)
+
+    payload = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": sys.version.split()[0],
+               "benchmarks": results, "regressions": failures}
+    if "save_baseline" in paths:
+        with open(paths["save_baseline"], "w") as f:
+            json.dump({"benchmarks": results}, f, indent=2)
+            f.write("\n")
+    if "out" in paths:
+        with open(paths["out"], "w") as f:
+            json.dump(payload, f, indent=2)
+            f.write("\n")
+    else:
+        print(json.dumps(payload, indent=2))
+
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Deterministic stand-ins for Whisper, Ollama and Google STT used by benchmarks.
+
+Install the stubs before the app modules are imported: asr.py imports
+faster_whisper when it first loads its model, and the routers look up
+stt_google_v2 by name.
+"""
+import queue
+import sys
+import time
+import types
+import zlib
+from typing import Optional
+
+import httpx
+
+class StubSegment:
+    def __init__(self, text: str, start: float, end: float):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.avg_logprob = -0.25
+        self.no_speech_prob = 0.02
+        self.compression_ratio = 1.3
+        self.words = None
+
+class StubWord:
+    def __init__(self, word: str, start: float, end: float):
+        self.word = word
+        self.start = start
+        self.end = end
+        self.probability = 0.9
+
+class StubInfo:
+    def __init__(self, language: str, duration: float):
+        self.language = language
+        self.language_probability = 0.98
+        self.duration = duration
+
+# Relative decode cost per checkpoint (large-v3 = 1.0), roughly as measured with
+# CTranslate2 int8 on CPU; used when install_whisper_stub(model_costs=True)
+STUB_MODEL_COSTS = {
+    "large-v3": 1.0, "large-v2": 1.0, "medium": 0.5, "medium.en": 0.5, "small": 0.2, "small.en": 0.2,
+    "base": 0.08, "base.en": 0.08, "tiny": 0.04, "tiny.en": 0.04,
+    "distil-large-v3": 0.2, "distil-large-v2": 0.2, "distil-medium.en": 0.12, "distil-small.en": 0.07,
+}
+
+class StubWhisperModel:
+    """
+    Blocks for ``rtf`` x audio duration, like a CPU-bound CTranslate2 call
+    would, and returns text derived from a checksum of the audio so repeated
+    runs see identical transcripts. With per-model costs, smaller models are
+    proportionally faster, less confident on some chunks and wrong on others.
+    """
+    rtf = 0.1
+    model_costs: dict = {}
+
+    def __init__(self, model_size_or_path: str = "stub", device: str = "cpu", compute_type: str = "int8", **kwargs):
+        self.model_size = model_size_or_path
+        self.device = device
+        self.compute_type = compute_type
+        self.cost = self.model_costs.get(model_size_or_path, 1.0)
+
+    def transcribe(self, audio, language: Optional[str] = None, **kwargs):
+        duration = len(audio) / 16000.0
+        time.sleep(duration * self.rtf * self.cost)
+        checksum = zlib.crc32(memoryview(audio).cast("B")) if len(audio) else 0
+        text = f" segment {checksum % 10000} of {duration:.1f} seconds"
+        segments = [StubSegment(text, 0.0, duration)] if duration > 0 else []
+        if segments and self.cost < 1.0:
+            # Deterministic per chunk: about half the chunks fall below the default draft threshold,
+            # and about one in four gets a word wrong whatever its confidence
+            segments[0].avg_logprob = -0.1 - (checksum % 1000) / 1000.0
+            if (checksum // 1000) % 4 == 0:
+                segments[0].text = text = text.replace(" segment ", " fragment ", 1)
+        if segments and kwargs.get("word_timestamps"):
+            tokens = text.split()
+            step = duration / len(tokens)
+            segments[0].words = [StubWord(f" {token}", i * step, (i + 1) * step) for i, token in enumerate(tokens)]
+        return iter(segments), StubInfo(language or "en", duration)
+
+    def detect_language(self, audio=None, **kwargs):
+        time.sleep(self.rtf)  # one encoder pass over the padded window
+        return "en", 0.97, [("en", 0.97)]
+
+def install_whisper_stub(rtf: float = 0.1, model_costs: bool = False):
+    """
+    Register a fake ``faster_whisper`` module exposing StubWhisperModel.
+
+    Args:
+        rtf: Real-time factor of a full-size model
+        model_costs: Scale the RTF per checkpoint by STUB_MODEL_COSTS (otherwise every model costs the same)
+    """
+    StubWhisperModel.rtf = rtf
+    StubWhisperModel.model_costs = STUB_MODEL_COSTS if model_costs else {}
+    module = types.ModuleType("faster_whisper")
+    module.WhisperModel = StubWhisperModel
+    sys.modules["faster_whisper"] = module
+
+def install_stt_stub(latency: float = 0.2):
+    """Register a fake ``stt_google_v2`` module with the functions the router uses."""
+    module = types.ModuleType("stt_google_v2")
+
+    def recognize_short(audio_pcm16k_mono_bytes: bytes, language_code: str) -> str:
+        time.sleep(latency)
+        return f"stub transcript of {len(audio_pcm16k_mono_bytes) / 32000:.1f} seconds"
+
+    module.recognize_short = recognize_short
+    module.map_language_to_gcp = lambda language_input: "en-US"
+    module.create_recognizer_if_not_exists = lambda: None
+    sys.modules["stt_google_v2"] = module
+
+def ollama_transport(latency: float = 0.5) -> httpx.MockTransport:
+    """Transport answering Ollama /api/generate with a fixed note after ``latency`` seconds."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return httpx.Response(200, json={"response": "- stub note one\n- stub note two", "done": True})
+    return httpx.MockTransport(handler)
+
+def async_ollama_transport(latency: float = 0.5) -> httpx.MockTransport:
+    """Async variant of ollama_transport that yields to the event loop while waiting."""
+    import asyncio
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"response": "- stub note one\n- stub note two", "done": True})
+    return httpx.MockTransport(handler)
+
+def install_ollama_stub(latency: float = 0.5):
+    """Point both the async notes client and the sync batch path at a stub Ollama."""
+    import notes
+
+    notes.notes_generator.client = httpx.AsyncClient(transport=async_ollama_transport(latency), timeout=30.0)
+    original_client = httpx.Client
+
+    class StubClient(original_client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = ollama_transport(latency)
+            super().__init__(*args, **kwargs)
+
+    httpx.Client = StubClient
+
+def install_decode_stub(cost_per_second: float = 0.005):
+    """
+    Replace ffmpeg decoding for hosts without ffmpeg: request bodies are taken
+    to already be 16kHz mono s16le PCM, and decoding costs a fixed time per
+    audio second.
+    """
+    import asr
+    import router_asr
+
+    def webm_to_pcm16(buffer: bytes) -> bytes:
+        if not buffer:
+            return b""
+        with asr.DECODE_SECONDS.time():
+            time.sleep(len(buffer) / 32000 * cost_per_second)
+        return buffer
+
+    class StubStreamDecoder:
+        """PCMStreamDecoder stand-in: fed bytes come back out as PCM."""
+        def __init__(self):
+            self.chunks = queue.Queue()
+            self.pending = b""
+            self.done = False
+
+        def feed(self, data: bytes):
+            if self.done:
+                raise BrokenPipeError("decoder stopped")
+            time.sleep(len(data) / 32000 * cost_per_second)
+            self.chunks.put(data)
+
+        def finish_input(self):
+            self.chunks.put(None)
+
+        def read(self, size: int) -> bytes:
+            while len(self.pending) < size and not self.done:
+                data = self.chunks.get()
+                if data is None:
+                    self.done = True
+                else:
+                    self.pending += data
+            data, self.pending = self.pending[:size], self.pending[size:]
+            return data
+
+        def kill(self):
+            self.done = True
+            self.chunks.put(None)
+
+        def close(self):
+            pass
+
+    asr.webm_to_pcm16 = webm_to_pcm16
+    router_asr.webm_to_pcm16 = webm_to_pcm16
+    asr.PCMStreamDecoder = StubStreamDecoder
+    router_asr.PCMStreamDecoder = StubStreamDecoder
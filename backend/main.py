@@ -1,33 +1,92 @@
-from fastapi import FastAPI, Response
+# Time every import from here on (reported at /debug/startup)
+from utils.startup import startup_report
+startup_report.imports.install()
+
+# Structured, queue-backed logging before anything logs
+from utils.log import setup_logging, shutdown_logging
+setup_logging()
+
+import asyncio
+import hmac
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from router_asr import router as asr_router
-from router_notes import router as notes_router  # keep if you’ve added notes
+with startup_report.phase("import_routers"):
+    from router_asr import router as asr_router
+    from router_notes import router as notes_router  # keep if you’ve added notes
+from utils.metrics import registry
+from utils.tracing import tracer
+from utils.loop_monitor import loop_monitor, InflightRequests
+from utils.admission import admission
+from utils.session import session_manager
+from utils.static_assets import StaticAssets
+from settings import settings
 
+logger = logging.getLogger(__name__)
 app = FastAPI(title="CaptionsNotes", docs_url=None, redoc_url=None)
+session_gc_task: Optional[asyncio.Task] = None
 
 # Check FFmpeg availability and initialize Google Speech recognizer on startup
 @app.on_event("startup")
 async def startup_event():
-    import logging
     try:
         from asr import find_ffmpeg
         find_ffmpeg()
-        logging.info("FFmpeg found and ready")
+        logger.info("FFmpeg found and ready")
     except Exception as e:
-        logging.error(f"FFmpeg not found on startup: {e}")
-        logging.error("Audio ingestion will fail until FFmpeg is installed or FFMPEG_BIN is set correctly")
+        logger.error("FFmpeg not found on startup; audio ingestion will fail until FFmpeg is installed "
+                     "or FFMPEG_BIN is set correctly", extra={"stage": "startup", "error": str(e)})
+    
+    # Load Whisper (and the routed per-language models) off the event loop so /health
+    # and the frontend are up right away; the first transcription waits if it isn't done yet
+    if settings.WHISPER_PRELOAD:
+        from asr import preload_models
+        asyncio.get_running_loop().run_in_executor(None, preload_models)
+    
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    
+    # Expire sessions and promote queued clients without waiting for a request
+    global session_gc_task
+    session_gc_task = asyncio.get_running_loop().create_task(
+        session_manager.run_gc_loop(settings.QUEUE_GC_INTERVAL)
+    )
+    
+    # End-of-lecture summaries run on this loop
+    from summary import summary_jobs
+    summary_jobs.attach(asyncio.get_running_loop())
+    
+    # Warm Ollama in the background so startup isn't blocked on the model load
+    if settings.OLLAMA_PRELOAD:
+        from notes import notes_generator
+        asyncio.get_running_loop().create_task(notes_generator.preload())
     
     # Initialize Google Speech recognizer if using Google STT v2
-    from settings import settings
     if settings.TRANSCRIBE_ENGINE == "google_stt_v2":
         try:
-            from stt_google_v2 import create_recognizer_if_not_exists
-            create_recognizer_if_not_exists()
-            logging.info("Google Cloud Speech v2 recognizer ready")
+            with startup_report.phase("google_recognizer"):
+                from stt_google_v2 import create_recognizer_if_not_exists
+                create_recognizer_if_not_exists()
+            logger.info("Google Cloud Speech v2 recognizer ready")
         except Exception as e:
-            logging.error(f"Failed to initialize Google Speech recognizer: {e}")
-            logging.error("Google Speech transcription will fail until credentials and project are configured")
+            logger.error("Failed to initialize Google Speech recognizer; transcription will fail until "
+                         "credentials and project are configured", extra={"stage": "startup", "error": str(e)})
+    
+    startup_report.finish()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_monitor.stop()
+    if session_gc_task is not None:
+        session_gc_task.cancel()
+    from notes import notes_generator
+    await notes_generator.close()
+    shutdown_logging()
+
+# Track in-flight requests so loop stalls can be attributed
+app.add_middleware(InflightRequests, monitor=loop_monitor)
 
 # CORS — tighten to your domains when you’re done testing
 app.add_middleware(
@@ -39,13 +98,81 @@ app.add_middleware(
 app.include_router(asr_router)
 app.include_router(notes_router)
 
-# Serve built frontend from ./public (index.html at /)
-app.mount("/", StaticFiles(directory="public", html=True), name="frontend")
-
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of in-process metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+def require_debug_access(request: Request):
+    """
+    /debug/* exposes internals (and session activity), so it is open only in
+    DEV_MODE or to requests carrying the DEBUG_TOKEN in X-Debug-Token.
+    Everyone else gets a 404, as if the routes didn't exist.
+    """
+    if settings.DEV_MODE:
+        return
+    token = request.headers.get("x-debug-token", "")
+    if settings.DEBUG_TOKEN and hmac.compare_digest(token.encode(), settings.DEBUG_TOKEN.encode()):
+        return
+    raise HTTPException(status_code=404)
+
+debug_router = APIRouter(prefix="/debug", include_in_schema=False, dependencies=[Depends(require_debug_access)])
+
+@debug_router.get("/traces")
+def debug_traces(session: Optional[str] = None, limit: int = 50):
+    """Recent sampled caption traces and p50/p95/p99 end-to-end latency per session."""
+    return {
+        "sample_rate": tracer.sample_rate,
+        "latency": tracer.latency_summary(session),
+        "traces": tracer.recent(session, limit=max(1, min(limit, 500))),
+    }
+
+@debug_router.get("/loop")
+def debug_loop(limit: int = 50):
+    """Event-loop lag stalls with the handler and blocking call that caused them."""
+    return loop_monitor.report(limit=max(1, min(limit, 100)))
+
+@debug_router.get("/admission")
+def debug_admission():
+    """Current session capacity estimate and the measurements behind it."""
+    return admission.snapshot()
+
+@debug_router.get("/startup")
+def debug_startup(limit: int = 25):
+    """Cold-start breakdown: import times per module/package and startup phases."""
+    return startup_report.snapshot(limit=max(1, min(limit, 200)))
+
+@debug_router.get("/cpu")
+def debug_cpu():
+    """Whisper models, CPU layout and compute types: what is loaded, or the layout the next load would use."""
+    import asr
+    from utils.cpu_layout import plan_layout
+    layout = asr.model_layout
+    return {
+        "loaded": layout is not None,
+        **(layout or plan_layout()).snapshot(),
+        "models": asr.loaded_models(),
+        "routes": settings.WHISPER_MODEL_ROUTES,
+        "compute": {name or "default": config for name, config in asr.cpu_configs.items()},
+    }
+
+@debug_router.get("/static")
+def debug_static():
+    """Static manifest: files, compressed sizes and cache headers."""
+    return frontend.manifest()
+
+app.include_router(debug_router)
+
 @app.get("/favicon.ico", include_in_schema=False)
 def favicon():
     return Response(status_code=204)
+
+# Serve built frontend from ./public (index.html at /), precompressed and cached
+# Mounted last: a mount at "/" matches every path, so routes after it are unreachable
+with startup_report.phase("static_manifest"):
+    frontend = StaticAssets(directory="public", precompress=settings.STATIC_PRECOMPRESS)
+app.mount("/", frontend, name="frontend")
@@ -2,91 +2,156 @@
 Ollama integration for live note generation.
 """
 import asyncio
+import logging
+import time
 import httpx
-from typing import Dict, Optional
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
 from settings import settings
+from utils.metrics import registry, ERRORS
+from utils.admission import admission
 
-# Class-specific prompts for different lecture types with grade support
-def get_prompt_template(mode: str, grade: int) -> str:
-    """Get prompt template based on class mode and grade level."""
-    base_instruction = f"You are a {grade}th grader who is a pro at note-taking. You are sitting in a {mode} class while the teacher is giving a lecture. For every 10 seconds of transcript I give you, convert it to concise, high-quality study notes. If there are no meaningful notes in this segment, write nothing."
-    
-    prompts = {
-        "Biology": f"""{base_instruction}
+logger = logging.getLogger(__name__)
+
+OLLAMA_SECONDS = registry.histogram(
+    "captiflo_ollama_seconds", "Ollama generate request latency", ["kind", "status"]
+)
 
-Based on this biology lecture transcript, create concise bullet points covering key concepts, processes, and terminology. Focus on:
+# Prompt templates are built once at import. Everything before the transcript is
+# ordered from most to least shared - common instructions, then the class focus,
+# then the grade - so consecutive requests share the longest possible prefix and
+# Ollama can reuse its prompt cache instead of re-evaluating the whole prompt.
+NOTES_INSTRUCTION = "You are a pro at note-taking, sitting in class while the teacher is giving a lecture. For every 10 seconds of transcript I give you, convert it to concise, high-quality study notes. If there are no meaningful notes in this segment, write nothing."
+
+MODE_FOCUS = {
+    "Biology": """Based on this biology lecture transcript, create concise bullet points covering key concepts, processes, and terminology. Focus on:
 - Main biological processes or systems discussed
 - Key terminology and definitions
 - Important relationships or mechanisms
-- Any examples or case studies mentioned
-
-Transcript: {{text}}
+- Any examples or case studies mentioned""",
 
-Generate 2-4 concise bullet points:""",
-
-        "Mandarin": f"""{base_instruction}
-
-Based on this Mandarin language lesson transcript, create concise bullet points covering:
+    "Mandarin": """Based on this Mandarin language lesson transcript, create concise bullet points covering:
 - New vocabulary words and their meanings
 - Grammar patterns or structures introduced
 - Cultural context or usage notes
-- Pronunciation or tone information if mentioned
-
-Transcript: {{text}}
-
-Generate 2-4 concise bullet points:""",
-
-        "Spanish": f"""{base_instruction}
+- Pronunciation or tone information if mentioned""",
 
-Based on this Spanish language lesson transcript, create concise bullet points covering:
+    "Spanish": """Based on this Spanish language lesson transcript, create concise bullet points covering:
 - New vocabulary and phrases
 - Grammar rules or conjugations discussed
 - Cultural context or regional variations
-- Practice exercises or examples mentioned
+- Practice exercises or examples mentioned""",
 
-Transcript: {{text}}
-
-Generate 2-4 concise bullet points:""",
-
-        "English": f"""{base_instruction}
-
-Based on this English class transcript, create concise bullet points covering:
+    "English": """Based on this English class transcript, create concise bullet points covering:
 - Literary devices, themes, or analysis discussed
 - Writing techniques or grammar concepts
 - Key readings or texts mentioned
-- Important assignments or deadlines
-
-Transcript: {{text}}
-
-Generate 2-4 concise bullet points:""",
+- Important assignments or deadlines""",
 
-        "Global History": f"""{base_instruction}
-
-Based on this global history lecture transcript, create concise bullet points covering:
+    "Global History": """Based on this global history lecture transcript, create concise bullet points covering:
 - Historical events, dates, and key figures
 - Cause and effect relationships
 - Geographic regions or civilizations discussed
-- Important themes or patterns in history
+- Important themes or patterns in history""",
+
+    "default": """Based on this lecture transcript, create concise bullet points covering the main topics, key concepts, and important information discussed.""",
+}
+
+GRADES = range(6, 13)
+
+class PromptTemplate:
+    """A prompt split around the transcript, so rendering is two concatenations."""
+    __slots__ = ("head", "tail")
 
-Transcript: {{text}}
+    def __init__(self, head: str, tail: str):
+        self.head = head
+        self.tail = tail
 
-Generate 2-4 concise bullet points:""",
+    def render(self, text: str) -> str:
+        return self.head + text + self.tail
 
-        "default": f"""{base_instruction}
+def build_prompt_templates() -> Dict[Tuple[str, int], PromptTemplate]:
+    """Precompile a template for every (mode, grade) pair."""
+    templates = {}
+    for mode, focus in MODE_FOCUS.items():
+        audience = f"a {{grade}}th grader in a {mode} class" if mode != "default" else "a {grade}th grader"
+        for grade in GRADES:
+            head = f"{NOTES_INSTRUCTION}\n\n{focus}\n\nWrite the notes for {audience.format(grade=grade)}.\n\nTranscript: "
+            templates[(mode, grade)] = PromptTemplate(head, "\n\nGenerate 2-4 concise bullet points:")
+    return templates
 
-Based on this lecture transcript, create concise bullet points covering the main topics, key concepts, and important information discussed.
+PROMPT_TEMPLATES = build_prompt_templates()
 
-Transcript: {{text}}
+def get_prompt(mode: str, grade: int) -> PromptTemplate:
+    """Precompiled template for a class mode and grade (unknown values fall back to defaults)."""
+    if mode not in MODE_FOCUS:
+        mode = "default"
+    grade = min(max(int(grade), GRADES.start), GRADES.stop - 1)
+    return PROMPT_TEMPLATES[(mode, grade)]
 
-Generate 2-4 concise bullet points:"""
+def get_prompt_template(mode: str, grade: int) -> str:
+    """Get prompt template based on class mode and grade level, with a {text} placeholder."""
+    template = get_prompt(mode, grade)
+    return template.head + "{text}" + template.tail
+
+def build_payload(prompt: str) -> dict:
+    """Ollama generate request; keep_alive stops the model unloading between lectures."""
+    return {
+        "model": settings.NOTES_MODEL,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        "options": {
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "num_predict": 200  # Ollama's output-length option (it ignores "max_tokens")
+        }
     }
-    
-    return prompts.get(mode, prompts["default"])
+
+class OllamaSlots:
+    """
+    OLLAMA_PARALLEL request slots shared by live notes and background work
+    (lecture summaries). A freed slot goes to a waiting live request first, so
+    a live window waits for at most the background calls already running, never
+    for a summary's whole map-reduce backlog.
+    """
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self.active = 0
+        self._live: Deque[asyncio.Future] = deque()
+        self._background: Deque[asyncio.Future] = deque()
+
+    def waiting(self) -> int:
+        return sum(not f.done() for f in self._live) + sum(not f.done() for f in self._background)
+
+    async def acquire(self, live: bool):
+        if self.active < self.slots:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        (self._live if live else self._background).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over just as we were cancelled
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next waiter, live requests first
+        for waiters in (self._live, self._background):
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.active -= 1
 
 class NotesGenerator:
     def __init__(self):
         self.client = httpx.AsyncClient(timeout=30.0)
         self.last_notes_cache: Dict[str, str] = {}
+        self.slots = OllamaSlots(settings.OLLAMA_PARALLEL)
     
     async def generate_notes(self, text: str, mode: str = "default", grade: int = 9) -> Optional[str]:
         """Generate notes from text using Ollama."""
@@ -94,38 +159,53 @@ class NotesGenerator:
             return None
         
         # Get appropriate prompt
-        prompt_template = get_prompt_template(mode, grade)
-        prompt = prompt_template.format(text=text)
+        prompt = get_prompt(mode, grade).render(text)
+        return await self.complete(prompt)
+    
+    async def complete(self, prompt: str, kind: str = "live", max_tokens: Optional[int] = None) -> Optional[str]:
+        """
+        Run one Ollama generate request.
         
+        Args:
+            prompt: Full prompt text
+            kind: Metrics label - "live" requests also feed admission control and
+                get the next free Ollama slot ahead of other kinds
+            max_tokens: Override the default output length
+        """
+        await self.slots.acquire(live=kind == "live")
         try:
-            payload = {
-                "model": settings.NOTES_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "top_p": 0.9,
-                    "max_tokens": 200
-                }
-            }
+            payload = build_payload(prompt)
+            if max_tokens is not None:
+                payload["options"]["num_predict"] = max_tokens
             
+            started = time.perf_counter()
             response = await self.client.post(
                 settings.OLLAMA_URL,
                 json=payload,
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                timeout=30.0 if kind == "live" else 120.0
             )
+            latency = time.perf_counter() - started
+            OLLAMA_SECONDS.labels(kind=kind, status=response.status_code).observe(latency)
+            if kind == "live":
+                admission.record_ollama(latency)
             
             if response.status_code == 200:
                 result = response.json()
                 notes = result.get("response", "").strip()
                 return notes if notes else None
             else:
-                print(f"Ollama error: {response.status_code} - {response.text}")
+                logger.warning("Ollama request failed", extra={
+                    "stage": f"ollama_{kind}", "status": response.status_code,
+                    "duration_ms": round(latency * 1000, 1), "error": response.text[:200]})
                 return None
                 
         except Exception as e:
-            print(f"Notes generation error: {e}")
+            ERRORS.labels(stage="ollama").inc()
+            logger.error("Notes generation failed", extra={"stage": f"ollama_{kind}", "error": str(e)})
             return None
+        finally:
+            self.slots.release()
     
     async def get_notes_for_session(self, session_id: str, text: str, mode: str = "default", grade: int = 9) -> Optional[str]:
         """Generate notes and cache to avoid duplicates."""
@@ -149,12 +229,37 @@ class NotesGenerator:
         
         return notes
     
+    async def preload(self) -> bool:
+        """
+        Load the notes model into Ollama and evaluate the shared instruction
+        prefix, so the first lecture after startup doesn't wait for either.
+        """
+        payload = build_payload(NOTES_INSTRUCTION)
+        payload["options"] = {"num_predict": 1}
+        try:
+            started = time.perf_counter()
+            response = await self.client.post(settings.OLLAMA_URL, json=payload, timeout=120.0)
+            if response.status_code == 200:
+                logger.info("Ollama model preloaded", extra={
+                    "stage": "ollama_preload", "model": settings.NOTES_MODEL,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "keep_alive": settings.OLLAMA_KEEP_ALIVE})
+                return True
+            logger.warning("Ollama preload failed", extra={
+                "stage": "ollama_preload", "status": response.status_code, "error": response.text[:200]})
+        except Exception as e:
+            logger.warning("Ollama preload failed", extra={"stage": "ollama_preload", "error": str(e)})
+        return False
+    
     async def close(self):
         """Clean up HTTP client."""
         await self.client.aclose()
 
 # Global notes generator instance
 notes_generator = NotesGenerator()
+registry.gauge("captiflo_ollama_waiting", "Ollama requests waiting for a slot").set_function(
+    notes_generator.slots.waiting
+)
 
 def generate_notes_for_text(text: str, custom_prompt: str = None, mode: str = "default", grade: int = 9) -> Optional[str]:
     """
@@ -171,35 +276,32 @@ def generate_notes_for_text(text: str, custom_prompt: str = None, mode: str = "d
         if custom_prompt:
             prompt = custom_prompt.replace("{text}", text)
         else:
-            prompt_template = get_prompt_template(mode, grade)
-            prompt = prompt_template.format(text=text)
+            prompt = get_prompt(mode, grade).render(text)
         
-        payload = {
-            "model": settings.NOTES_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.3,
-                "top_p": 0.9,
-                "max_tokens": 200
-            }
-        }
+        payload = build_payload(prompt)
         
         with httpx.Client(timeout=30.0) as client:
+            started = time.perf_counter()
             response = client.post(
                 settings.OLLAMA_URL,
                 json=payload,
                 headers={"Content-Type": "application/json"}
             )
+            latency = time.perf_counter() - started
+            OLLAMA_SECONDS.labels(kind="batch", status=response.status_code).observe(latency)
+            admission.record_ollama(latency)
             
             if response.status_code == 200:
                 result = response.json()
                 notes = result.get("response", "").strip()
                 return notes if notes else None
             else:
-                print(f"Ollama error: {response.status_code} - {response.text}")
+                logger.warning("Ollama request failed", extra={
+                    "stage": "ollama_batch", "status": response.status_code,
+                    "duration_ms": round(latency * 1000, 1), "error": response.text[:200]})
                 return None
                 
     except Exception as e:
-        print(f"Synchronous notes generation error: {e}")
+        ERRORS.labels(stage="ollama").inc()
+        logger.error("Synchronous notes generation failed", extra={"stage": "ollama_batch", "error": str(e)})
         return None
\ No newline at end of file
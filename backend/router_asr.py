@@ -2,20 +2,196 @@
 ASR router for audio ingestion and caption streaming.
 """
 import asyncio
+import ipaddress
+import logging
 import subprocess
 import time
+from typing import Optional
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from sse_starlette.sse import EventSourceResponse
 from utils.session import session_manager
 from utils.rate_limit import rate_limiter
-from asr import webm_to_pcm16, apply_vad, transcribe_chunk, transcribe_pcm16
+from asr import (webm_to_pcm16, apply_vad, apply_vad_frames, transcribe_segments,
+                 transcribe_pcm16, run_inference, segments_text, DECODE_PROFILES, PCMStreamDecoder,
+                 DurationExceeded, read_pcm_stream, transcribe_pcm_stream)
 from settings import settings
+from utils.metrics import registry, ERRORS
+from utils.tracing import tracer
+from utils.asr_filter import hallucination_filter
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+REJECTED = registry.counter(
+    "captiflo_rejected_total", "Audio requests rejected before processing", ["reason"]
+)
+CLIENT_VAD_CHUNKS = registry.counter(
+    "captiflo_client_vad_chunks_total", "Raw PCM chunks by client-side VAD verdict (silence counts suppressed chunks)", ["flag"]
+)
+SSE_FANOUT_SECONDS = registry.histogram(
+    "captiflo_sse_fanout_seconds", "Delay between a caption being stored and sent over /captions"
+)
+
+RATE_LIMIT_DETAIL = {
+    "session": "Rate limit exceeded for session",
+    "ip": "Rate limit exceeded for this network",
+    "global": "Server is at its transcription limit, retry shortly",
+}
+
+def trusted_proxy(host: Optional[str]) -> bool:
+    """Whether ``host`` is one of TRUSTED_PROXIES (addresses or CIDR ranges)."""
+    if not host:
+        return False
+    try:
+        address = ipaddress.ip_address(host.strip())
+    except ValueError:
+        return False
+    for proxy in settings.TRUSTED_PROXIES:
+        try:
+            if address in ipaddress.ip_network(proxy, strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    Client address for the per-IP budget. Proxy headers are honoured only when
+    TRUST_PROXY_HEADERS is on and the connection comes from a trusted proxy -
+    anyone else could pick a fresh IP per request. X-Forwarded-For is read from
+    the right: the first hop that isn't a trusted proxy is the client (hops to
+    its left are client-supplied).
+    """
+    peer = request.client.host if request.client else None
+    if not settings.TRUST_PROXY_HEADERS or not trusted_proxy(peer):
+        return peer
+    cf_ip = request.headers.get("cf-connecting-ip")
+    if cf_ip:
+        return cf_ip.strip()
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not trusted_proxy(hop):
+            return hop
+    return forwarded[0] if forwarded else peer
+
+def check_rate_limit(request: Request, session: str, audio_seconds: float) -> Optional[JSONResponse]:
+    """Charge the request to the rate limiter; returns a 429 response when rejected."""
+    allowed, scope = rate_limiter.check(session, client_ip(request), cost=max(1.0, audio_seconds))
+    if allowed:
+        return None
+    REJECTED.labels(reason=f"rate_limit_{scope}").inc()
+    return JSONResponse(
+        status_code=429,
+        content={"error": "rate_limit", "detail": RATE_LIMIT_DETAIL[scope]}
+    )
+
+def chunk_start_time(session_state, captured_at: Optional[float], audio_seconds: float) -> float:
+    """
+    Lecture time at which a chunk's audio began. The client's capture stamp
+    is used when it is plausible; a skewed client clock falls back to arrival.
+    """
+    arrival_start = time.time() - audio_seconds
+    if captured_at is None or abs(captured_at - arrival_start) > 5.0:
+        captured_at = arrival_start
+    return session_state.lecture_time(captured_at)
+
+def accepted_segments(session_state, segments: list) -> list:
+    """Post-ASR filter: drop hallucinated or no-speech segments before they reach the transcript."""
+    if not settings.ASR_FILTER_ENABLED or not segments:
+        return segments
+    return hallucination_filter.filter(segments, session_state.rolling_text)
+
+def check_profile(profile: str) -> Optional[JSONResponse]:
+    """Validate a decoder profile name; returns a 400 response when unknown."""
+    if profile in DECODE_PROFILES:
+        return None
+    return JSONResponse(
+        status_code=400,
+        content={"error": "invalid_profile", "detail": f"Profile must be one of: {', '.join(DECODE_PROFILES)}"}
+    )
+
+def content_length(request: Request) -> Optional[int]:
+    """Declared body size, or None when the header is missing or invalid (e.g. a chunked upload)."""
+    try:
+        length = int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+    return length if length >= 0 else None
+
+def capture_timestamp(request: Request, ts: Optional[float]) -> Optional[float]:
+    """Client capture time in epoch seconds, from ?ts= or X-Capture-Ts (epoch ms)."""
+    if ts is None:
+        header = request.headers.get("x-capture-ts")
+        if not header:
+            return None
+        try:
+            ts = float(header)
+        except ValueError:
+            return None
+    return ts / 1000.0
+
+async def stream_decode(request: Request, decoder: PCMStreamDecoder, work) -> tuple:
+    """
+    Stream the request body into the decoder as it arrives while ``work``
+    consumes the decoded PCM on a worker thread, so upload, decode and
+    inference overlap instead of running one after the other.
+    
+    Args:
+        decoder: Running PCMStreamDecoder
+        work: Callable taking the decoder's read function, run off the event loop
+    
+    Returns:
+        (compressed bytes received, result of work) - (0, None) for an empty body
+    """
+    async def feed() -> int:
+        received = 0
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    received += len(chunk)
+                    await run_in_threadpool(decoder.feed, chunk)
+        except BrokenPipeError:
+            pass  # ffmpeg stopped early (bad input or duration limit); the reader reports why
+        finally:
+            decoder.finish_input()
+        return received
+    
+    def consume():
+        try:
+            return work(decoder.read)
+        except BaseException:
+            decoder.kill()  # unblocks feed() if it is waiting on a full pipe
+            raise
+    
+    try:
+        received, result = await asyncio.gather(feed(), run_in_threadpool(consume), return_exceptions=True)
+        if isinstance(received, BaseException):
+            raise received
+        if received and isinstance(result, BaseException):
+            raise result
+    except BaseException:
+        decoder.kill()
+        try:
+            decoder.close()
+        except subprocess.CalledProcessError:
+            pass
+        raise
+    if not received:
+        decoder.kill()
+        try:
+            decoder.close()
+        except subprocess.CalledProcessError:
+            pass
+        return 0, None
+    # Raises CalledProcessError when ffmpeg couldn't decode the upload
+    decoder.close()
+    return received, result
+
 @router.post("/ingest")
-async def ingest(request: Request, session: str, lang: str = "auto", vad: int = 1):
+async def ingest(request: Request, session: str, lang: str = "auto", vad: int = 1, ts: Optional[float] = None,
+                 profile: str = "live", timings: Optional[bool] = None):
     """
     Ingest audio chunks for transcription.
     
@@ -23,21 +199,26 @@ async def ingest(request: Request, session: str, lang: str = "auto", vad: int =
         session: UUID session identifier
         lang: Language (auto, en, es, zh, or class names)
         vad: VAD sensitivity level (0-3)
+        ts: Client capture timestamp (epoch ms) for latency tracing
+        profile: Decoder profile (live, balanced, batch)
+        timings: Keep segment/word timings in the session transcript (default TRANSCRIPT_TIMINGS)
     """
+    invalid = check_profile(profile)
+    if invalid:
+        return invalid
     
-    # Rate limiting per session
-    if not rate_limiter.is_allowed(session, tokens=1.0):
-        return JSONResponse(
-            status_code=429,
-            content={"error": "rate_limit", "detail": "Rate limit exceeded for session"}
-        )
+    # Rate limiting per session, IP and globally (live chunks are ~1s of audio)
+    rejected = check_rate_limit(request, session, audio_seconds=1.0)
+    if rejected:
+        return rejected
     
     # Get or create session
     session_state = session_manager.get_or_create_session(session)
     if not session_state:
+        REJECTED.labels(reason="capacity").inc()
         return JSONResponse(
             status_code=429,
-            content={"error": "capacity", "detail": f"At capacity ({settings.MAX_CONCURRENT_SESSIONS} sessions)"}
+            content={"error": "capacity", "detail": f"At capacity ({session_manager.capacity()} sessions)"}
         )
     
     # Check Content-Type (be flexible)
@@ -57,34 +238,50 @@ async def ingest(request: Request, session: str, lang: str = "auto", vad: int =
             content={"error": "no_audio"}
         )
     
+    captured_at = capture_timestamp(request, ts)
+    trace = tracer.start(session, captured_at)
     try:
-        # Decode audio
-        pcm_data = webm_to_pcm16(audio_buffer)
+        # Decode audio (ffmpeg runs on a worker thread, not the event loop)
+        with tracer.span(trace, "decode"):
+            pcm_data = await run_in_threadpool(webm_to_pcm16, audio_buffer)
         if not pcm_data:
             # Touch session even for empty results
             session_manager.touch_session(session)
+            tracer.finish(trace, "empty")
             return JSONResponse({"ok": True, "partial": ""})
         
         # Apply VAD filtering
-        filtered_pcm = apply_vad(pcm_data, vad)
+        with tracer.span(trace, "vad"):
+            filtered_pcm, kept_frames = apply_vad_frames(pcm_data, vad)
         if not filtered_pcm:
             # Touch session even for filtered out audio
             session_manager.touch_session(session)
+            tracer.finish(trace, "silence")
             return JSONResponse({"ok": True, "partial": ""})
         
-        # Transcribe
-        text = transcribe_chunk(filtered_pcm, lang)
+        # Transcribe on the inference pool
+        keep_timings = settings.TRANSCRIPT_TIMINGS if timings is None else timings
+        with tracer.span(trace, "transcribe"):
+            segments = await run_inference(transcribe_segments, filtered_pcm, lang, lang_cache=session_state.language,
+                                           profile=profile, word_timestamps=keep_timings)
+        segments = accepted_segments(session_state, segments)
+        text = segments_text(segments)
+        if keep_timings and segments:
+            chunk_start = chunk_start_time(session_state, captured_at, len(pcm_data) / 32000)
+            session_state.timeline.add_segments(segments, chunk_start, kept_frames)
         
         # Update session with new text (this also touches the session)
         if text:
-            session_state.add_text(text)
+            session_state.add_text(text, trace=trace)
         else:
             # Touch session even if no text was transcribed
             session_manager.touch_session(session)
+            tracer.finish(trace, "no_text")
         
         return JSONResponse({"ok": True, "partial": text})
         
     except FileNotFoundError as e:
+        tracer.finish(trace, "error")
         if "ffmpeg_missing" in str(e):
             return JSONResponse(
                 status_code=503,
@@ -92,19 +289,26 @@ async def ingest(request: Request, session: str, lang: str = "auto", vad: int =
             )
         raise
     except subprocess.CalledProcessError as e:
+        tracer.finish(trace, "error")
+        ERRORS.labels(stage="decode").inc()
+        logger.warning("Audio decode failed", extra={"session": session, "stage": "decode", "error": str(e)[:200]})
         return JSONResponse(
             status_code=400,
             content={"error": "decode_failed", "detail": str(e)[:200]}
         )
     except Exception as e:
-        print(f"Ingest error for session {session}: {e}")
+        tracer.finish(trace, "error")
+        ERRORS.labels(stage="ingest").inc()
+        logger.error("Ingest failed", extra={"session": session, "stage": "ingest", "error": str(e)})
         return JSONResponse(
             status_code=500,
             content={"error": "internal_error", "detail": f"Processing error: {str(e)[:200]}"}
         )
 
 @router.post("/ingest-raw")
-async def ingest_raw(request: Request, session: str, lang: str = "auto", vad: int = 1):
+async def ingest_raw(request: Request, session: str, lang: str = "auto", vad: int = 1, ts: Optional[float] = None,
+                     profile: str = "live", timings: Optional[bool] = None, speech: Optional[int] = None,
+                     silent: int = 1):
     """
     Ingest raw PCM16 audio chunks for transcription (FFmpeg fallback path).
     
@@ -112,7 +316,16 @@ async def ingest_raw(request: Request, session: str, lang: str = "auto", vad: in
         session: UUID session identifier
         lang: Language (auto, en, es, zh, or class names)
         vad: VAD sensitivity level (0-3)
+        ts: Client capture timestamp (epoch ms) for latency tracing
+        profile: Decoder profile (live, balanced, batch)
+        timings: Keep segment/word timings in the session transcript (default TRANSCRIPT_TIMINGS)
+        speech: Client-side VAD verdict - 1 for a chunk with speech, 0 for a
+            heartbeat standing in for suppressed silence (body is ignored)
+        silent: Number of silent chunks a heartbeat stands for
     """
+    invalid = check_profile(profile)
+    if invalid:
+        return invalid
     
     # Check if raw ingest is allowed
     if not settings.ALLOW_RAW_INGEST:
@@ -121,21 +334,44 @@ async def ingest_raw(request: Request, session: str, lang: str = "auto", vad: in
             content={"error": "raw_ingest_disabled", "detail": "Raw PCM ingest is disabled"}
         )
     
-    # Rate limiting per session
-    if not rate_limiter.is_allowed(session, tokens=1.0):
-        return JSONResponse(
-            status_code=429,
-            content={"error": "rate_limit", "detail": "Rate limit exceeded for session"}
-        )
+    # The budgets charge by audio seconds, so the size must be known (and bounded)
+    # before the body is read; heartbeats carry no audio
+    declared = content_length(request)
+    if speech != 0:
+        if declared is None:
+            return JSONResponse(
+                status_code=411,
+                content={"error": "length_required", "detail": "Content-Length is required"}
+            )
+        if declared > settings.RAW_INGEST_MAX_SECS * 32000:
+            return JSONResponse(
+                status_code=413,
+                content={"error": "too_large", "detail": f"Chunks are limited to {settings.RAW_INGEST_MAX_SECS:g} s of audio"}
+            )
+    
+    # Rate limiting per session, IP and globally (s16le at 16kHz = 32,000 bytes per second)
+    rejected = check_rate_limit(request, session, audio_seconds=(declared or 0) / 32000)
+    if rejected:
+        return rejected
     
     # Get or create session
     session_state = session_manager.get_or_create_session(session)
     if not session_state:
+        REJECTED.labels(reason="capacity").inc()
         return JSONResponse(
             status_code=429,
-            content={"error": "capacity", "detail": f"At capacity ({settings.MAX_CONCURRENT_SESSIONS} sessions)"}
+            content={"error": "capacity", "detail": f"At capacity ({session_manager.capacity()} sessions)"}
         )
     
+    # Heartbeat from a client whose VAD suppressed silence: the worklet uses the
+    # same frame gate as apply_vad, so there is nothing to decode or transcribe
+    if speech == 0:
+        CLIENT_VAD_CHUNKS.labels(flag="silence").inc(max(1, silent))
+        session_manager.touch_session(session)
+        return JSONResponse({"ok": True, "partial": ""})
+    if speech == 1:
+        CLIENT_VAD_CHUNKS.labels(flag="speech").inc()
+    
     # Check Content-Type
     content_type = request.headers.get("content-type", "").lower()
     if content_type and "application/octet-stream" not in content_type:
@@ -152,21 +388,31 @@ async def ingest_raw(request: Request, session: str, lang: str = "auto", vad: in
             content={"error": "no_audio"}
         )
     
+    captured_at = capture_timestamp(request, ts)
+    trace = tracer.start(session, captured_at)
+    keep_timings = settings.TRANSCRIPT_TIMINGS if timings is None else timings
+    chunk_start = chunk_start_time(session_state, captured_at, len(pcm_buffer) / 32000)
     try:
-        # Apply VAD and transcribe directly (transcribe_pcm16 handles VAD internally)
-        text = transcribe_pcm16(pcm_buffer, lang)
+        # Apply VAD and transcribe on the inference pool (transcribe_pcm16 handles VAD internally)
+        text = await run_inference(transcribe_pcm16, pcm_buffer, lang, trace=trace, lang_cache=session_state.language,
+                                   profile=profile, timeline=session_state.timeline if keep_timings else None,
+                                   chunk_start=chunk_start, sensitivity=vad,
+                                   accept=lambda segments: accepted_segments(session_state, segments))
         
         # Update session with new text (this also touches the session)
         if text:
-            session_state.add_text(text)
+            session_state.add_text(text, trace=trace)
         else:
             # Touch session even if no text was transcribed
             session_manager.touch_session(session)
+            tracer.finish(trace, "no_text")
         
         return JSONResponse({"ok": True, "partial": text})
         
     except Exception as e:
-        print(f"Raw ingest error for session {session}: {e}")
+        tracer.finish(trace, "error")
+        ERRORS.labels(stage="ingest_raw").inc()
+        logger.error("Raw ingest failed", extra={"session": session, "stage": "ingest_raw", "error": str(e)})
         return JSONResponse(
             status_code=500,
             content={"error": "internal_error", "detail": f"Processing error: {str(e)[:200]}"}
@@ -213,6 +459,27 @@ async def reserve_session(session: str):
     else:  # queued
         return JSONResponse({"ok": True, **result}, status_code=202)
 
+@router.get("/session/transcript")
+async def session_transcript(session: str, since: float = 0.0, min_logprob: Optional[float] = None,
+                             max_no_speech: Optional[float] = None, words: bool = True):
+    """
+    Export the session transcript with lecture-relative timings (needs timings enabled on ingest).
+    
+    Args:
+        session: UUID session identifier
+        since: Only segments ending after this lecture time (seconds)
+        min_logprob: Drop segments with a lower avg_logprob
+        max_no_speech: Drop segments with a higher no_speech_prob
+        words: Include word timings
+    """
+    session_state = session_manager.get_session(session)
+    if not session_state:
+        return JSONResponse(status_code=404, content={"error": "session_not_found"})
+    return JSONResponse({
+        "ok": True,
+        "segments": session_state.timeline.export(since, min_logprob, max_no_speech, words=words),
+    })
+
 @router.get("/queue")
 async def get_queue_status(session: str):
     """
@@ -229,6 +496,51 @@ async def get_queue_status(session: str):
     result = session_manager.get_queue_status(session)
     return JSONResponse(result)
 
+@router.get("/queue/stream")
+async def queue_stream(session: str):
+    """
+    Push queue status via SSE instead of making the client poll /queue.
+    
+    Sends a "position" event whenever the client's place in the queue changes
+    and a final "active" (promoted) or "none" (not queued) event, then closes.
+    
+    Args:
+        session: UUID session identifier
+    """
+    
+    async def event_generator():
+        import json
+        last_status = None
+        version = session_manager.version
+        try:
+            while True:
+                # Also touches the queue entry, so a connected client never expires
+                status = session_manager.get_queue_status(session)
+                if status["status"] != "queued":
+                    yield {"event": status["status"], "data": json.dumps(status)}
+                    break
+                if status != last_status:
+                    yield {"event": "position", "data": json.dumps(status)}
+                    last_status = status
+                # Idle wake-ups double as keepalives (sent by EventSourceResponse)
+                version = await session_manager.wait_for_change(version, settings.KEEPALIVE_SECS)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            ERRORS.labels(stage="queue_stream").inc()
+            logger.error("Queue stream failed", extra={"session": session, "stage": "queue_stream", "error": str(e)})
+    
+    return EventSourceResponse(
+        event_generator(),
+        ping=settings.KEEPALIVE_SECS,
+        headers={
+            "Cache-Control": "no-cache, no-transform",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control"
+        }
+    )
+
 @router.get("/captions")
 async def captions(session: str):
     """
@@ -270,6 +582,13 @@ async def captions(session: str):
                 if current_text and current_text != last_sent_text:
                     import json
                     data = json.dumps({"text": current_text})
+                    if session_state.text_timestamps:
+                        SSE_FANOUT_SECONDS.observe(time.time() - session_state.text_timestamps[-1])
+                    # Close out sampled traces whose text is being sent to the client
+                    pending, session_state.pending_traces = session_state.pending_traces, []
+                    for trace in pending:
+                        trace.mark("sse")
+                        tracer.finish(trace)
                     yield f"data: {data}\n\n"
                     last_sent_text = current_text
                     last_keepalive = time.time()
@@ -288,7 +607,8 @@ async def captions(session: str):
             pass
         except Exception as e:
             # Log error but don't send error frame to client
-            print(f"Caption stream error: {e}")
+            ERRORS.labels(stage="captions").inc()
+            logger.error("Caption stream failed", extra={"session": session, "stage": "captions", "error": str(e)})
             pass  # Stream already closed
     
     return EventSourceResponse(
@@ -303,7 +623,8 @@ async def captions(session: str):
     )
 
 @router.post("/batch_transcribe")
-async def batch_transcribe(request: Request, session: str, interval: int = 30, mode: str = "English"):
+async def batch_transcribe(request: Request, session: str, interval: int = 30, mode: str = "English",
+                           profile: str = "batch", timings: Optional[bool] = None):
     """
     Batch transcribe audio using Google Cloud Speech-to-Text v2 or Whisper.
     
@@ -311,7 +632,12 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
         session: UUID session identifier
         interval: Batch interval in seconds (30 or 60)
         mode: Class mode for language mapping and notes generation
+        profile: Whisper decoder profile (live, balanced, batch)
+        timings: Keep Whisper segment/word timings in the session transcript (default TRANSCRIPT_TIMINGS)
     """
+    invalid = check_profile(profile)
+    if invalid:
+        return invalid
     
     # Validate interval
     if interval not in [30, 60]:
@@ -320,19 +646,18 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
             content={"error": "invalid_interval", "detail": "Interval must be 30 or 60 seconds"}
         )
     
-    # Rate limiting per session
-    if not rate_limiter.is_allowed(session, tokens=1.0):
-        return JSONResponse(
-            status_code=429,
-            content={"error": "rate_limit", "detail": "Rate limit exceeded for session"}
-        )
+    # Rate limiting per session, IP and globally (a batch is `interval` seconds of audio)
+    rejected = check_rate_limit(request, session, audio_seconds=interval)
+    if rejected:
+        return rejected
     
     # Get or create session
     session_state = session_manager.get_or_create_session(session)
     if not session_state:
+        REJECTED.labels(reason="capacity").inc()
         return JSONResponse(
             status_code=429,
-            content={"error": "capacity", "detail": f"At capacity ({settings.MAX_CONCURRENT_SESSIONS} sessions)"}
+            content={"error": "capacity", "detail": f"At capacity ({session_manager.capacity()} sessions)"}
         )
     
     # Check Content-Type (be flexible)
@@ -344,47 +669,61 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
             content={"error": "invalid_content_type", "detail": f"Content-Type must be one of: {', '.join(allowed_types)}"}
         )
     
-    # Get audio data
-    audio_buffer = await request.body()
-    if not audio_buffer:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "no_audio"}
-        )
+    session_state.mode = mode
+    keep_timings = settings.TRANSCRIPT_TIMINGS if timings is None else timings
+    trace = tracer.start(session)
     
     try:
-        # Decode audio to 16kHz mono PCM
-        pcm_data = webm_to_pcm16(audio_buffer)
-        if not pcm_data:
-            session_manager.touch_session(session)
-            return JSONResponse({"ok": True, "text": "", "notes": []})
-        
-        # Verify duration doesn't exceed 60s
-        estimated_duration_seconds = len(pcm_data) / 32000  # 16kHz mono s16le = 32,000 bytes per second
-        if estimated_duration_seconds > 60:
+        # Decode the upload while it arrives; Whisper transcribes each piece as soon
+        # as it is decoded, Google needs the whole clip so the PCM is collected
+        decoder = PCMStreamDecoder()
+        use_google = settings.TRANSCRIBE_ENGINE == "google_stt_v2"
+        if use_google:
+            work = lambda read: read_pcm_stream(read, max_seconds=60)
+        else:
+            work = lambda read: transcribe_pcm_stream(
+                read, mode, lang_cache=session_state.language, profile=profile,
+                word_timestamps=keep_timings,
+                accept=lambda segments: accepted_segments(session_state, segments), max_seconds=60
+            )
+        # Upload, decode and (for Whisper) transcription overlap, so they share one span
+        with tracer.span(trace, "decode_transcribe"):
+            received, result = await stream_decode(request, decoder, work)
+        if not received:
+            tracer.finish(trace, "empty")
             return JSONResponse(
                 status_code=400,
-                content={"error": "duration_exceeded", "detail": f"Audio duration ~{estimated_duration_seconds:.1f}s exceeds 60s limit"}
+                content={"error": "no_audio"}
             )
         
         # Transcribe using selected engine
         text = ""
-        if settings.TRANSCRIBE_ENGINE == "google_stt_v2":
+        if use_google:
+            pcm_data = result
+            if not pcm_data:
+                session_manager.touch_session(session)
+                tracer.finish(trace, "empty")
+                return JSONResponse({"ok": True, "text": "", "notes": []})
             try:
                 from stt_google_v2 import recognize_short, map_language_to_gcp
                 language_code = map_language_to_gcp(mode)
-                text = recognize_short(pcm_data, language_code)
+                text = await run_in_threadpool(recognize_short, pcm_data, language_code)
             except Exception as e:
-                print(f"Google Speech v2 failed, falling back to Whisper: {e}")
+                logger.warning("Google Speech v2 failed, falling back to Whisper",
+                               extra={"session": session, "stage": "google_stt", "error": str(e)})
                 # Fallback to Whisper
                 filtered_pcm = apply_vad(pcm_data, sensitivity=1)
                 if filtered_pcm:
-                    text = transcribe_chunk(filtered_pcm, mode)
+                    segments = await run_inference(transcribe_segments, filtered_pcm, mode,
+                                                   lang_cache=session_state.language, profile=profile)
+                    text = segments_text(accepted_segments(session_state, segments))
         else:
-            # Use Whisper
-            filtered_pcm = apply_vad(pcm_data, sensitivity=1)
-            if filtered_pcm:
-                text = transcribe_chunk(filtered_pcm, mode)
+            pieces, decoded_seconds = result
+            text = segments_text([segment for _, segments, _ in pieces for segment in segments])
+            if keep_timings and pieces:
+                upload_start = chunk_start_time(session_state, None, decoded_seconds)
+                for offset, segments, kept_frames in pieces:
+                    session_state.timeline.add_segments(segments, upload_start + offset, kept_frames)
         
         # Generate notes if we have text
         notes = []
@@ -404,7 +743,8 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
                     # Ensure bullet points start with •
                     notes = [f"• {note}" if not note.startswith('•') else note for note in notes]
             except Exception as e:
-                print(f"Notes generation failed: {e}")
+                logger.warning("Notes generation failed",
+                               extra={"session": session, "stage": "batch_notes", "error": str(e)})
                 # Continue without notes
         
         # Update session with new text (this also touches the session)
@@ -412,6 +752,8 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
             session_state.add_text(text)
         else:
             session_manager.touch_session(session)
+        # Not a live caption, so it stays out of the end-to-end latency figures
+        tracer.finish(trace, "batch" if text else "no_text")
         
         return JSONResponse({
             "ok": True,
@@ -420,6 +762,7 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
         })
         
     except FileNotFoundError as e:
+        tracer.finish(trace, "error")
         if "ffmpeg_missing" in str(e):
             return JSONResponse(
                 status_code=503,
@@ -427,154 +770,21 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
             )
         raise
     except subprocess.CalledProcessError as e:
+        tracer.finish(trace, "error")
+        ERRORS.labels(stage="decode").inc()
+        logger.warning("Audio decode failed", extra={"session": session, "stage": "decode", "error": str(e)[:200]})
         return JSONResponse(
             status_code=400,
             content={"error": "decode_failed", "detail": str(e)[:200]}
         )
-    except ValueError as e:
-        if "exceeds" in str(e):
-            return JSONResponse(
-                status_code=400,
-                content={"error": "size_limit_exceeded", "detail": str(e)}
-            )
-        raise
-    except Exception as e:
-        print(f"Batch transcribe error for session {session}: {e}")
-        return JSONResponse(
-            status_code=500,
-            content={"error": "internal_error", "detail": f"Processing error: {str(e)[:200]}"}
-        )
-
-@router.post("/batch_transcribe")
-async def batch_transcribe(request: Request, session: str, interval: int = 30, mode: str = "English"):
-    """
-    Batch transcribe audio using Google Cloud Speech-to-Text v2 or Whisper.
-    
-    Args:
-        session: UUID session identifier
-        interval: Batch interval in seconds (30 or 60)
-        mode: Class mode for language mapping and notes generation
-    """
-    
-    # Validate interval
-    if interval not in [30, 60]:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "invalid_interval", "detail": "Interval must be 30 or 60 seconds"}
-        )
-    
-    # Rate limiting per session
-    if not rate_limiter.is_allowed(session, tokens=1.0):
-        return JSONResponse(
-            status_code=429,
-            content={"error": "rate_limit", "detail": "Rate limit exceeded for session"}
-        )
-    
-    # Get or create session
-    session_state = session_manager.get_or_create_session(session)
-    if not session_state:
-        return JSONResponse(
-            status_code=429,
-            content={"error": "capacity", "detail": f"At capacity ({settings.MAX_CONCURRENT_SESSIONS} sessions)"}
-        )
-    
-    # Check Content-Type (be flexible)
-    content_type = request.headers.get("content-type", "").lower()
-    allowed_types = ["audio/webm", "audio/ogg", "application/octet-stream"]
-    if content_type and not any(ct in content_type for ct in allowed_types):
+    except DurationExceeded as e:
+        tracer.finish(trace, "error")
         return JSONResponse(
             status_code=400,
-            content={"error": "invalid_content_type", "detail": f"Content-Type must be one of: {', '.join(allowed_types)}"}
-        )
-    
-    # Get audio data
-    audio_buffer = await request.body()
-    if not audio_buffer:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "no_audio"}
-        )
-    
-    try:
-        # Decode audio to 16kHz mono PCM
-        pcm_data = webm_to_pcm16(audio_buffer)
-        if not pcm_data:
-            session_manager.touch_session(session)
-            return JSONResponse({"ok": True, "text": "", "notes": []})
-        
-        # Verify duration doesn't exceed 60s
-        estimated_duration_seconds = len(pcm_data) / 32000  # 16kHz mono s16le = 32,000 bytes per second
-        if estimated_duration_seconds > 60:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "duration_exceeded", "detail": f"Audio duration ~{estimated_duration_seconds:.1f}s exceeds 60s limit"}
-            )
-        
-        # Transcribe using selected engine
-        text = ""
-        if settings.TRANSCRIBE_ENGINE == "google_stt_v2":
-            try:
-                from stt_google_v2 import recognize_short, map_language_to_gcp
-                language_code = map_language_to_gcp(mode)
-                text = recognize_short(pcm_data, language_code)
-            except Exception as e:
-                print(f"Google Speech v2 failed, falling back to Whisper: {e}")
-                # Fallback to Whisper
-                filtered_pcm = apply_vad(pcm_data, sensitivity=1)
-                if filtered_pcm:
-                    text = transcribe_chunk(filtered_pcm, mode)
-        else:
-            # Use Whisper
-            filtered_pcm = apply_vad(pcm_data, sensitivity=1)
-            if filtered_pcm:
-                text = transcribe_chunk(filtered_pcm, mode)
-        
-        # Generate notes if we have text
-        notes = []
-        if text and text.strip():
-            try:
-                from notes import generate_notes_for_text
-                # Extract grade from session or use default
-                grade = getattr(session_state, 'grade', '9')  # Default to 9th grade
-                
-                # Generate notes with appropriate prompt
-                prompt = f"You are a {grade}th grader in {mode}. Convert this {interval}-second transcript into concise, useful notes. If there's nothing meaningful, write nothing."
-                notes_text = generate_notes_for_text(text, prompt)
-                
-                if notes_text and notes_text.strip():
-                    # Split notes into bullet points
-                    notes = [line.strip() for line in notes_text.split('\n') if line.strip()]
-                    # Ensure bullet points start with •
-                    notes = [f"• {note}" if not note.startswith('•') else note for note in notes]
-            except Exception as e:
-                print(f"Notes generation failed: {e}")
-                # Continue without notes
-        
-        # Update session with new text (this also touches the session)
-        if text:
-            session_state.add_text(text)
-        else:
-            session_manager.touch_session(session)
-        
-        return JSONResponse({
-            "ok": True,
-            "text": text,
-            "notes": notes
-        })
-        
-    except FileNotFoundError as e:
-        if "ffmpeg_missing" in str(e):
-            return JSONResponse(
-                status_code=503,
-                content={"error": "ffmpeg_missing", "detail": "FFmpeg not found on server"}
-            )
-        raise
-    except subprocess.CalledProcessError as e:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "decode_failed", "detail": str(e)[:200]}
+            content={"error": "duration_exceeded", "detail": str(e)}
         )
     except ValueError as e:
+        tracer.finish(trace, "error")
         if "exceeds" in str(e):
             return JSONResponse(
                 status_code=400,
@@ -582,7 +792,10 @@ async def batch_transcribe(request: Request, session: str, interval: int = 30, m
             )
         raise
     except Exception as e:
-        print(f"Batch transcribe error for session {session}: {e}")
+        tracer.finish(trace, "error")
+        ERRORS.labels(stage="batch_transcribe").inc()
+        logger.error("Batch transcribe failed",
+                     extra={"session": session, "stage": "batch_transcribe", "error": str(e)})
         return JSONResponse(
             status_code=500,
             content={"error": "internal_error", "detail": f"Processing error: {str(e)[:200]}"}
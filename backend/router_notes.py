@@ -2,12 +2,18 @@
 Notes router for SSE streaming of live notes.
 """
 import asyncio
+import logging
 import time
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from sse_starlette.sse import EventSourceResponse
 from utils.session import session_manager
 from notes import notes_generator
+from summary import summary_jobs
 from settings import settings
+from utils.metrics import ERRORS
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -39,6 +45,8 @@ async def notes_stream(session: str, mode: str = "default", grade: int = 9):
                 
                 # Touch session to mark it as active
                 session_manager.touch_session(session)
+                session_state.mode = mode
+                session_state.grade = grade
                 
                 # Get text from last 10 seconds for notes generation
                 recent_text = session_state.get_text_from_last_seconds(seconds=10)
@@ -48,9 +56,23 @@ async def notes_stream(session: str, mode: str = "default", grade: int = 9):
                     # Only generate notes if text has changed significantly
                     current_hash = hash(recent_text)
                     if current_hash != last_text_hash:
-                        notes = await notes_generator.get_notes_for_session(
-                            session, recent_text, mode, grade
-                        )
+                        # Skip or defer windows that mostly repeat what's already in the notes
+                        notes_text = recent_text
+                        if settings.NOTES_NOVELTY_ENABLED:
+                            notes_text = session_state.notes_gate.check(recent_text)
+                        notes = None
+                        if notes_text:
+                            try:
+                                notes = await notes_generator.get_notes_for_session(
+                                    session, notes_text, mode, grade
+                                )
+                            finally:
+                                # Only windows that really got notes count as covered
+                                if settings.NOTES_NOVELTY_ENABLED:
+                                    if notes:
+                                        session_state.notes_gate.commit()
+                                    else:
+                                        session_state.notes_gate.release()
                         
                         if notes and notes != last_sent_notes:
                             import json
@@ -75,8 +97,8 @@ async def notes_stream(session: str, mode: str = "default", grade: int = 9):
             pass
         except Exception as e:
             # Log error but don't send error frame to client
-            print(f"Notes generation error: {e}")
-            pass  # Stream already closed
+            ERRORS.labels(stage="notes_stream").inc()
+            logger.error("Notes stream failed", extra={"session": session, "stage": "notes_stream", "error": str(e)})
     
     return EventSourceResponse(
         event_generator(),
@@ -87,4 +109,21 @@ async def notes_stream(session: str, mode: str = "default", grade: int = 9):
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Cache-Control"
         }
-    )
\ No newline at end of file
+    )
+
+@router.get("/session/summary")
+async def session_summary(session: str):
+    """
+    Whole-lecture notes, generated in the background once the session ends.
+    
+    Args:
+        session: UUID session identifier
+    
+    Returns:
+        {"status": "pending"|"running"|"done"|"failed", "summary": ...}
+    """
+    job = summary_jobs.get(session)
+    if not job:
+        status = "live" if session_manager.get_session(session) else "none"
+        return JSONResponse(status_code=404, content={"error": "no_summary", "status": status})
+    return JSONResponse({"ok": job["status"] == "done", **job})
@@ -18,10 +18,38 @@ class Settings(BaseSettings):
     TRANSCRIBE_ENGINE: str = "google_stt_v2"  # "whisper" or "google_stt_v2"
     
     # Whisper settings (kept for fallback)
-    WHISPER_MODEL: str = "large-v3"
+    WHISPER_MODEL: str = "large-v3"  # or tiny..large-v3, *.en, distil-large-v3, distil-medium.en, distil-small.en
     WHISPER_DEVICE: str = "auto"  # auto|cuda|cpu
     WHISPER_COMPUTE_TYPE_CUDA: str = "float16"
     WHISPER_COMPUTE_TYPE_CPU: str = "int8"
+    WHISPER_PRELOAD: bool = True  # load the model in the background at startup (live /ingest always uses Whisper)
+    # Checkpoint per Whisper language code; other languages use WHISPER_MODEL. English-only
+    # modes (Biology, English, Global History) decode as "en", so they get the distilled model
+    WHISPER_MODEL_ROUTES: dict = {"en": "distil-large-v3"}
+    # Draft cascade: decoder profiles listed here decode with WHISPER_DRAFT_MODEL first and only
+    # run the full model when the draft is unsure (English-only drafts apply to English only).
+    # Accepted drafts are draft-model output, not checked against the full model - confidence
+    # is not accuracy, so measure the gap with WHISPER_DRAFT_AUDIT_RATE before enabling it
+    WHISPER_DRAFT_MODEL: str = "small"
+    WHISPER_DRAFT_PROFILES: list = []  # e.g. ["live"]
+    WHISPER_DRAFT_MIN_LOGPROB: float = -0.6  # every draft segment's avg_logprob must reach this
+    WHISPER_DRAFT_MAX_COMPRESSION: float = 2.4  # higher compression ratio = repetition loop, re-decode
+    WHISPER_DRAFT_AUDIT_RATE: float = 0.0  # fraction of accepted drafts re-decoded in the background for captiflo_draft_wer
+    # CPU layout (utils/cpu_layout.py) - bench/calibrate_cpu.py recommends values for a machine
+    WHISPER_NUM_WORKERS: int = 0  # concurrent transcriptions; 0 = INFERENCE_PARALLELISM
+    WHISPER_CPU_THREADS: int = 0  # intra-op threads per worker; 0 = split the usable physical cores evenly
+    CPU_RESERVED_CORES: int = 1   # physical cores kept free for the event loop and ffmpeg
+    CPU_PIN_WORKERS: bool = False # pin inference threads to the non-reserved cores (Linux)
+    
+    # CPU compute-type/model calibration (utils/calibration.py, bench/calibrate_compute.py)
+    WHISPER_CALIBRATE: str = "off"  # off | cached (use a cached result) | startup (calibrate if none cached)
+    CALIBRATION_AUDIO: str = "calibration/reference.wav"  # 16kHz mono 16-bit clip, ~20-30s of speech
+    CALIBRATION_TRANSCRIPT: str = "calibration/reference.txt"  # its transcript (optional)
+    CALIBRATION_LANGUAGE: str = "en"
+    CALIBRATION_MODELS: list = []  # smallest to largest; empty = WHISPER_MODEL only
+    CALIBRATION_COMPUTE_TYPES: list = ["int8", "int8_float32", "int16", "float32"]
+    CALIBRATION_WER_TOLERANCE: float = 0.02  # absolute WER allowed above the most accurate candidate
+    CALIBRATION_CACHE: str = ".cache/whisper_calibration.json"
     
     # Google Cloud Speech-to-Text v2 settings
     GCP_LOCATION: str = "global"  # or a region like "us-central1"
@@ -38,12 +66,20 @@ class Settings(BaseSettings):
     # Ollama settings
     NOTES_MODEL: str = "phi3:mini"
     OLLAMA_URL: str = "http://127.0.0.1:11434/api/generate"
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a request
+    OLLAMA_PRELOAD: bool = True     # load the model (and prompt prefix) at startup
     
-    # Logging
-    LOG_LEVEL: str = "warning"
+    # Logging (utils/log.py) - records go through a bounded queue to a writer thread
+    LOG_LEVEL: str = "info"
+    LOG_FORMAT: str = "json"  # json (one object per line) | text
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped, never waited for
+    LOG_SAMPLE_BURST: int = 20   # records per message per window before sampling kicks in (0 = off)
+    LOG_SAMPLE_WINDOW: float = 1.0
     
     # Dev mode detection
     DEV_MODE: bool = os.getenv("DEV_MODE", "false").lower() == "true"
+    # /debug/* endpoints: open in DEV_MODE, otherwise only with this token in X-Debug-Token (empty = closed)
+    DEBUG_TOKEN: str = ""
     
     # FFmpeg settings
     FFMPEG_BIN: str = "ffmpeg"
@@ -51,9 +87,78 @@ class Settings(BaseSettings):
     # Session management
     INACTIVE_SECS: int = 90
     KEEPALIVE_SECS: int = 10
+    QUEUE_GC_INTERVAL: float = 1.0  # background expiry/promotion sweep
+    
+    # Admission control - "adaptive" sizes capacity from measured inference RTF
+    # and Ollama latency; "static" always uses MAX_CONCURRENT_SESSIONS, which is
+    # also the adaptive starting point until enough has been measured
+    ADMISSION_MODE: str = "adaptive"
+    ADMISSION_MIN_SESSIONS: int = 1
+    ADMISSION_MAX_SESSIONS: int = 20
+    ADMISSION_TARGET_UTILIZATION: float = 0.7
+    INFERENCE_PARALLELISM: int = 1   # transcriptions that can run at once
+    OLLAMA_PARALLEL: int = 1         # matches Ollama's OLLAMA_NUM_PARALLEL
+    
+    # Rate limiting - per-IP and global budgets are in audio seconds (0 disables)
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" or "redis" (shared across workers)
+    RATE_LIMIT_REDIS_URL: str = "redis://127.0.0.1:6379/0"
+    RATE_LIMIT_MAX_BUCKETS: int = 10000
+    RATE_LIMIT_IP_CAPACITY: float = 300.0
+    RATE_LIMIT_IP_REFILL: float = 20.0
+    RATE_LIMIT_GLOBAL_CAPACITY: float = 600.0
+    RATE_LIMIT_GLOBAL_REFILL: float = 40.0
+    # Behind a proxy (Cloudflare tunnel, nginx): take the client IP from CF-Connecting-IP /
+    # X-Forwarded-For, but only on connections from TRUSTED_PROXIES (addresses or CIDR ranges)
+    TRUST_PROXY_HEADERS: bool = False
+    TRUSTED_PROXIES: list = ["127.0.0.1", "::1"]
+    
+    # Static frontend - served from an in-memory manifest built at startup
+    STATIC_PRECOMPRESS: bool = True  # gzip (and brotli, if installed) files without prebuilt .gz/.br
     
     # Raw PCM ingest fallback
     ALLOW_RAW_INGEST: bool = True
+    RAW_INGEST_MAX_SECS: float = 10.0  # longest /ingest-raw chunk (live chunks are ~1 s); larger bodies get 413
+    
+    # Latency tracing - fraction of ingested chunks traced end to end
+    TRACE_SAMPLE_RATE: float = 0.1
+    
+    # Language ID for lang=auto - detect once per session on the first seconds of
+    # speech, then re-check every LANGID_RECHECK_SECS or after poor decodes
+    LANGID_DETECT_SECS: float = 3.0      # speech collected before detecting
+    LANGID_MIN_CONFIDENCE: float = 0.6   # below this, keep letting Whisper detect per chunk
+    LANGID_RECHECK_SECS: float = 60.0
+    LANGID_MIN_LOGPROB: float = -1.0     # avg_logprob that counts as a poor decode
+    
+    # Notes novelty gate - only call Ollama when a window brings new content words
+    NOTES_NOVELTY_ENABLED: bool = True
+    NOTES_NOVELTY_THRESHOLD: float = 0.3  # fraction of content words not in recent notes
+    NOTES_NOVELTY_MEMORY: int = 6         # summarized windows remembered (~1 minute)
+    NOTES_MAX_DEFER: int = 2              # windows a thin update may wait before it is sent anyway
+    
+    # End-of-lecture summary - map-reduce over the full transcript on /end or TTL
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_MIN_WORDS: int = 50        # shorter sessions aren't summarized
+    SUMMARY_CHUNK_WORDS: int = 600     # transcript words per map call
+    SUMMARY_FAN_IN: int = 8            # chunk notes merged per reduce call
+    SUMMARY_CONCURRENCY: int = 1       # summary LLM calls at once, leaving Ollama to live notes
+    SUMMARY_RETENTION_SECS: int = 3600 # how long finished summaries stay retrievable
+    
+    # Post-ASR hallucination filter - drops phantom text before it reaches notes
+    ASR_FILTER_ENABLED: bool = True
+    ASR_NO_SPEECH_THRESHOLD: float = 0.6
+    ASR_LOGPROB_THRESHOLD: float = -1.0
+    ASR_COMPRESSION_RATIO_THRESHOLD: float = 2.4
+    ASR_REPEAT_WINDOW: int = 5           # recent captions checked for repeats
+    ASR_REPEAT_LIMIT: int = 2            # identical captions in the window before rejecting
+    
+    # Keep Whisper segment/word timings in the session transcript (also ?timings=1)
+    TRANSCRIPT_TIMINGS: bool = False
+    
+    # Event-loop watchdog
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL: float = 0.1   # heartbeat period (seconds)
+    LOOP_LAG_THRESHOLD: float = 0.25     # lag that counts as a stall (seconds)
+    LOOP_STACK_SAMPLES: bool = True      # keep the loop thread's stack for each stall
     
     @property
     def cors_origins(self) -> List[str]:
@@ -8,6 +8,8 @@ from google.cloud.speech_v2 import SpeechClient
 from google.cloud.speech_v2.types import cloud_speech
 from settings import settings
 
+logger = logging.getLogger(__name__)
+
 # Initialize Google Cloud Speech client
 client = None
 
@@ -16,10 +18,10 @@ def initialize_speech_client():
     global client
     try:
         client = SpeechClient()
-        logging.info("Google Cloud Speech v2 client initialized successfully")
+        logger.info("Google Cloud Speech v2 client initialized")
         return client
     except Exception as e:
-        logging.error(f"Failed to initialize Google Cloud Speech v2 client: {e}")
+        logger.error("Failed to initialize Google Cloud Speech v2 client", extra={"stage": "google_stt", "error": str(e)})
         raise
 
 def get_project_id() -> str:
@@ -48,11 +50,11 @@ def create_recognizer_if_not_exists():
         try:
             request = cloud_speech.GetRecognizerRequest(name=recognizer_path)
             recognizer = client.get_recognizer(request=request)
-            logging.info(f"Using existing recognizer: {recognizer_path}")
+            logger.info("Using existing recognizer", extra={"stage": "google_stt", "recognizer": recognizer_path})
             return recognizer
         except Exception:
             # Recognizer doesn't exist, create it
-            logging.info(f"Creating new recognizer: {recognizer_path}")
+            logger.info("Creating recognizer", extra={"stage": "google_stt", "recognizer": recognizer_path})
             
             parent = f"projects/{project_id}/locations/{settings.GCP_LOCATION}"
             
@@ -77,11 +79,11 @@ def create_recognizer_if_not_exists():
             
             operation = client.create_recognizer(request=request)
             recognizer = operation.result()  # Wait for operation to complete
-            logging.info(f"Created recognizer: {recognizer.name}")
+            logger.info("Created recognizer", extra={"stage": "google_stt", "recognizer": recognizer.name})
             return recognizer
             
     except Exception as e:
-        logging.error(f"Failed to create/get recognizer: {e}")
+        logger.error("Failed to create/get recognizer", extra={"stage": "google_stt", "error": str(e)})
         raise
 
 def recognize_short(audio_pcm16k_mono_bytes: bytes, language_code: str) -> str:
@@ -149,7 +151,7 @@ def recognize_short(audio_pcm16k_mono_bytes: bytes, language_code: str) -> str:
         return transcript
         
     except Exception as e:
-        logging.error(f"Google Speech v2 recognition failed: {e}")
+        logger.error("Google Speech v2 recognition failed", extra={"stage": "google_stt", "error": str(e)})
         raise
 
 def map_language_to_gcp(language_input: str) -> str:
@@ -161,5 +163,5 @@ try:
     client = initialize_speech_client()
     # Don't create recognizer on import - do it on first use to avoid startup delays
 except Exception as e:
-    logging.warning(f"Failed to initialize Google Speech client on import: {e}")
+    logger.warning("Failed to initialize Google Speech client on import", extra={"stage": "google_stt", "error": str(e)})
     client = None
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+End-of-lecture summary: map-reduce over the session's full transcript.
+
+When a session ends (/end, TTL or inactivity) its transcript is cut into
+chunks, each chunk is summarized, and the chunk notes are merged - in rounds
+of SUMMARY_FAN_IN when there are many - into one set of lecture notes. Jobs
+run on the event loop in the background with their own small LLM concurrency
+limit, and every call queues behind live notes for an Ollama slot (see
+notes.OllamaSlots), so a live window waits for at most one running summary
+call. A lecture that continues after /end (same session ID) gets a new
+SessionState, so the transcript already summarized is kept with the job and the
+next summary covers the whole lecture; chunk summaries are cached by prompt,
+so that re-run only pays for the new chunks.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from settings import settings
+from notes import notes_generator
+from utils.metrics import registry, ERRORS
+from utils.session import session_manager
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_JOBS = registry.counter(
+    "captiflo_summary_jobs_total", "End-of-lecture summary jobs by outcome", ["status"]
+)
+SUMMARY_SECONDS = registry.histogram(
+    "captiflo_summary_seconds", "Wall time of end-of-lecture summary jobs",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200)
+)
+SUMMARY_CACHE = registry.counter(
+    "captiflo_summary_cache_total", "Summary LLM calls served from the chunk cache", ["result"]
+)
+
+MAP_PROMPT = (
+    "You are taking notes on a section of a {subject} lecture for a {grade}th grader. "
+    "List the key points, terms and examples from this section as concise bullet points. "
+    "If nothing meaningful is said, write nothing.\n\nTranscript:\n"
+)
+REDUCE_PROMPT = (
+    "You are writing study notes for a whole {subject} lecture for a {grade}th grader. "
+    "Merge these section notes into one organized set of notes with short headings and bullet points, "
+    "in lecture order, without repeating yourself.\n\nSection notes:\n"
+)
+
+def chunk_words(text: str, size: int) -> List[str]:
+    """Split text into chunks of about ``size`` words."""
+    words = text.split()
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+class SummaryJobs:
+    def __init__(self, chunk_words: int = 600, fan_in: int = 8, concurrency: int = 1,
+                 retention_secs: float = 3600, max_jobs: int = 200, cache_size: int = 512):
+        self.chunk_words = chunk_words
+        self.fan_in = max(2, fan_in)
+        self.concurrency = max(1, concurrency)
+        self.retention_secs = retention_secs
+        self.max_jobs = max_jobs
+        self.cache_size = cache_size
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self.cache: "OrderedDict[str, str]" = OrderedDict()
+        # Full transcript behind each stored job, prepended if the lecture resumes
+        self.transcripts: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Run jobs on this loop (called from the app's startup hook)."""
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def on_session_end(self, session, reason: str):
+        """SessionManager hook: start a summary job for a finished lecture."""
+        if not settings.SUMMARY_ENABLED or self._loop is None:
+            return
+        text = " ".join(session.transcript)
+        if not text:
+            return  # nothing new (a resumed lecture that ended silent keeps its summary)
+        earlier = self.transcripts.get(session.session_id) if session.session_id in self.jobs else None
+        if earlier:
+            text = f"{earlier} {text}"
+        words = len(text.split())
+        if words < settings.SUMMARY_MIN_WORDS:
+            return
+        job = {"status": "pending", "reason": reason, "words": words, "created": time.time(),
+               "finished": None, "summary": None}
+        self._store(session.session_id, job, text)
+        # Sessions can end from a threadpool worker, so hand the job to the loop thread-safely
+        asyncio.run_coroutine_threadsafe(
+            self._run(session.session_id, job, text, session.mode, session.grade), self._loop
+        )
+
+    def get(self, session_id: str) -> Optional[dict]:
+        self._evict()
+        job = self.jobs.get(session_id)
+        return dict(job) if job else None
+
+    def _store(self, session_id: str, job: dict, text: str):
+        self.jobs.pop(session_id, None)
+        self.jobs[session_id] = job
+        self.transcripts[session_id] = text
+        self._evict()
+
+    def _evict(self):
+        cutoff = time.time() - self.retention_secs
+        while self.jobs:
+            session_id, job = next(iter(self.jobs.items()))
+            if len(self.jobs) <= self.max_jobs and job["created"] >= cutoff:
+                break
+            del self.jobs[session_id]
+            self.transcripts.pop(session_id, None)
+
+    async def _complete(self, prompt: str) -> Optional[str]:
+        """One LLM call under the summary concurrency limit, cached by prompt."""
+        key = hashlib.sha1(f"{settings.NOTES_MODEL}\0{prompt}".encode("utf-8")).hexdigest()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            SUMMARY_CACHE.labels(result="hit").inc()
+            return self.cache[key]
+        SUMMARY_CACHE.labels(result="miss").inc()
+        async with self._semaphore:
+            result = await notes_generator.complete(prompt, kind="summary", max_tokens=600)
+        if result:
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    async def summarize(self, text: str, mode: str = "default", grade: int = 9) -> Optional[str]:
+        """Map-reduce summary of a transcript."""
+        subject = mode if mode != "default" else "school"
+        chunks = chunk_words(text, self.chunk_words)
+        if len(chunks) == 1:
+            return await self._complete(REDUCE_PROMPT.format(subject=subject, grade=grade) + chunks[0])
+
+        # Map: chunk notes in parallel (bounded by the semaphore)
+        map_prompt = MAP_PROMPT.format(subject=subject, grade=grade)
+        parts = await asyncio.gather(*(self._complete(map_prompt + chunk) for chunk in chunks))
+        parts = [part for part in parts if part]
+
+        # Reduce: merge fan_in notes at a time until one remains
+        reduce_prompt = REDUCE_PROMPT.format(subject=subject, grade=grade)
+        while len(parts) > 1:
+            groups = [parts[i:i + self.fan_in] for i in range(0, len(parts), self.fan_in)]
+            merged = await asyncio.gather(*(self._complete(reduce_prompt + "\n\n".join(group)) for group in groups))
+            parts = [part for part in merged if part]
+        return parts[0] if parts else None
+
+    async def _run(self, session_id: str, job: dict, text: str, mode: str, grade: int):
+        job["status"] = "running"
+        started = time.perf_counter()
+        try:
+            job["summary"] = await self.summarize(text, mode, grade)
+            job["status"] = "done" if job["summary"] else "failed"
+        except Exception as e:
+            ERRORS.labels(stage="summary").inc()
+            logger.error("Summary job failed", extra={
+                "session": session_id, "stage": "summary", "error": str(e),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)})
+            job["status"] = "failed"
+        job["finished"] = time.time()
+        SUMMARY_SECONDS.observe(time.perf_counter() - started)
+        SUMMARY_JOBS.labels(status=job["status"]).inc()
+
+# Global summary jobs, fed by session ends
+summary_jobs = SummaryJobs(
+    chunk_words=settings.SUMMARY_CHUNK_WORDS,
+    fan_in=settings.SUMMARY_FAN_IN,
+    concurrency=settings.SUMMARY_CONCURRENCY,
+    retention_secs=settings.SUMMARY_RETENTION_SECS,
+)
+session_manager.on_session_end.append(summary_jobs.on_session_end)
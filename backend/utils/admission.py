@@ -0,0 +1,125 @@
+"""
+Adaptive admission control from measured inference and LLM capacity.
+
+Inference demand is measured directly: the wall seconds Whisper spent
+transcribing, divided by the session-seconds that elapsed meanwhile (active
+sessions x wall time). That already folds in how much audio the VAD drops,
+chunking overhead and language detection, which an RTF-based estimate would
+have to model. Notes streams call Ollama once per 10 s window. Dividing the
+usable parallelism of each pool by the per-session demand gives the number of
+sessions the hardware can sustain.
+"""
+import math
+import threading
+import time
+from typing import Optional
+from settings import settings
+from utils.metrics import registry
+
+NOTES_WINDOW_SECS = 10.0  # router_notes regenerates notes every 10 seconds
+DEMAND_WINDOW_SECS = 2.0  # inference demand is sampled over windows this long
+
+class Ewma:
+    __slots__ = ("alpha", "value", "count")
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+        self.count = 0
+
+    def update(self, sample: float):
+        self.value = sample if self.value is None else self.value + self.alpha * (sample - self.value)
+        self.count += 1
+
+class AdmissionController:
+    def __init__(self, min_sessions: int = 1, max_sessions: int = 20,
+                 target_utilization: float = 0.7, inference_parallelism: int = 1,
+                 llm_parallelism: int = 1, warmup_samples: int = 10):
+        self.min_sessions = min_sessions
+        self.max_sessions = max_sessions
+        self.target_utilization = target_utilization
+        self.inference_parallelism = inference_parallelism
+        self.llm_parallelism = llm_parallelism
+        self.warmup_samples = warmup_samples
+        self.demand = Ewma()  # inference seconds per session-second
+        self.ollama_latency = Ewma()
+        self._busy = 0.0             # inference seconds in the current window
+        self._session_seconds = 0.0  # session-seconds in the current window
+        self._window_start: Optional[float] = None
+        self._last_sample: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record_inference(self, elapsed: float):
+        """Feed one transcription's wall time (from any thread)."""
+        with self._lock:
+            self._busy += elapsed
+
+    def sample_sessions(self, active_sessions: int, now: Optional[float] = None):
+        """
+        Account for ``active_sessions`` having been live since the last call, and
+        close the demand window once it is DEMAND_WINDOW_SECS long. Called about
+        once a second by the session GC; windows without sessions are discarded.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._window_start is None:
+                self._window_start = self._last_sample = now
+                return
+            self._session_seconds += active_sessions * (now - self._last_sample)
+            self._last_sample = now
+            if now - self._window_start < DEMAND_WINDOW_SECS:
+                return
+            if self._session_seconds > 0:
+                self.demand.update(self._busy / self._session_seconds)
+            self._busy = self._session_seconds = 0.0
+            self._window_start = now
+
+    def record_ollama(self, latency: float):
+        with self._lock:
+            self.ollama_latency.update(latency)
+
+    def _inference_limit(self) -> Optional[float]:
+        if self.demand.count < self.warmup_samples:
+            return None
+        demand = max(1e-6, self.demand.value)
+        return self.inference_parallelism * self.target_utilization / demand
+
+    def _llm_limit(self) -> Optional[float]:
+        if self.ollama_latency.count < self.warmup_samples:
+            return None
+        demand = max(1e-6, self.ollama_latency.value / NOTES_WINDOW_SECS)
+        return self.llm_parallelism * self.target_utilization / demand
+
+    def capacity(self) -> int:
+        """Sessions that can be admitted right now."""
+        if settings.ADMISSION_MODE != "adaptive":
+            return settings.MAX_CONCURRENT_SESSIONS
+        limits = [limit for limit in (self._inference_limit(), self._llm_limit()) if limit is not None]
+        if not limits:
+            # Nothing measured yet - fall back to the configured guess
+            return settings.MAX_CONCURRENT_SESSIONS
+        estimate = int(math.floor(min(limits) + 1e-9))
+        return max(self.min_sessions, min(self.max_sessions, estimate))
+
+    def snapshot(self) -> dict:
+        return {
+            "mode": settings.ADMISSION_MODE,
+            "capacity": self.capacity(),
+            "inference_demand": self.demand.value,
+            "ollama_latency_s": self.ollama_latency.value,
+            "inference_limit": self._inference_limit(),
+            "llm_limit": self._llm_limit(),
+        }
+
+# Global admission controller
+admission = AdmissionController(
+    min_sessions=settings.ADMISSION_MIN_SESSIONS,
+    max_sessions=settings.ADMISSION_MAX_SESSIONS,
+    target_utilization=settings.ADMISSION_TARGET_UTILIZATION,
+    inference_parallelism=settings.INFERENCE_PARALLELISM,
+    llm_parallelism=settings.OLLAMA_PARALLEL,
+)
+
+registry.gauge("captiflo_admission_capacity", "Sessions the admission controller will admit").set_function(
+    admission.capacity
+)
@@ -0,0 +1,94 @@
+"""
+Post-ASR filter for hallucinated and no-speech segments.
+
+Near-silent chunks that get past the energy VAD make Whisper invent text
+("Thank you.", "Subtitles by ..."). Once stored, that text triggers a notes
+regeneration, so every phantom caught here saves an Ollama call. Segments are
+judged on Whisper's own confidence signals, a list of known phantom phrases,
+and repetition against the session's recent captions.
+"""
+import re
+from typing import List, Sequence
+from settings import settings
+from utils.metrics import registry
+
+ASR_SEGMENTS = registry.counter(
+    "captiflo_asr_segments_total", "Transcribed segments by filter verdict (kept or rejection reason)", ["verdict"]
+)
+
+# Never legitimate lecture content - credits from Whisper's subtitle training data
+PHANTOM_ALWAYS = (
+    "subtitles by", "amara.org", "thanks for watching", "thank you for watching",
+    "please subscribe", "like and subscribe", "transcribed by", "captions by",
+)
+# Real speech sometimes, but also what Whisper says over silence
+PHANTOM_SUSPECT = {"thank you", "thanks", "you", "bye", "okay", "so", "yeah", "hmm"}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+def normalize(text: str) -> str:
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+class HallucinationFilter:
+    def __init__(self, no_speech_threshold: float = 0.6, logprob_threshold: float = -1.0,
+                 compression_ratio_threshold: float = 2.4, repeat_window: int = 5, repeat_limit: int = 2):
+        self.no_speech_threshold = no_speech_threshold
+        self.logprob_threshold = logprob_threshold
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.repeat_window = repeat_window
+        self.repeat_limit = repeat_limit
+
+    def verdict(self, segment, recent: Sequence[str] = ()) -> str:
+        """"kept", or the reason the segment should be dropped."""
+        text = normalize(segment.text)
+        if not text:
+            return "empty"
+        no_speech = getattr(segment, "no_speech_prob", 0.0) or 0.0
+        logprob = getattr(segment, "avg_logprob", 0.0) or 0.0
+        # Whisper's own silence rule: likely no speech and not confidently decoded
+        if no_speech > self.no_speech_threshold and logprob < self.logprob_threshold:
+            return "no_speech"
+        if (getattr(segment, "compression_ratio", 0.0) or 0.0) > self.compression_ratio_threshold:
+            return "compression"  # looping output
+        if logprob < self.logprob_threshold * 1.5:
+            return "low_logprob"
+        if any(phrase in text for phrase in PHANTOM_ALWAYS):
+            return "phantom"
+        if text in PHANTOM_SUSPECT and (no_speech > self.no_speech_threshold / 3 or logprob < self.logprob_threshold / 2):
+            return "phantom"
+        tokens = text.split()
+        if len(tokens) >= 6 and len(set(tokens)) / len(tokens) < 0.3:
+            return "repeat"  # "the the the the ..." in a short chunk
+        if recent and self.repeat_limit > 0:
+            window = recent[-self.repeat_window:]
+            if sum(1 for previous in window if normalize(previous) == text) >= self.repeat_limit:
+                return "repeat"
+        return "kept"
+
+    def filter(self, segments: list, recent: Sequence[str] = ()) -> List:
+        """
+        Drop segments that look hallucinated.
+
+        Args:
+            segments: Whisper segments from one chunk
+            recent: The session's recent captions, for the repeated-phrase check
+
+        Returns:
+            The segments worth keeping
+        """
+        kept = []
+        for segment in segments:
+            verdict = self.verdict(segment, recent)
+            ASR_SEGMENTS.labels(verdict=verdict).inc()
+            if verdict == "kept":
+                kept.append(segment)
+        return kept
+
+# Global filter - applied when ASR_FILTER_ENABLED
+hallucination_filter = HallucinationFilter(
+    no_speech_threshold=settings.ASR_NO_SPEECH_THRESHOLD,
+    logprob_threshold=settings.ASR_LOGPROB_THRESHOLD,
+    compression_ratio_threshold=settings.ASR_COMPRESSION_RATIO_THRESHOLD,
+    repeat_window=settings.ASR_REPEAT_WINDOW,
+    repeat_limit=settings.ASR_REPEAT_LIMIT,
+)
@@ -0,0 +1,226 @@
+"""
+CPU compute-type / model-size calibration for Whisper.
+
+``int8`` is a good default on AVX2/AVX-512 machines, but on CPUs without fast
+integer dot products ``int8_float32`` or ``int16`` can be faster, and a smaller
+model may be accurate enough. calibrate() transcribes a reference clip with
+every supported (model, compute type) candidate, scores each against the
+reference transcript by word error rate, and picks the fastest one within
+CALIBRATION_WER_TOLERANCE of the most accurate. Results are cached on disk per
+CPU model (and candidate set), so only the first startup on a machine pays for
+it. Run it ahead of time with ``python -m bench.calibrate_compute``.
+"""
+import hashlib
+import json
+import logging
+import os
+import platform
+import re
+import time
+from typing import List, Optional, Tuple
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+def cpu_model() -> str:
+    """CPU model name - the cache key, since instruction-set support follows it."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine() or "unknown"
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercased words without punctuation, so WER counts only recognition errors."""
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level Levenshtein distance divided by the reference length."""
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+def candidate_models() -> List[str]:
+    return list(settings.CALIBRATION_MODELS) or [settings.WHISPER_MODEL]
+
+def supported_compute_types() -> List[str]:
+    """CALIBRATION_COMPUTE_TYPES this CPU/CTranslate2 build can run."""
+    wanted = list(settings.CALIBRATION_COMPUTE_TYPES)
+    try:
+        import ctranslate2  # ships with faster-whisper
+        supported = ctranslate2.get_supported_compute_types("cpu")
+    except (ImportError, AttributeError):
+        return wanted
+    return [compute_type for compute_type in wanted if compute_type in supported]
+
+def cache_key(audio: bytes, models: List[str], compute_types: List[str]) -> str:
+    """Same CPU, clip, candidates and tolerance -> same answer."""
+    try:
+        import ctranslate2
+        version = ctranslate2.__version__
+    except ImportError:
+        version = "unknown"
+    parts = [cpu_model(), version, hashlib.sha1(audio).hexdigest(), ",".join(models), ",".join(compute_types),
+             str(settings.CALIBRATION_WER_TOLERANCE)]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+def load_reference() -> Tuple[Optional[bytes], Optional[str]]:
+    """(PCM of CALIBRATION_AUDIO, CALIBRATION_TRANSCRIPT text) - either may be None if missing."""
+    audio = transcript = None
+    if os.path.isfile(settings.CALIBRATION_AUDIO):
+        import wave
+        with wave.open(settings.CALIBRATION_AUDIO, "rb") as wav:
+            if wav.getframerate() != 16000 or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{settings.CALIBRATION_AUDIO} must be 16kHz mono 16-bit PCM")
+            audio = wav.readframes(wav.getnframes())
+    if os.path.isfile(settings.CALIBRATION_TRANSCRIPT):
+        with open(settings.CALIBRATION_TRANSCRIPT, encoding="utf-8") as f:
+            transcript = f.read().strip() or None
+    return audio, transcript
+
+def read_cache() -> dict:
+    try:
+        with open(settings.CALIBRATION_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_cache(key: str, result: dict):
+    entries = read_cache()
+    entries[key] = result
+    directory = os.path.dirname(settings.CALIBRATION_CACHE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = settings.CALIBRATION_CACHE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp, settings.CALIBRATION_CACHE)
+
+def time_candidate(model_name: str, compute_type: str, audio: bytes, language: Optional[str]) -> dict:
+    """Load one candidate, warm it up, and time a transcription of the clip."""
+    from faster_whisper import WhisperModel
+    from asr import DECODE_PROFILES, pcm16_to_float32
+    from utils.cpu_layout import plan_layout
+
+    layout = plan_layout(num_workers=1)
+    started = time.perf_counter()
+    model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=layout.cpu_threads)
+    load_seconds = time.perf_counter() - started
+
+    samples = pcm16_to_float32(audio)
+    options = DECODE_PROFILES["balanced"]
+    segments, _ = model.transcribe(samples[:16000 * 5], language=language, **options)
+    list(segments)  # warm-up
+    started = time.perf_counter()
+    segments, _ = model.transcribe(samples, language=language, **options)
+    text = " ".join(segment.text.strip() for segment in segments)
+    elapsed = time.perf_counter() - started
+    return {
+        "model": model_name,
+        "compute_type": compute_type,
+        "load_seconds": round(load_seconds, 3),
+        "rtf": round(elapsed / (len(samples) / 16000.0), 4),
+        "text": text,
+    }
+
+def calibrate(audio: bytes, transcript: Optional[str] = None, language: Optional[str] = "en") -> dict:
+    """
+    Time every candidate on ``audio`` and pick the fastest accurate one.
+
+    Args:
+        audio: 16kHz mono s16le reference clip
+        transcript: Reference transcript; without one, the output of the largest
+            float32 candidate (the most faithful configuration) is the reference
+        language: Language of the clip (None to let Whisper detect it)
+
+    Returns:
+        {"model", "compute_type", "candidates": [...], ...} - the chosen
+        configuration plus every candidate's RTF and WER
+    """
+    models = candidate_models()
+    compute_types = supported_compute_types()
+    candidates = []
+    for model_name in models:
+        for compute_type in compute_types:
+            try:
+                candidates.append(time_candidate(model_name, compute_type, audio, language))
+            except Exception as e:
+                # Unsupported combination (or model not downloadable) - skip it
+                logger.warning("Calibration candidate failed", extra={
+                    "stage": "calibration", "model": model_name, "compute_type": compute_type, "error": str(e)})
+    if not candidates:
+        raise RuntimeError("no calibration candidate could be loaded")
+
+    reference_source = "transcript"
+    if transcript is None:
+        reference = candidates[-1]
+        for candidate in candidates:
+            if candidate["model"] == models[-1] and candidate["compute_type"] == "float32":
+                reference = candidate
+        transcript = reference["text"]
+        reference_source = f"{reference['model']}/{reference['compute_type']}"
+    for candidate in candidates:
+        candidate["wer"] = round(word_error_rate(transcript, candidate.pop("text")), 4)
+
+    best_wer = min(candidate["wer"] for candidate in candidates)
+    accurate = [c for c in candidates if c["wer"] <= best_wer + settings.CALIBRATION_WER_TOLERANCE]
+    chosen = min(accurate, key=lambda candidate: candidate["rtf"])
+    return {
+        "model": chosen["model"],
+        "compute_type": chosen["compute_type"],
+        "cpu": cpu_model(),
+        "reference": reference_source,
+        "tolerance": settings.CALIBRATION_WER_TOLERANCE,
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "candidates": candidates,
+    }
+
+def resolve_cpu_config() -> Tuple[str, str, str]:
+    """
+    (model, compute type, source) for loading Whisper on CPU.
+
+    WHISPER_CALIBRATE=off uses WHISPER_MODEL / WHISPER_COMPUTE_TYPE_CPU;
+    "cached" uses a cached calibration for this CPU if one exists; "startup"
+    also runs the calibration when there is none (the first load then takes a
+    few model loads longer).
+    """
+    default = (settings.WHISPER_MODEL, settings.WHISPER_COMPUTE_TYPE_CPU, "settings")
+    mode = settings.WHISPER_CALIBRATE
+    if mode == "off":
+        return default
+    try:
+        audio, transcript = load_reference()
+    except (OSError, ValueError) as e:
+        logger.warning("Cannot read the calibration reference clip", extra={"stage": "calibration", "error": str(e)})
+        return default
+    if audio is None:
+        logger.warning("No calibration reference clip, using settings",
+                       extra={"stage": "calibration", "path": settings.CALIBRATION_AUDIO})
+        return default
+
+    key = cache_key(audio, candidate_models(), supported_compute_types())
+    cached = read_cache().get(key)
+    if cached:
+        return cached["model"], cached["compute_type"], "calibration cache"
+    if mode != "startup":
+        return default
+    try:
+        result = calibrate(audio, transcript, language=settings.CALIBRATION_LANGUAGE or None)
+    except Exception as e:
+        logger.error("Calibration failed, using settings", extra={"stage": "calibration", "error": str(e)})
+        return default
+    write_cache(key, result)
+    logger.info("Calibration finished", extra={
+        "stage": "calibration", "model": result["model"], "compute_type": result["compute_type"], "cpu": result["cpu"]})
+    return result["model"], result["compute_type"], "calibration"
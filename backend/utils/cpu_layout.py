@@ -0,0 +1,135 @@
+"""
+CPU layout for Whisper (CTranslate2) inference.
+
+WhisperModel defaults to 4 intra-op threads per worker regardless of the
+machine, so inference threads compete with the event loop, ffmpeg and each
+other. The layout here starts from the physical cores this process may use.
+It keeps CPU_RESERVED_CORES for the loop and ffmpeg, and splits the rest into
+``num_workers`` (concurrent transcriptions) x ``cpu_threads`` (intra-op
+threads each). It can optionally pin the inference threads to those cores.
+bench/calibrate_cpu.py measures the candidate splits and reports the fastest
+one for a given session count.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from settings import settings
+
+def allowed_cpus() -> List[int]:
+    """Logical CPUs this process may run on (respects cgroup/taskset affinity)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def cpu_topology() -> Dict[Tuple[int, int], List[int]]:
+    """
+    Group the allowed logical CPUs by physical core.
+
+    Returns:
+        {(package id, core id): [logical CPUs]} - SMT siblings share a key.
+        Without topology information each logical CPU is its own core.
+    """
+    cores: Dict[Tuple[int, int], List[int]] = {}
+    for cpu in allowed_cpus():
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = int(f.read())
+            with open(f"{base}/core_id") as f:
+                core = int(f.read())
+        except (OSError, ValueError):
+            package, core = 0, cpu
+        cores.setdefault((package, core), []).append(cpu)
+    if len(cores) == len(allowed_cpus()) and not sys.platform.startswith("linux"):
+        # No sysfs (Windows/macOS): psutil knows the physical count, if installed
+        try:
+            import psutil  # optional dependency
+            physical = psutil.cpu_count(logical=False) or len(cores)
+            per_core = max(1, len(cores) // physical)
+            cpus = allowed_cpus()
+            return {(0, i): cpus[i * per_core:(i + 1) * per_core] for i in range(len(cpus) // per_core)}
+        except ImportError:
+            pass
+    return cores
+
+class CpuLayout:
+    def __init__(self, physical_cores: int, logical_cpus: int, reserved_cores: int, num_workers: int,
+                 cpu_threads: int, inference_cpus: List[int], pinned: bool, source: str):
+        self.physical_cores = physical_cores
+        self.logical_cpus = logical_cpus
+        self.reserved_cores = reserved_cores
+        self.num_workers = num_workers
+        self.cpu_threads = cpu_threads
+        self.inference_cpus = inference_cpus
+        self.pinned = pinned
+        self.source = source  # "auto" or "settings"
+
+    def snapshot(self) -> dict:
+        return {
+            "physical_cores": self.physical_cores,
+            "logical_cpus": self.logical_cpus,
+            "reserved_cores": self.reserved_cores,
+            "num_workers": self.num_workers,
+            "cpu_threads": self.cpu_threads,
+            "inference_cpus": self.inference_cpus,
+            "pinned": self.pinned,
+            "source": self.source,
+        }
+
+def plan_layout(num_workers: Optional[int] = None, cpu_threads: Optional[int] = None,
+                reserved_cores: Optional[int] = None, pin: Optional[bool] = None) -> CpuLayout:
+    """
+    Split the physical cores between decode workers and intra-op threads.
+
+    Args:
+        num_workers: Concurrent transcriptions (default WHISPER_NUM_WORKERS, or INFERENCE_PARALLELISM when 0)
+        cpu_threads: Threads per worker (default WHISPER_CPU_THREADS, or an even split when 0)
+        reserved_cores: Physical cores left to the event loop and ffmpeg (default CPU_RESERVED_CORES)
+        pin: Pin inference threads to the non-reserved cores (default CPU_PIN_WORKERS)
+    """
+    cores = cpu_topology()
+    physical = len(cores)
+    reserved = settings.CPU_RESERVED_CORES if reserved_cores is None else reserved_cores
+    reserved = max(0, min(reserved, physical - 1))
+    usable = physical - reserved
+
+    workers = num_workers if num_workers is not None else settings.WHISPER_NUM_WORKERS
+    threads = cpu_threads if cpu_threads is not None else settings.WHISPER_CPU_THREADS
+    source = "settings" if workers and threads else "auto"
+    if not workers:
+        workers = max(1, min(settings.INFERENCE_PARALLELISM, usable))
+    if not threads:
+        threads = max(1, usable // workers)
+
+    # Inference gets the highest-numbered cores; the loop and ffmpeg keep the first ones
+    inference_cores = sorted(cores)[reserved:]
+    inference_cpus = sorted(cpu for key in inference_cores for cpu in cores[key])
+    return CpuLayout(
+        physical_cores=physical,
+        logical_cpus=len(allowed_cpus()),
+        reserved_cores=reserved,
+        num_workers=workers,
+        cpu_threads=threads,
+        inference_cpus=inference_cpus,
+        pinned=bool(settings.CPU_PIN_WORKERS if pin is None else pin) and hasattr(os, "sched_setaffinity"),
+        source=source,
+    )
+
+@contextmanager
+def pinned_threads(cpus: List[int], enabled: bool = True):
+    """
+    Restrict the calling thread to ``cpus`` for the duration of the block.
+    Threads it starts inherit the mask, so creating the model inside the block
+    pins CTranslate2's worker threads. Linux only; a no-op elsewhere.
+    """
+    if not enabled or not cpus or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    # On Linux, pid 0 means the calling thread
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
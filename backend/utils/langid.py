@@ -0,0 +1,117 @@
+"""
+Per-session language identification cache for lang=auto.
+
+Whisper detects the language on every call made without one, which costs an
+extra encoder pass per 1 s chunk and lets short noisy chunks flip languages.
+Instead each session buffers its first few seconds of speech, detects once,
+and pins the result. The cache asks for a fresh detection after a while, or
+sooner when decodes in the pinned language start to look wrong.
+"""
+import threading
+from typing import Optional
+import numpy as np
+from settings import settings
+from utils.metrics import registry
+
+SAMPLE_RATE = 16000
+
+LANGID_DETECTIONS = registry.counter(
+    "captiflo_langid_detections_total", "Language detections run for lang=auto sessions", ["result"]
+)
+LANGID_CHUNKS = registry.counter(
+    "captiflo_langid_chunks_total", "lang=auto chunks by where their language came from", ["source"]
+)
+
+class LanguageCache:
+    def __init__(self, detect_secs: Optional[float] = None, min_confidence: Optional[float] = None,
+                 recheck_secs: Optional[float] = None, min_logprob: Optional[float] = None,
+                 bad_chunks: int = 2):
+        self.detect_secs = detect_secs if detect_secs is not None else settings.LANGID_DETECT_SECS
+        self.min_confidence = min_confidence if min_confidence is not None else settings.LANGID_MIN_CONFIDENCE
+        self.recheck_secs = recheck_secs if recheck_secs is not None else settings.LANGID_RECHECK_SECS
+        self.min_logprob = min_logprob if min_logprob is not None else settings.LANGID_MIN_LOGPROB
+        self.bad_chunks = bad_chunks
+        self.language: Optional[str] = None
+        self.confidence = 0.0
+        self.detections = 0
+        self._buffer: list = []
+        self._buffered = 0  # samples
+        self._since_detect = 0.0  # seconds of speech since the last detection
+        self._low_streak = 0
+        self._recheck = True  # start out wanting a detection
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[str]:
+        """Language to decode with, or None to let Whisper detect it."""
+        if self.language is not None and self.confidence >= self.min_confidence:
+            LANGID_CHUNKS.labels(source="cached").inc()
+            return self.language
+        LANGID_CHUNKS.labels(source="auto").inc()
+        return None
+
+    def feed(self, audio: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Account for a chunk of speech (float32, 16 kHz).
+
+        Returns:
+            The buffered speech to run detection on once enough has been
+            collected while a detection is due, otherwise None
+        """
+        with self._lock:
+            self._since_detect += len(audio) / SAMPLE_RATE
+            if self.language is not None and self._since_detect >= self.recheck_secs:
+                self._recheck = True
+            if not self._recheck:
+                return None
+            self._buffer.append(audio)
+            self._buffered += len(audio)
+            if self._buffered < self.detect_secs * SAMPLE_RATE:
+                return None
+            window = np.concatenate(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+            return window
+
+    def update(self, language: Optional[str], probability: float):
+        """Store a detection result."""
+        with self._lock:
+            self.detections += 1
+            self._since_detect = 0.0
+            self._low_streak = 0
+            if not language or probability < self.min_confidence:
+                # Keep the old pin (if any) and try again on the next window
+                LANGID_DETECTIONS.labels(result="low_confidence").inc()
+                return
+            if self.language is None:
+                result = "locked"
+            elif language == self.language:
+                result = "confirmed"
+            else:
+                result = "switched"
+            LANGID_DETECTIONS.labels(result=result).inc()
+            self.language = language
+            self.confidence = probability
+            self._recheck = False
+
+    def observe_decode(self, avg_logprob: Optional[float]):
+        """
+        Feed the decode quality of a chunk transcribed in the pinned language;
+        a streak of poor chunks suggests the speaker switched languages.
+        """
+        if self.language is None or avg_logprob is None:
+            return
+        with self._lock:
+            if avg_logprob < self.min_logprob:
+                self._low_streak += 1
+                if self._low_streak >= self.bad_chunks:
+                    self._recheck = True
+            else:
+                self._low_streak = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "language": self.language,
+            "confidence": round(self.confidence, 3),
+            "detections": self.detections,
+            "recheck_pending": self._recheck,
+        }
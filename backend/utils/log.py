@@ -0,0 +1,159 @@
+"""
+Non-blocking structured logging.
+
+Handlers on the root logger would write to stderr from whichever thread logs,
+including the event loop, so a slow terminal or a burst of errors stalls
+request handling. setup_logging() instead installs a QueueHandler: the caller
+only formats the message and puts the record on a bounded queue, and a
+QueueListener thread writes it out as one JSON object per line. Records that
+don't fit in the queue are dropped and counted, not waited for.
+
+Structured fields go in ``extra``, e.g.
+``logger.warning("Ingest failed", extra={"session": sid, "stage": "ingest", "error": str(e)})``.
+A burst sampler caps each message at LOG_SAMPLE_BURST records per
+LOG_SAMPLE_WINDOW seconds; the next record that gets through carries how many
+were suppressed.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from settings import settings
+from utils.metrics import registry
+
+LOG_RECORDS = registry.counter("captiflo_log_records_total", "Log records queued for the writer thread, by level", ["level"])
+LOG_DROPPED = registry.counter(
+    "captiflo_log_dropped_total", "Log records dropped by the burst sampler or a full queue", ["reason"]
+)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, then the extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable variant for development: the message followed by key=value fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in record.__dict__.items()
+                          if key not in _RECORD_ATTRS and not key.startswith("_"))
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += f" [{fields}]"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+class BurstSampler(logging.Filter):
+    """
+    Lets the first ``burst`` records of each message (logger, level, message
+    template) through per ``window`` seconds and drops the rest. The next
+    record that passes carries ``suppressed``: the number dropped since.
+    """
+    def __init__(self, burst: int, window: float, max_keys: int = 1000):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [window start, passed in window, suppressed since last pass]
+        self._counts: Dict[Tuple[str, int, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno >= logging.CRITICAL:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._counts.get(key)
+            if state is None:
+                if len(self._counts) >= self.max_keys:
+                    self._counts.clear()
+                state = self._counts[key] = [now, 0, 0]
+            if now - state[0] >= self.window:
+                state[0], state[1] = now, 0
+            if state[1] >= self.burst:
+                state[2] += 1
+                LOG_DROPPED.labels(reason="sampled").inc()
+                return False
+            state[1] += 1
+            suppressed, state[2] = state[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.labels(reason="queue_full").inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (the arguments may change later)
+        # but leave the JSON/text formatting to the writer thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        LOG_RECORDS.labels(level=record.levelname.lower()).inc()
+        return record
+
+# Records waiting for the writer thread
+_records: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+registry.gauge("captiflo_log_queue_depth", "Log records waiting for the writer thread").set_function(_records.qsize)
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[DroppingQueueHandler] = None
+
+def setup_logging():
+    """Route the root logger through the queue. Safe to call more than once."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(sys.stderr)
+    writer.setFormatter(TextFormatter() if settings.LOG_FORMAT == "text" else JsonFormatter())
+
+    _handler = DroppingQueueHandler(_records)
+    _handler.addFilter(BurstSampler(settings.LOG_SAMPLE_BURST, settings.LOG_SAMPLE_WINDOW))
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    # httpx logs every Ollama request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(_records, writer, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
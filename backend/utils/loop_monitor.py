@@ -0,0 +1,176 @@
+"""
+Event-loop lag monitor and slow-handler detector.
+
+An asyncio heartbeat task measures how late the loop wakes it up. A watchdog
+thread watches that heartbeat: when the loop stops ticking for longer than the
+threshold it samples the loop thread's stack, which names the synchronous call
+blocking every other request (ffmpeg, Whisper, sync HTTP...).
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from settings import settings
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "captiflo_event_loop_lag_seconds", "How late the event loop ran a periodic heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_STALLS = registry.counter(
+    "captiflo_event_loop_stalls_total", "Event-loop stalls above the lag threshold", ["handler"]
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _is_app_frame(filename: str) -> bool:
+    """True for frames in our own code rather than the stdlib or site-packages."""
+    path = os.path.abspath(filename)
+    return path.startswith(BACKEND_DIR) and "site-packages" not in path
+
+class InflightRequests:
+    """ASGI middleware recording which HTTP requests are currently being handled."""
+
+    def __init__(self, app, monitor: "LoopMonitor"):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = id(scope)
+        self.monitor.inflight[key] = (scope.get("method", ""), scope.get("path", ""), time.monotonic())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.inflight.pop(key, None)
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25,
+                 capture_stacks: bool = True, max_events: int = 100):
+        self.interval = interval
+        self.threshold = threshold
+        self.capture_stacks = capture_stacks
+        self.events: deque = deque(maxlen=max_events)
+        self.inflight: Dict[int, Tuple[str, str, float]] = {}
+        self.max_lag = 0.0
+        self._lock = threading.Lock()
+        self._pending: Optional[dict] = None
+        self._tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start the heartbeat on the running loop and the watchdog thread."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _requests_snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {"method": method, "path": path, "running_s": round(now - started, 3)}
+            for method, path, started in list(self.inflight.values())
+        ]
+
+    def _sample_stack(self) -> dict:
+        """Stack of the loop thread: outermost app frame is the handler, innermost the blocking call."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return {}
+        stack = traceback.extract_stack(frame)
+        app_frames = [f for f in stack if _is_app_frame(f.filename) and not f.filename.endswith("loop_monitor.py")]
+        sample = {}
+        if app_frames:
+            outer, inner = app_frames[0], app_frames[-1]
+            sample["handler"] = f"{os.path.basename(outer.filename)}:{outer.name}"
+            sample["blocking_call"] = f"{os.path.basename(inner.filename)}:{inner.lineno} {inner.name}"
+        sample["top_frame"] = f"{os.path.basename(stack[-1].filename)}:{stack[-1].lineno} {stack[-1].name}"
+        if self.capture_stacks:
+            sample["stack"] = [f"{f.filename}:{f.lineno} {f.name}" for f in stack[-25:]]
+        return sample
+
+    def _watchdog(self):
+        """Runs in a thread: notices a stall while it is still happening."""
+        poll = max(0.01, min(self.interval, self.threshold) / 2)
+        while not self._stop.wait(poll):
+            stalled = time.monotonic() - self._tick - self.interval
+            if stalled < self.threshold:
+                continue
+            with self._lock:
+                if self._pending is not None:
+                    continue
+                self._pending = {
+                    "detected_at": time.time(),
+                    "requests": self._requests_snapshot(),
+                    **self._sample_stack(),
+                }
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            self._tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._tick = time.monotonic()
+            LOOP_LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock:
+                event, self._pending = self._pending, None
+            if event is None and lag < self.threshold:
+                continue
+            if event is None:
+                # Shorter than the watchdog poll - we know it happened, not who did it
+                event = {"detected_at": time.time(), "requests": self._requests_snapshot()}
+            event["lag_s"] = round(lag, 4)
+            self.events.append(event)
+            handler = event.get("handler", "unknown")
+            LOOP_STALLS.labels(handler=handler).inc()
+            logger.warning("Event loop stalled", extra={
+                "stage": "loop_monitor", "lag_ms": round(lag * 1000), "handler": handler,
+                "blocking_call": event.get("blocking_call", "no stack sample")})
+
+    def report(self, limit: int = 50) -> dict:
+        events = list(self.events)[-limit:]
+        events.reverse()
+        return {
+            "running": self._task is not None,
+            "interval_s": self.interval,
+            "threshold_s": self.threshold,
+            "max_lag_s": round(self.max_lag, 4),
+            "inflight": self._requests_snapshot(),
+            "stalls": events,
+        }
+
+# Global loop monitor, started from the app's startup hook
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL,
+    threshold=settings.LOOP_LAG_THRESHOLD,
+    capture_stacks=settings.LOOP_STACK_SAMPLES,
+)
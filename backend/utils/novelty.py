@@ -0,0 +1,96 @@
+"""
+Novelty gate in front of live notes generation.
+
+The notes stream used to call Ollama whenever the last 10 s of transcript
+hashed differently, which is every window even when the teacher is only
+repeating themselves. The gate compares the content words of a new window
+with what the session's recent notes already covered: windows with enough
+new material are summarized, thin ones are deferred and merged into the next
+window, and pure repetition is skipped. A window only counts as summarized
+once its notes were actually generated (commit()); if the LLM call fails,
+release() puts the text back so the next window retries it.
+"""
+import re
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+from settings import settings
+from utils.metrics import registry
+
+NOTES_GATE = registry.counter(
+    "captiflo_notes_gate_total", "Notes windows by novelty-gate decision", ["decision"]
+)
+
+_WORD = re.compile(r"\w+")
+
+# Words that say nothing about the topic; kept small and language-agnostic enough
+# for the English/Spanish lectures the notes are mostly used for
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have he her his how i if in is it its
+just like me my no not now of on or our so some that the their them then there these they this to
+up us was we were what when which who will with would you your okay ok um uh yeah right well going
+el la los las de del que y en un una es por con para se lo como su al
+""".split())
+
+def content_tokens(text: str) -> Set[str]:
+    return {token for token in _WORD.findall(text.lower()) if token not in STOPWORDS and len(token) > 1}
+
+class NoveltyGate:
+    def __init__(self, threshold: Optional[float] = None, memory_windows: Optional[int] = None,
+                 max_defer: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else settings.NOTES_NOVELTY_THRESHOLD
+        self.max_defer = max_defer if max_defer is not None else settings.NOTES_MAX_DEFER
+        windows = memory_windows if memory_windows is not None else settings.NOTES_NOVELTY_MEMORY
+        # Token sets of the windows notes were generated for, newest last
+        self.summarized: Deque[Set[str]] = deque(maxlen=max(1, windows))
+        self.pending: List[str] = []
+        # (windows, tokens) handed out by check() whose notes call hasn't finished yet
+        self.in_flight: Optional[Tuple[List[str], Set[str]]] = None
+
+    def novelty(self, tokens: Set[str]) -> float:
+        """Fraction of ``tokens`` not covered by recently summarized windows."""
+        if not tokens:
+            return 0.0
+        covered = set().union(*self.summarized) if self.summarized else set()
+        return len(tokens - covered) / len(tokens)
+
+    def check(self, text: str) -> Optional[str]:
+        """
+        Decide whether a new transcript window is worth an LLM call.
+
+        Returns:
+            The text to generate notes for (merged with deferred windows), or
+            None to skip this round. Follow a returned text with commit() once
+            its notes exist, or release() if generating them failed.
+        """
+        windows = self.pending + [text]
+        candidate = " ".join(windows)
+        tokens = content_tokens(candidate)
+        score = self.novelty(tokens)
+        if score >= self.threshold or (score > 0 and len(self.pending) >= self.max_defer):
+            NOTES_GATE.labels(decision="generate").inc()
+            self.pending = []
+            self.in_flight = (windows, tokens)
+            return candidate
+        if score > 0:
+            # Some new material - hold it and judge it together with the next window
+            NOTES_GATE.labels(decision="defer").inc()
+            self.pending.append(text)
+        else:
+            NOTES_GATE.labels(decision="skip").inc()
+        return None
+
+    def commit(self):
+        """Notes were generated for the last window: its content now counts as covered."""
+        if self.in_flight is not None:
+            self.summarized.append(self.in_flight[1])
+            self.in_flight = None
+
+    def release(self):
+        """
+        The notes call for the last window failed: keep its windows pending for
+        the next call. At most ``max_defer`` windows are carried, newest kept, so
+        a long Ollama outage can't grow the next prompt past the model's context.
+        """
+        if self.in_flight is not None:
+            self.pending = (self.in_flight[0] + self.pending)[-max(1, self.max_defer):]
+            self.in_flight = None
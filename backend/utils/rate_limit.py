@@ -1,59 +1,220 @@
 """
-Simple token bucket rate limiter per session.
+Token bucket rate limiting per session, per client IP and globally.
+
+Per-session buckets count requests. The per-IP and global buckets count
+audio seconds, so they bound how much work reaches the inference pool no
+matter how it is split into requests. Buckets live in a pluggable backend:
+an in-process sharded LRU by default, or Redis when several workers must
+share limits.
 """
+import threading
 import time
-from typing import Dict
-from dataclasses import dataclass
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from settings import settings
+from utils.metrics import registry
 
-@dataclass
 class TokenBucket:
-    capacity: float
-    tokens: float
-    refill_rate: float  # tokens per second
-    last_refill: float
-    
-    def refill(self):
+    __slots__ = ("capacity", "tokens", "refill_rate", "last_refill")
+
+    def __init__(self, capacity: float, tokens: float, refill_rate: float, last_refill: float):
+        self.capacity = capacity
+        self.tokens = tokens
+        self.refill_rate = refill_rate  # tokens per second
+        self.last_refill = last_refill
+
+    def refill(self, now: Optional[float] = None):
         """Refill tokens based on elapsed time."""
-        now = time.time()
+        if now is None:
+            now = time.monotonic()
         elapsed = now - self.last_refill
         self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
         self.last_refill = now
-    
-    def consume(self, tokens: float = 1.0) -> bool:
+
+    def consume(self, tokens: float = 1.0, now: Optional[float] = None) -> bool:
         """Try to consume tokens. Returns True if successful."""
-        self.refill()
+        self.refill(now)
         if self.tokens >= tokens:
             self.tokens -= tokens
             return True
         return False
 
+class MemoryBackend:
+    """
+    In-process buckets kept in lock-sharded LRU maps. Each shard is bounded,
+    and buckets idle long enough to have refilled completely are swept, since
+    a full bucket is indistinguishable from a fresh one.
+    """
+
+    def __init__(self, max_buckets: int = 10000, shards: int = 16, sweep_interval: float = 60.0):
+        self.shards = max(1, shards)
+        self.max_per_shard = max(1, max_buckets // self.shards)
+        self.sweep_interval = sweep_interval
+        self._maps: List["OrderedDict[str, TokenBucket]"] = [OrderedDict() for _ in range(self.shards)]
+        self._locks = [threading.Lock() for _ in range(self.shards)]
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _shard(self, key: str) -> int:
+        return hash(key) % self.shards
+
+    def consume(self, key: str, capacity: float, refill_rate: float, cost: float) -> bool:
+        now = time.monotonic()
+        index = self._shard(key)
+        buckets = self._maps[index]
+        with self._locks[index]:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(capacity, capacity, refill_rate, now)
+                buckets[key] = bucket
+                if len(buckets) > self.max_per_shard:
+                    buckets.popitem(last=False)  # evict least recently used
+            else:
+                buckets.move_to_end(key)
+            allowed = bucket.consume(cost, now)
+        if now >= self._next_sweep:
+            self.sweep(now)
+        return allowed
+
+    def refund(self, key: str, cost: float):
+        index = self._shard(key)
+        with self._locks[index]:
+            bucket = self._maps[index].get(key)
+            if bucket is not None:
+                bucket.tokens = min(bucket.capacity, bucket.tokens + cost)
+
+    def sweep(self, now: Optional[float] = None, max_age: Optional[float] = None) -> int:
+        """Drop buckets that are full again, or unused for ``max_age`` seconds."""
+        if now is None:
+            now = time.monotonic()
+        self._next_sweep = now + self.sweep_interval
+        removed = 0
+        for index in range(self.shards):
+            with self._locks[index]:
+                buckets = self._maps[index]
+                stale = []
+                for key, bucket in buckets.items():
+                    idle = now - bucket.last_refill
+                    refilled = bucket.refill_rate > 0 and bucket.tokens + idle * bucket.refill_rate >= bucket.capacity
+                    if refilled or (max_age is not None and idle > max_age):
+                        stale.append(key)
+                for key in stale:
+                    del buckets[key]
+                removed += len(stale)
+        return removed
+
+    def size(self) -> int:
+        return sum(len(buckets) for buckets in self._maps)
+
+class RedisBackend:
+    """
+    Buckets shared between worker processes through Redis. The refill and
+    consume happen atomically in a Lua script using the Redis server clock.
+    """
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    if rate > 0 then
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    end
+    return allowed
+    """
+
+    def __init__(self, url: str, prefix: str = "captiflo:rl:"):
+        import redis  # optional dependency, only needed for multi-worker setups
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._consume = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key: str, capacity: float, refill_rate: float, cost: float) -> bool:
+        return bool(self._consume(keys=[self.prefix + key], args=[capacity, refill_rate, cost]))
+
+    def refund(self, key: str, cost: float):
+        self.client.hincrbyfloat(self.prefix + key, "tokens", cost)
+
+    def sweep(self, now: Optional[float] = None, max_age: Optional[float] = None) -> int:
+        return 0  # keys expire on their own once refilled
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=1000))
+
 class RateLimiter:
-    def __init__(self, capacity: float = 10.0, refill_rate: float = 2.0):
+    def __init__(self, capacity: float = 10.0, refill_rate: float = 2.0, backend=None,
+                 ip_capacity: float = 0.0, ip_refill_rate: float = 0.0,
+                 global_capacity: float = 0.0, global_refill_rate: float = 0.0):
         self.capacity = capacity
         self.refill_rate = refill_rate
-        self.buckets: Dict[str, TokenBucket] = {}
-    
+        self.ip_capacity = ip_capacity
+        self.ip_refill_rate = ip_refill_rate
+        self.global_capacity = global_capacity
+        self.global_refill_rate = global_refill_rate
+        self.backend = backend or MemoryBackend()
+
     def is_allowed(self, session_id: str, tokens: float = 1.0) -> bool:
         """Check if request is allowed for session."""
-        if session_id not in self.buckets:
-            self.buckets[session_id] = TokenBucket(
-                capacity=self.capacity,
-                tokens=self.capacity,
-                refill_rate=self.refill_rate,
-                last_refill=time.time()
-            )
-        
-        return self.buckets[session_id].consume(tokens)
-    
+        return self.backend.consume(f"s:{session_id}", self.capacity, self.refill_rate, tokens)
+
+    def check(self, session_id: str, client_ip: Optional[str] = None, cost: float = 1.0) -> Tuple[bool, Optional[str]]:
+        """
+        Charge one request to the session and ``cost`` (audio seconds) to the
+        client IP and the global inference budget. Limits with zero capacity
+        are disabled.
+
+        Returns:
+            (allowed, scope) where scope names the limit that rejected the request
+        """
+        if not self.is_allowed(session_id):
+            return False, "session"
+
+        if client_ip and self.ip_capacity > 0:
+            if not self.backend.consume(f"ip:{client_ip}", self.ip_capacity, self.ip_refill_rate, cost):
+                self.backend.refund(f"s:{session_id}", 1.0)
+                return False, "ip"
+
+        if self.global_capacity > 0:
+            if not self.backend.consume("global", self.global_capacity, self.global_refill_rate, cost):
+                self.backend.refund(f"s:{session_id}", 1.0)
+                if client_ip and self.ip_capacity > 0:
+                    self.backend.refund(f"ip:{client_ip}", cost)
+                return False, "global"
+
+        return True, None
+
     def cleanup_old_buckets(self, max_age: float = 3600):
         """Remove buckets that haven't been used recently."""
-        now = time.time()
-        old_sessions = [
-            session_id for session_id, bucket in self.buckets.items()
-            if (now - bucket.last_refill) > max_age
-        ]
-        for session_id in old_sessions:
-            del self.buckets[session_id]
-
-# Global rate limiter - allows 10 requests per session with 2/sec refill
-rate_limiter = RateLimiter(capacity=10.0, refill_rate=2.0)
\ No newline at end of file
+        return self.backend.sweep(max_age=max_age)
+
+def create_backend():
+    """Build the bucket backend selected by RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBackend(max_buckets=settings.RATE_LIMIT_MAX_BUCKETS)
+
+# Global rate limiter - 10 requests per session with 2/sec refill, plus
+# audio-second budgets per IP and for the whole inference pool
+rate_limiter = RateLimiter(
+    capacity=10.0,
+    refill_rate=2.0,
+    backend=create_backend(),
+    ip_capacity=settings.RATE_LIMIT_IP_CAPACITY,
+    ip_refill_rate=settings.RATE_LIMIT_IP_REFILL,
+    global_capacity=settings.RATE_LIMIT_GLOBAL_CAPACITY,
+    global_refill_rate=settings.RATE_LIMIT_GLOBAL_REFILL,
+)
+
+registry.gauge("captiflo_rate_limit_buckets", "Token buckets held by the rate limiter").set_function(
+    lambda: rate_limiter.backend.size()
+)
@@ -1,26 +1,38 @@
 """
 In-memory session store with TTL, capacity management, and queuing.
 """
+import asyncio
+import logging
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from dataclasses import dataclass, field
-import sys
-import os
-# Add parent directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-try:
-    from settings import settings
-except ImportError:
-    from settings_fallback import settings
+from settings import settings
+from utils.metrics import registry
+from utils.admission import admission
+from utils.langid import LanguageCache
+from utils.transcript import TranscriptTimeline
+from utils.novelty import NoveltyGate
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "captiflo_queue_wait_seconds", "Time a client waited in the queue before promotion",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 2400)
+)
 
 @dataclass
 class QueueItem:
     client_id: str
     enqueued_at: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.time)
     
     def is_expired(self, timeout_secs: int = 90) -> bool:
-        """Check if queue item has expired (to avoid ghost entries)."""
-        return (time.time() - self.enqueued_at) > timeout_secs
+        """Check if queue item has expired (client stopped asking - avoids ghost entries)."""
+        return (time.time() - self.last_seen) > timeout_secs
+    
+    def touch(self):
+        """Update last_seen timestamp."""
+        self.last_seen = time.time()
 
 @dataclass
 class SessionState:
@@ -31,15 +43,30 @@ class SessionState:
     text_timestamps: List[float] = field(default_factory=list)  # Track when each text was added
     last_activity: float = field(default_factory=time.time)
     last_seen: float = field(default_factory=time.time)
+    pending_traces: list = field(default_factory=list)  # Sampled traces awaiting SSE emission
+    language: LanguageCache = field(default_factory=LanguageCache)  # Pinned language for lang=auto
+    timeline: TranscriptTimeline = field(default_factory=TranscriptTimeline)  # Opt-in segment/word timings
+    notes_gate: NoveltyGate = field(default_factory=NoveltyGate)  # Skips notes for repeated content
+    transcript: List[str] = field(default_factory=list)  # Every caption, for the end-of-lecture summary
+    mode: str = "default"  # Class mode and grade, as last requested for notes
+    grade: int = 9
     
-    def add_text(self, text: str, max_rolling: int = 20):
+    def add_text(self, text: str, max_rolling: int = 20, trace=None):
         """Add text to rolling buffer, keeping only recent entries."""
         if text:
             current_time = time.time()
             self.last_text = text
             self.rolling_text.append(text)
+            self.transcript.append(text)
             self.text_timestamps.append(current_time)
             
+            if trace is not None:
+                trace.mark("store")
+                self.pending_traces.append(trace)
+                # Nobody is listening on /captions - don't hold traces forever
+                if len(self.pending_traces) > max_rolling:
+                    self.pending_traces = self.pending_traces[-max_rolling:]
+            
             # Keep only recent entries
             if len(self.rolling_text) > max_rolling:
                 self.rolling_text = self.rolling_text[-max_rolling:]
@@ -48,6 +75,10 @@ class SessionState:
             self.last_activity = current_time
             self.last_seen = current_time
     
+    def lecture_time(self, epoch: float) -> float:
+        """Seconds since the session started for a wall-clock timestamp."""
+        return max(0.0, epoch - self.start_ts)
+    
     def get_recent_text(self, count: int = 20) -> str:
         """Get recent text entries joined together."""
         recent = self.rolling_text[-count:] if self.rolling_text else []
@@ -85,6 +116,55 @@ class SessionManager:
     def __init__(self):
         self.sessions: Dict[str, SessionState] = {}
         self.queue: List[QueueItem] = []
+        # Called with (session, reason) whenever a session ends: "end", "expired" or "inactive"
+        self.on_session_end: List[Callable[[SessionState, str], None]] = []
+        # Bumped on every session/queue change so queue streams can wait for one
+        self.version = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._changed_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _notify(self):
+        """Wake everyone waiting in wait_for_change()."""
+        self.version += 1
+        event, loop = self._changed, self._changed_loop
+        if event is None:
+            return
+        self._changed = None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            event.set()
+        else:
+            # Sync endpoints run in the threadpool
+            loop.call_soon_threadsafe(event.set)
+    
+    async def wait_for_change(self, version: int, timeout: float) -> int:
+        """
+        Wait until the sessions or queue change after ``version``, or ``timeout`` passes.
+        
+        Returns:
+            The current version
+        """
+        if self.version != version:
+            return self.version
+        if self._changed is None:
+            self._changed = asyncio.Event()
+            self._changed_loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.version
+    
+    def _ended(self, session: SessionState, reason: str):
+        for callback in self.on_session_end:
+            try:
+                callback(session, reason)
+            except Exception as e:
+                logger.error("Session end hook failed",
+                             extra={"session": session.session_id, "stage": "session_end", "error": str(e)})
     
     def cleanup_expired(self):
         """Remove expired sessions."""
@@ -93,14 +173,19 @@ class SessionManager:
             if session.is_expired()
         ]
         for session_id in expired_ids:
-            del self.sessions[session_id]
+            self._ended(self.sessions.pop(session_id), "expired")
+        if expired_ids:
+            self._notify()
         return len(expired_ids)
     
     def cleanup_queue(self):
         """Remove expired queue items."""
         initial_size = len(self.queue)
         self.queue = [item for item in self.queue if not item.is_expired()]
-        return initial_size - len(self.queue)
+        removed = initial_size - len(self.queue)
+        if removed:
+            self._notify()  # everyone behind them moved up
+        return removed
     
     def cleanup_inactive(self):
         """Remove inactive sessions (garbage collection)."""
@@ -109,20 +194,31 @@ class SessionManager:
             if session.is_inactive()
         ]
         for session_id in inactive_ids:
-            del self.sessions[session_id]
+            self._ended(self.sessions.pop(session_id), "inactive")
+        if inactive_ids:
+            self._notify()
         return len(inactive_ids)
     
     def gc(self):
-        """Run garbage collection - remove expired and inactive sessions and queue items."""
+        """
+        Run garbage collection - remove expired and inactive sessions and queue items,
+        then hand any capacity that freed up to queued clients.
+        """
         expired_count = self.cleanup_expired()
         inactive_count = self.cleanup_inactive()
         queue_cleaned = self.cleanup_queue()
+        admission.sample_sessions(len(self.sessions))
+        self.promote_waiting()
         return expired_count + inactive_count + queue_cleaned
     
+    def capacity(self) -> int:
+        """Maximum concurrent sessions, as estimated by the admission controller."""
+        return admission.capacity()
+    
     def can_create_session(self) -> bool:
         """Check if we can create a new session (under capacity)."""
-        self.gc()  # Clean up expired and inactive sessions first
-        return len(self.sessions) < settings.MAX_CONCURRENT_SESSIONS
+        self.gc()  # Clean up expired and inactive sessions first (and serve the queue)
+        return len(self.sessions) < self.capacity()
     
     def get_or_create_session(self, session_id: str) -> Optional[SessionState]:
         """Get existing session or create new one if capacity allows."""
@@ -134,6 +230,7 @@ class SessionManager:
         
         session = SessionState(session_id=session_id)
         self.sessions[session_id] = session
+        self._notify()
         return session
     
     def get_session(self, session_id: str) -> Optional[SessionState]:
@@ -142,13 +239,11 @@ class SessionManager:
         return self.sessions.get(session_id)
     
     def remove_session(self, session_id: str):
-        """Remove a specific session and promote next in queue."""
+        """Remove a specific session and promote queued clients into the freed capacity."""
         if session_id in self.sessions:
-            del self.sessions[session_id]
-            # Promote next client from queue
-            promoted_client = self.promote_next_in_queue()
-            if promoted_client:
-                print(f"Promoted client {promoted_client} from queue to active session")
+            self._ended(self.sessions.pop(session_id), "end")
+            self._notify()
+            self.gc()  # promotes from the queue
     
     def get_active_count(self) -> int:
         """Get count of active sessions."""
@@ -175,22 +270,25 @@ class SessionManager:
         # Check if client is already in queue
         for i, item in enumerate(self.queue):
             if item.client_id == client_id:
+                item.touch()
                 return {
                     "status": "queued", 
                     "position": i + 1, 
                     "size": len(self.queue)
                 }
         
-        # Check if we have capacity
-        if len(self.sessions) < settings.MAX_CONCURRENT_SESSIONS:
+        # Check if we have capacity (gc() above already served the queue)
+        if len(self.sessions) < self.capacity():
             # Create session immediately
             session = SessionState(session_id=client_id)
             self.sessions[client_id] = session
+            self._notify()
             return {"status": "active"}
         
         # Add to queue
         queue_item = QueueItem(client_id=client_id)
         self.queue.append(queue_item)
+        self._notify()
         return {
             "status": "queued", 
             "position": len(self.queue), 
@@ -208,9 +306,10 @@ class SessionManager:
         if client_id in self.sessions:
             return {"status": "active"}
         
-        # Check if client is in queue
+        # Check if client is in queue (asking counts as still waiting)
         for i, item in enumerate(self.queue):
             if item.client_id == client_id:
+                item.touch()
                 return {
                     "status": "queued", 
                     "position": i + 1, 
@@ -219,22 +318,58 @@ class SessionManager:
         
         return {"status": "none"}
     
+    def promote_waiting(self) -> List[str]:
+        """Promote queued clients, in order, while there is capacity for them."""
+        promoted = []
+        if not self.queue:
+            return promoted
+        capacity = self.capacity()
+        while self.queue and len(self.sessions) < capacity:
+            promoted.append(self._promote(self.queue.pop(0)))
+        for client_id in promoted:
+            logger.info("Promoted queued client to an active session", extra={"session": client_id, "stage": "queue"})
+        return promoted
+    
     def promote_next_in_queue(self):
-        """Promote next client from queue to active session."""
+        """Promote next client from queue to active session, regardless of capacity."""
         self.gc()  # Clean up first
         
         if not self.queue:
             return None
         
-        # Get next client from queue
-        next_item = self.queue.pop(0)
-        client_id = next_item.client_id
+        return self._promote(self.queue.pop(0))
+    
+    def _promote(self, item: QueueItem) -> str:
+        """Create the session for a client taken off the queue."""
+        client_id = item.client_id
+        QUEUE_WAIT_SECONDS.observe(time.time() - item.enqueued_at)
         
         # Create session for them
         session = SessionState(session_id=client_id)
         self.sessions[client_id] = session
+        self._notify()
         
         return client_id
+    
+    async def run_gc_loop(self, interval: float = 1.0):
+        """
+        Background task: expire sessions and queue entries and promote queued
+        clients as capacity frees up, so promotion doesn't wait for a request.
+        """
+        while True:
+            try:
+                self.gc()
+            except Exception as e:
+                logger.error("Session GC failed", extra={"stage": "session_gc", "error": str(e)})
+            await asyncio.sleep(interval)
 
 # Global session manager instance
-session_manager = SessionManager()
\ No newline at end of file
+session_manager = SessionManager()
+
+# Sampled at scrape time so the hot path pays nothing for them
+registry.gauge("captiflo_active_sessions", "Sessions currently holding capacity").set_function(
+    lambda: len(session_manager.sessions)
+)
+registry.gauge("captiflo_queue_length", "Clients waiting for a session").set_function(
+    lambda: len(session_manager.queue)
+)
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Startup profiling: where cold start time goes.
+
+ImportTimer is a sys.meta_path hook that times each module's execution the
+way ``python -X importtime`` does (cumulative and self time), without needing
+the interpreter flag. StartupReport adds named phases (model load, static
+manifest, ...) and is logged once startup finishes and served at
+/debug/startup. Imported first by main.py so it sees every later import; the
+hook is removed when startup is done, so requests never pay for it.
+"""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ImportTimer:
+    """Records (cumulative, self) seconds per imported module."""
+
+    def __init__(self):
+        self.records: Dict[str, Tuple[float, float]] = {}
+        self._local = threading.local()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        # Let the real finders locate the module, then time its loader
+        self._local.finding = True
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                find = getattr(finder, "find_spec", None)
+                if finder is self or find is None:
+                    continue
+                spec = find(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            self._local.finding = False
+
+        loader = spec.loader if spec is not None else None
+        exec_module = getattr(loader, "exec_module", None)
+        # Builtin/frozen importers are shared classes - cheap, and not ours to patch
+        if exec_module is None or isinstance(loader, type):
+            return spec
+
+        def timed_exec_module(module, _exec_module=exec_module):
+            stack = self._local.__dict__.setdefault("stack", [])
+            children = [0.0]
+            stack.append(children)
+            started = time.perf_counter()
+            try:
+                _exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - started
+                stack.pop()
+                if stack:
+                    stack[-1][0] += elapsed
+                self.records[fullname] = (elapsed, elapsed - children[0])
+
+        try:
+            loader.exec_module = timed_exec_module
+        except (AttributeError, TypeError):
+            pass
+        return spec
+
+    def slowest(self, limit: int = 20) -> List[dict]:
+        """Modules by cumulative import time."""
+        ranked = sorted(self.records.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [{"module": name, "cumulative": round(cum, 4), "self": round(own, 4)} for name, (cum, own) in ranked]
+
+    def by_package(self, limit: int = 15) -> List[dict]:
+        """Self time summed per top-level package - what a dependency costs overall."""
+        totals: Dict[str, float] = {}
+        for name, (_, own) in self.records.items():
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0.0) + own
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{"package": package, "seconds": round(seconds, 4)} for package, seconds in ranked]
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = ImportTimer()
+        self.phases: Dict[str, float] = {}
+        self.ready: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a named startup step (can also be used after startup, e.g. lazy model loads)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def finish(self):
+        """Mark the app ready, stop timing imports and log the report."""
+        self.ready = round(time.perf_counter() - self.started, 4)
+        self.imports.uninstall()
+        logger.info("Startup finished", extra={
+            "stage": "startup",
+            "duration_ms": round(self.ready * 1000, 1),
+            "phases": dict(self.phases),
+            "heaviest_imports": {entry["package"]: entry["seconds"] for entry in self.imports.by_package(5)},
+        })
+
+    def snapshot(self, limit: int = 25) -> dict:
+        return {
+            "ready_seconds": self.ready,
+            "phases": dict(self.phases),
+            "modules_timed": len(self.imports.records),
+            "packages": self.imports.by_package(),
+            "imports": self.imports.slowest(limit),
+        }
+
+# Global report - main.py installs the import timer before anything else
+startup_report = StartupReport()
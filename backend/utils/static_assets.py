@@ -0,0 +1,200 @@
+"""
+Static frontend serving from a startup manifest.
+
+The built frontend is small and never changes while the server runs, so it is
+read once at startup: each file's bytes, content type, ETag and compressed
+variants (prebuilt .br/.gz next to the file, or gzip/brotli made at startup)
+go into an in-memory manifest. Requests are a dict lookup - no stat, open or
+compression on the path that shares a process with audio ingest. Hashed Vite
+bundles are cached by browsers forever; everything else revalidates by ETag.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+from starlette.responses import PlainTextResponse, Response
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STATIC_RESPONSES = registry.counter(
+    "captiflo_static_responses_total", "Static file responses by status and content encoding",
+    ["status", "encoding"]
+)
+
+# The Windows registry can map .js to text/plain, which browsers refuse to execute
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("text/css", ".css")
+
+# Vite names bundles like index-DZ0QbUwE.js
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/wasm")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+class StaticAsset:
+    __slots__ = ("body", "media_type", "etag", "cache_control", "variants")
+
+    def __init__(self, body: bytes, media_type: str, etag: str, cache_control: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variants: Dict[str, bytes] = {}  # content-coding -> compressed body
+
+def _brotli():
+    try:
+        import brotli  # optional dependency, only used to precompress at startup
+        return brotli
+    except ImportError:
+        return None
+
+def accepted_encodings(header: str) -> set:
+    """Content-codings the client accepts (q=0 excluded)."""
+    accepted = set()
+    for part in header.lower().split(","):
+        name, *params = [token.strip() for token in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for this header)."""
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:  # no str.removeprefix on Python 3.8
+            return True
+    return False
+
+class StaticAssets:
+    """
+    ASGI app serving a directory from an in-memory manifest.
+
+    Args:
+        directory: Built frontend (index.html at its root)
+        precompress: Make gzip (and brotli, if installed) variants for files
+            that have no prebuilt .gz/.br
+        min_compress_bytes: Smaller files are always sent uncompressed
+    """
+    def __init__(self, directory: str, precompress: bool = True, min_compress_bytes: int = 1024):
+        self.directory = directory
+        self.precompress = precompress
+        self.min_compress_bytes = min_compress_bytes
+        self.files: Dict[str, StaticAsset] = {}
+        self.build()
+
+    def build(self):
+        """Read the directory into the manifest."""
+        brotli = _brotli() if self.precompress else None
+        files: Dict[str, StaticAsset] = {}
+        total = compressed = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith((".br", ".gz")):
+                    continue
+                path = os.path.join(root, name)
+                key = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    body = f.read()
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                hashed = key.startswith("assets/") and HASHED_NAME.search(name) is not None
+                asset = StaticAsset(
+                    body, media_type,
+                    etag='"%s"' % hashlib.sha1(body).hexdigest()[:20],
+                    cache_control=IMMUTABLE if hashed else REVALIDATE,
+                )
+                if len(body) >= self.min_compress_bytes and media_type.startswith(COMPRESSIBLE):
+                    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                        if os.path.isfile(path + suffix):
+                            with open(path + suffix, "rb") as f:
+                                asset.variants[encoding] = f.read()
+                    if self.precompress and "gzip" not in asset.variants:
+                        asset.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+                    if brotli is not None and "br" not in asset.variants:
+                        asset.variants["br"] = brotli.compress(body, quality=11)
+                    # Keep only variants that are actually smaller
+                    asset.variants = {enc: data for enc, data in asset.variants.items() if len(data) < len(body)}
+                files[key] = asset
+                total += len(body)
+                compressed += min([len(body)] + [len(data) for data in asset.variants.values()])
+        self.files = files
+        logger.info("Static manifest loaded", extra={
+            "stage": "static", "files": len(files), "path": self.directory,
+            "kib": round(total / 1024), "compressed_kib": round(compressed / 1024)})
+
+    def lookup(self, path: str) -> Optional[StaticAsset]:
+        key = path.lstrip("/")
+        if key == "" or key.endswith("/"):
+            key += "index.html"
+        asset = self.files.get(key)
+        if asset is None:
+            asset = self.files.get(key.rstrip("/") + "/index.html")
+        return asset
+
+    def manifest(self) -> dict:
+        """Summary for debugging: path -> size, encodings and caching."""
+        return {
+            key: {
+                "bytes": len(asset.body),
+                "encodings": {enc: len(data) for enc, data in asset.variants.items()},
+                "etag": asset.etag,
+                "cache_control": asset.cache_control,
+            }
+            for key, asset in sorted(self.files.items())
+        }
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        asset = self.lookup(path)
+        if asset is None:
+            STATIC_RESPONSES.labels(status="404", encoding="identity").inc()
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        encoding = "identity"
+        if asset.variants:
+            accepted = accepted_encodings(headers.get("accept-encoding", ""))
+            for candidate in ("br", "gzip"):
+                if candidate in asset.variants and (candidate in accepted or "*" in accepted):
+                    encoding = candidate
+                    break
+
+        # Each encoding is a different representation, so it gets its own validator
+        etag = asset.etag if encoding == "identity" else f'{asset.etag[:-1]}-{encoding}"'
+        response_headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if asset.variants:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        if etag_matches(headers.get("if-none-match", ""), etag):
+            STATIC_RESPONSES.labels(status="304", encoding=encoding).inc()
+            await Response(status_code=304, headers=response_headers)(scope, receive, send)
+            return
+
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        body = asset.variants.get(encoding, asset.body)
+        STATIC_RESPONSES.labels(status="200", encoding=encoding).inc()
+        await Response(body, media_type=asset.media_type, headers=response_headers)(scope, receive, send)
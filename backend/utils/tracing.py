@@ -0,0 +1,135 @@
+"""
+Lightweight in-process tracer for end-to-end caption latency.
+
+Each sampled audio chunk gets a Trace carrying the client capture timestamp and
+a server trace ID. Pipeline stages record spans on it, and the trace is closed
+when its caption is emitted over /captions (or when the chunk produced no text).
+"""
+import hashlib
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from typing import Deque, Dict, List, Optional
+from settings import settings
+from utils.metrics import registry
+
+E2E_SECONDS = registry.histogram(
+    "captiflo_caption_e2e_seconds", "Capture-to-caption latency for sampled chunks",
+    buckets=(0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+)
+
+class Trace:
+    __slots__ = ("trace_id", "session_id", "capture_ts", "received_ts", "_t0", "spans", "outcome", "e2e")
+
+    def __init__(self, session_id: str, capture_ts: Optional[float] = None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.capture_ts = capture_ts  # client wall clock, seconds
+        self.received_ts = time.time()  # server wall clock, seconds
+        self._t0 = time.perf_counter()
+        self.spans: List[tuple] = []  # (name, offset_ms, duration_ms)
+        self.outcome = None
+        self.e2e: Optional[float] = None
+
+    def add_span(self, name: str, start: float, end: float):
+        """Record a span given perf_counter start/end values."""
+        self.spans.append((name, round((start - self._t0) * 1000, 3), round((end - start) * 1000, 3)))
+
+    def mark(self, name: str):
+        """Record an instantaneous event (zero-length span)."""
+        now = time.perf_counter()
+        self.add_span(name, now, now)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "session": session_digest(self.session_id),
+            "capture_ts": self.capture_ts,
+            "received_ts": self.received_ts,
+            "spans": [{"name": n, "offset_ms": o, "duration_ms": d} for n, o, d in self.spans],
+            "outcome": self.outcome,
+            "e2e_ms": round(self.e2e * 1000, 3) if self.e2e is not None else None,
+        }
+
+def session_digest(session_id: str) -> str:
+    """Short one-way tag for a session ID - debug output must never expose the ID itself,
+    since it is the only credential for the session's endpoints."""
+    return hashlib.sha256(session_id.encode()).hexdigest()[:12]
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.1, max_traces: int = 512,
+                 max_sessions: int = 256, per_session: int = 1000):
+        self.sample_rate = sample_rate
+        self.finished: Deque[Trace] = deque(maxlen=max_traces)
+        self.max_sessions = max_sessions
+        self.per_session = per_session
+        self.latencies: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    def start(self, session_id: str, capture_ts: Optional[float] = None) -> Optional[Trace]:
+        """Start a trace for a chunk, or return None if it isn't sampled."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return Trace(session_id, capture_ts)
+
+    @contextmanager
+    def _span(self, trace: Trace, name: str):
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            trace.add_span(name, start, time.perf_counter())
+
+    def span(self, trace: Optional[Trace], name: str):
+        """Context manager recording a span; a no-op for unsampled chunks."""
+        if trace is None:
+            return nullcontext()
+        return self._span(trace, name)
+
+    def finish(self, trace: Optional[Trace], outcome: str = "emitted"):
+        """Close a trace. Only emitted captions count toward end-to-end latency."""
+        if trace is None or trace.outcome is not None:
+            return
+        trace.outcome = outcome
+        if outcome == "emitted":
+            origin = trace.capture_ts if trace.capture_ts is not None else trace.received_ts
+            trace.e2e = max(0.0, time.time() - origin)
+            E2E_SECONDS.observe(trace.e2e)
+            samples = self.latencies.get(trace.session_id)
+            if samples is None:
+                samples = deque(maxlen=self.per_session)
+                self.latencies[trace.session_id] = samples
+                if len(self.latencies) > self.max_sessions:
+                    self.latencies.popitem(last=False)
+            else:
+                self.latencies.move_to_end(trace.session_id)
+            samples.append(trace.e2e)
+        self.finished.append(trace)
+
+    def recent(self, session_id: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Most recent finished traces, newest first."""
+        traces = [t for t in reversed(self.finished) if session_id is None or t.session_id == session_id]
+        return [t.to_dict() for t in traces[:limit]]
+
+    def latency_summary(self, session_id: Optional[str] = None) -> Dict[str, dict]:
+        """p50/p95/p99 end-to-end latency (ms) per session, keyed by session_digest()."""
+        summary = {}
+        for sid, samples in list(self.latencies.items()):
+            if session_id is not None and sid != session_id:
+                continue
+            ordered = sorted(samples)
+            summary[session_digest(sid)] = {
+                "count": len(ordered),
+                **{f"p{p}_ms": round(_percentile(ordered, p) * 1000, 3) for p in (50, 95, 99)},
+            }
+        return summary
+
+# Global tracer instance
+tracer = Tracer(sample_rate=settings.TRACE_SAMPLE_RATE)
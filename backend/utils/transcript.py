@@ -0,0 +1,147 @@
+"""
+Array-backed transcript timeline with segment and word timings.
+
+Whisper reports times relative to the audio it was given, which for live
+chunks is the VAD-compacted slice of one upload. The ingest path maps those
+back onto lecture time (seconds since the session started) before storing
+them here. Numeric columns live in ``array`` buffers, so a 40 minute lecture
+costs a few hundred KB rather than one Python object per word.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+import numpy as np
+
+SAMPLE_RATE = 16000
+VAD_FRAME = 480  # samples per VAD frame (30 ms), see asr.apply_vad
+
+def source_time(t: float, kept_frames: Optional[np.ndarray]) -> float:
+    """
+    Map a time in VAD-compacted audio back to the time in the original chunk.
+
+    Args:
+        t: Seconds into the audio that was transcribed
+        kept_frames: Indices of the VAD frames that were kept (None if no VAD)
+    """
+    if kept_frames is None or len(kept_frames) == 0:
+        return t
+    sample = max(0.0, t * SAMPLE_RATE)
+    index = min(int(sample // VAD_FRAME), len(kept_frames) - 1)
+    offset = sample - index * VAD_FRAME
+    return (int(kept_frames[index]) * VAD_FRAME + offset) / SAMPLE_RATE
+
+class TranscriptTimeline:
+    def __init__(self):
+        # One entry per segment, kept in time order
+        self.seg_start = array("d")
+        self.seg_end = array("d")
+        self.seg_logprob = array("f")
+        self.seg_no_speech = array("f")
+        self.seg_word_offset = array("I")  # first word of the segment in the word columns
+        self.seg_word_count = array("I")
+        self.seg_text: List[str] = []
+        # One entry per word, in arrival order (segments index into them)
+        self.word_start = array("d")
+        self.word_end = array("d")
+        self.word_prob = array("f")
+        self.word_text: List[str] = []
+        # Live chunks are stored from inference threads while requests read on the loop
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.seg_start)
+
+    def _overlap(self, index: int, start: float, end: float) -> float:
+        if 0 <= index < len(self.seg_start):
+            return max(0.0, min(end, self.seg_end[index]) - max(start, self.seg_start[index]))
+        return 0.0
+
+    def add_segments(self, segments, chunk_start: float, kept_frames: Optional[np.ndarray] = None) -> int:
+        """
+        Store Whisper segments decoded from one chunk. Chunks may arrive out
+        of order (the client posts them in parallel), so segments are
+        inserted by start time.
+
+        Args:
+            segments: faster-whisper segments (start/end/text/avg_logprob/no_speech_prob/words)
+            chunk_start: Lecture time (s) at which the chunk's audio begins
+            kept_frames: VAD frame map for the chunk, see source_time()
+
+        Returns:
+            Number of segments stored; segments mostly covered by one already
+            stored (overlapping windows) are skipped
+        """
+        with self._lock:
+            added = 0
+            for segment in segments:
+                text = segment.text.strip()
+                if not text:
+                    continue
+                start = chunk_start + source_time(segment.start, kept_frames)
+                end = max(start, chunk_start + source_time(segment.end, kept_frames))
+                index = bisect_left(self.seg_start, start)
+                duration = max(end - start, 1e-3)
+                if max(self._overlap(index - 1, start, end), self._overlap(index, start, end)) > duration / 2:
+                    continue  # already transcribed from an overlapping window
+                # Words that fall inside a neighbouring segment were already stored with it
+                low = self.seg_end[index - 1] if index > 0 else float("-inf")
+                high = self.seg_start[index] if index < len(self.seg_start) else float("inf")
+                offset = len(self.word_text)
+                for word in getattr(segment, "words", None) or []:
+                    word_start = chunk_start + source_time(word.start, kept_frames)
+                    word_end = chunk_start + source_time(word.end, kept_frames)
+                    if (word_start + word_end) / 2 < low or (word_start + word_end) / 2 > high:
+                        continue
+                    self.word_start.append(word_start)
+                    self.word_end.append(word_end)
+                    self.word_prob.append(getattr(word, "probability", 1.0))
+                    self.word_text.append(word.word)
+                self.seg_start.insert(index, start)
+                self.seg_end.insert(index, end)
+                self.seg_logprob.insert(index, getattr(segment, "avg_logprob", 0.0))
+                self.seg_no_speech.insert(index, getattr(segment, "no_speech_prob", 0.0))
+                self.seg_word_offset.insert(index, offset)
+                self.seg_word_count.insert(index, len(self.word_text) - offset)
+                self.seg_text.insert(index, text)
+                added += 1
+            return added
+
+    def _indices(self, since: float, min_logprob: Optional[float], max_no_speech: Optional[float]) -> List[int]:
+        first = bisect_left(self.seg_start, since)
+        while first > 0 and self.seg_end[first - 1] > since:
+            first -= 1  # starts before ``since`` but runs past it
+        return [
+            i for i in range(first, len(self.seg_start))
+            if (min_logprob is None or self.seg_logprob[i] >= min_logprob)
+            and (max_no_speech is None or self.seg_no_speech[i] <= max_no_speech)
+        ]
+
+    def text(self, since: float = 0.0, min_logprob: Optional[float] = None,
+             max_no_speech: Optional[float] = None) -> str:
+        """Transcript text from lecture time ``since``, optionally without low-confidence segments."""
+        with self._lock:
+            return " ".join(self.seg_text[i] for i in self._indices(since, min_logprob, max_no_speech))
+
+    def export(self, since: float = 0.0, min_logprob: Optional[float] = None,
+               max_no_speech: Optional[float] = None, words: bool = True) -> List[dict]:
+        """Segments (and their words) with lecture-relative timings."""
+        with self._lock:
+            result = []
+            for i in self._indices(since, min_logprob, max_no_speech):
+                entry = {
+                    "start": round(self.seg_start[i], 3),
+                    "end": round(self.seg_end[i], 3),
+                    "text": self.seg_text[i],
+                    "avg_logprob": round(self.seg_logprob[i], 4),
+                    "no_speech_prob": round(self.seg_no_speech[i], 4),
+                }
+                if words:
+                    first = self.seg_word_offset[i]
+                    entry["words"] = [
+                        {"start": round(self.word_start[j], 3), "end": round(self.word_end[j], 3),
+                         "word": self.word_text[j], "probability": round(self.word_prob[j], 4)}
+                        for j in range(first, first + self.seg_word_count[i])
+                    ]
+                result.append(entry)
+            return result
@@ -1,88 +1,198 @@
-// AudioWorklet processor for PCM audio processing
+// AudioWorklet processor for PCM audio processing.
+// Runs on the audio thread, so process() allocates nothing per render quantum:
+// resampled audio goes into a preallocated Float32Array ring buffer and only
+// the outgoing 1s Int16Array chunk is allocated (and transferred, not copied).
 class PcmProcessor extends AudioWorkletProcessor {
   constructor() {
     super();
-    this.buffer = [];
-    this.sampleRate = 48000; // Default input sample rate
     this.targetSampleRate = 16000;
-    this.resampleRatio = this.sampleRate / this.targetSampleRate;
-    this.lastSample = 0;
     this.chunkSize = this.targetSampleRate; // 1 second at 16kHz
-    
-    // Listen for sample rate updates from main thread
+
+    // Ring buffer of resampled audio (room for a few chunks)
+    this.ring = new Float32Array(this.chunkSize * 4);
+    this.ringWrite = 0;
+    this.ringRead = 0;
+    this.ringCount = 0;
+
+    // `sampleRate` is the AudioWorkletGlobalScope's context rate
+    this.configureResampler(typeof sampleRate !== 'undefined' ? sampleRate : 48000);
+
+    // Client-side VAD, same gate as asr.apply_vad: a chunk is speech if any
+    // 30ms frame reaches the RMS threshold of the session's VAD level
+    this.vadEnabled = true;
+    this.vadThresholds = [150, 300, 500, 800]; // int16 RMS for sensitivity levels 0-3
+    this.vadThreshold = this.vadThresholds[1];
+    this.frameSize = 480; // 30ms at 16kHz
+    this.heartbeatChunks = 5; // silent chunks between heartbeats
+    this.silentChunks = 0;
+
+    // Listen for sample rate / VAD updates from main thread
     this.port.onmessage = (event) => {
       if (event.data.type === 'setSampleRate') {
-        this.sampleRate = event.data.sampleRate;
-        this.resampleRatio = this.sampleRate / this.targetSampleRate;
+        if (event.data.sampleRate !== this.sampleRate) {
+          this.configureResampler(event.data.sampleRate);
+        }
+      } else if (event.data.type === 'setVad') {
+        const level = Math.max(0, Math.min(3, Math.floor(event.data.level ?? 1)));
+        this.vadThreshold = this.vadThresholds[level];
+        this.vadEnabled = event.data.enabled !== false;
       }
     };
   }
 
+  // Polyphase windowed-sinc resampler for sampleRate -> 16kHz. The rate ratio
+  // is reduced to up/down factors L/M (48k: 1/3, 44.1k: 160/441); a Blackman-
+  // windowed low-pass at 0.85x the output Nyquist is designed at the upsampled
+  // rate and split into L phases of `taps` coefficients each.
+  configureResampler(inputRate) {
+    const gcd = (a, b) => (b ? gcd(b, a % b) : a);
+    const divisor = gcd(Math.round(inputRate), this.targetSampleRate);
+    this.sampleRate = inputRate;
+    this.up = this.targetSampleRate / divisor;
+    this.down = Math.round(inputRate) / divisor;
+    this.passthrough = this.up === this.down;
+    this.taps = 64;
+    this.phase = 0; // position of the next output on the upsampled grid, relative to the current block
+
+    const length = this.up * this.taps;
+    const cutoff = 0.85 / (2 * Math.max(this.up, this.down)); // cycles per upsampled sample
+    const center = (length - 1) / 2;
+    // Coefficients stored per phase: filter[p * taps + j] = h[p + j * up]
+    this.filter = new Float32Array(length);
+    for (let k = 0; k < length; k++) {
+      const x = k - center;
+      const sinc = x === 0 ? 1 : Math.sin(2 * Math.PI * cutoff * x) / (2 * Math.PI * cutoff * x);
+      const taper = 0.42 - 0.5 * Math.cos((2 * Math.PI * k) / (length - 1)) + 0.08 * Math.cos((4 * Math.PI * k) / (length - 1));
+      const p = k % this.up;
+      const j = (k - p) / this.up;
+      this.filter[p * this.taps + j] = this.up * 2 * cutoff * sinc * taper;
+    }
+
+    // Input history (taps - 1 samples) followed by the current render quantum
+    this.history = this.taps - 1;
+    this.work = new Float32Array(this.history + 128);
+  }
+
   process(inputs, outputs, parameters) {
     const input = inputs[0];
-    
+
     if (input && input.length > 0) {
       const inputChannel = input[0]; // Use first channel (mono)
-      
-      // Resample and convert to mono
-      const resampled = this.resample(inputChannel);
-      
-      // Add to buffer
-      this.buffer.push(...resampled);
-      
+
+      // Resample straight into the ring buffer
+      this.resample(inputChannel);
+
       // Send chunks when we have enough data (1 second worth)
-      while (this.buffer.length >= this.chunkSize) {
-        const chunk = this.buffer.splice(0, this.chunkSize);
-        const pcmBytes = this.float32ToInt16LE(chunk);
-        
+      while (this.ringCount >= this.chunkSize) {
+        const pcm = this.readChunk();
+
+        if (this.vadEnabled && !this.hasSpeech(pcm)) {
+          // The server would drop this chunk whole - send a periodic heartbeat instead
+          this.silentChunks++;
+          if (this.silentChunks % this.heartbeatChunks === 0) {
+            this.port.postMessage({ type: 'heartbeat', silentChunks: this.heartbeatChunks });
+          }
+          continue;
+        }
+
+        this.silentChunks = 0;
         this.port.postMessage({
           type: 'audioChunk',
-          data: pcmBytes
-        });
+          data: pcm,
+          speech: this.vadEnabled
+        }, [pcm.buffer]);
       }
     }
-    
+
     return true; // Keep processor alive
   }
 
-  // Simple linear interpolation resampling
+  writeSample(value) {
+    this.ring[this.ringWrite] = value;
+    this.ringWrite = (this.ringWrite + 1) % this.ring.length;
+    if (this.ringCount === this.ring.length) {
+      // Consumer fell behind - drop the oldest sample
+      this.ringRead = (this.ringRead + 1) % this.ring.length;
+    } else {
+      this.ringCount++;
+    }
+  }
+
   resample(inputSamples) {
-    if (this.resampleRatio === 1) {
-      return Array.from(inputSamples);
+    const count = inputSamples.length;
+    if (this.passthrough) {
+      for (let i = 0; i < count; i++) {
+        this.writeSample(inputSamples[i]);
+      }
+      return;
     }
-    
-    const outputLength = Math.floor(inputSamples.length / this.resampleRatio);
-    const output = new Array(outputLength);
-    
-    for (let i = 0; i < outputLength; i++) {
-      const srcIndex = i * this.resampleRatio;
-      const srcIndexFloor = Math.floor(srcIndex);
-      const srcIndexCeil = Math.min(srcIndexFloor + 1, inputSamples.length - 1);
-      const fraction = srcIndex - srcIndexFloor;
-      
-      // Linear interpolation
-      const sample1 = inputSamples[srcIndexFloor] || 0;
-      const sample2 = inputSamples[srcIndexCeil] || 0;
-      output[i] = sample1 + (sample2 - sample1) * fraction;
+
+    if (this.work.length < this.history + count) {
+      // Render quanta are 128 frames; only grows if a browser hands us more
+      const work = new Float32Array(this.history + count);
+      work.set(this.work.subarray(0, this.history));
+      this.work = work;
+    }
+    const work = this.work;
+    const history = this.history;
+    work.set(inputSamples, history);
+
+    // Output m sits at upsampled position phase + m * down; its newest input
+    // sample is n = floor(position / up) and its filter phase is position % up
+    const up = this.up;
+    const taps = this.taps;
+    const filter = this.filter;
+    let position = this.phase;
+    while (true) {
+      const n = Math.floor(position / up);
+      if (n >= count) break;
+      const offset = (position - n * up) * taps;
+      const newest = history + n;
+      let acc = 0;
+      for (let j = 0; j < taps; j++) {
+        acc += filter[offset + j] * work[newest - j];
+      }
+      this.writeSample(acc);
+      position += this.down;
     }
-    
-    return output;
+    this.phase = position - count * up;
+
+    // Keep the last taps - 1 input samples for the next quantum
+    work.copyWithin(0, count, count + history);
   }
 
-  // Convert Float32 samples to Int16 little-endian bytes
-  float32ToInt16LE(samples) {
-    const buffer = new ArrayBuffer(samples.length * 2);
-    const view = new DataView(buffer);
-    
-    for (let i = 0; i < samples.length; i++) {
+  // Take one chunk from the ring buffer as 16-bit PCM. Int16Array uses the
+  // platform's byte order, which is little-endian on every browser target.
+  readChunk() {
+    const pcm = new Int16Array(this.chunkSize);
+    for (let i = 0; i < this.chunkSize; i++) {
+      const sample = this.ring[this.ringRead];
+      this.ringRead = (this.ringRead + 1) % this.ring.length;
       // Clamp to [-1, 1] and convert to 16-bit signed integer
-      const clamped = Math.max(-1, Math.min(1, samples[i]));
-      const int16Value = Math.round(clamped * 32767);
-      view.setInt16(i * 2, int16Value, true); // true = little-endian
+      const clamped = sample < -1 ? -1 : sample > 1 ? 1 : sample;
+      pcm[i] = Math.round(clamped * 32767);
+    }
+    this.ringCount -= this.chunkSize;
+    return pcm;
+  }
+
+  // True if any 30ms frame is loud enough to survive the server's VAD.
+  // Frames are aligned to the chunk start and the last one is zero-padded,
+  // exactly as apply_vad frames the same samples.
+  hasSpeech(samples) {
+    const threshold = this.vadThreshold * this.vadThreshold * this.frameSize;
+    for (let start = 0; start < samples.length; start += this.frameSize) {
+      const end = Math.min(start + this.frameSize, samples.length);
+      let energy = 0;
+      for (let i = start; i < end; i++) {
+        energy += samples[i] * samples[i];
+      }
+      if (energy >= threshold) {
+        return true;
+      }
     }
-    
-    return new Uint8Array(buffer);
+    return false;
   }
 }
 
-registerProcessor('pcm-processor', PcmProcessor);
\ No newline at end of file
+registerProcessor('pcm-processor', PcmProcessor);
@@ -17,11 +17,12 @@ export class ApiClient {
   }
 
   // Send audio blob to ingest endpoint
-  async sendAudioBlob(blob, sessionId, language, vadLevel) {
+  async sendAudioBlob(blob, sessionId, language, vadLevel, captureTs) {
     const url = this.buildUrl('/ingest', {
       session: sessionId,
       lang: language,
-      vad: vadLevel
+      vad: vadLevel,
+      ts: captureTs // capture time (epoch ms) for server-side latency tracing
     });
 
     const response = await fetch(url, {
@@ -36,17 +37,21 @@ export class ApiClient {
     return response;
   }
 
-  // Send raw PCM audio to ingest-raw endpoint
-  async sendRawPcm(blob, sessionId, language, vadLevel) {
+  // Send raw PCM audio to ingest-raw endpoint. `speech` is the worklet VAD's
+  // verdict; a null blob with speech=false is a heartbeat for suppressed silence
+  async sendRawPcm(blob, sessionId, language, vadLevel, captureTs, speech, silentChunks) {
     const url = this.buildUrl('/ingest-raw', {
       session: sessionId,
       lang: language,
-      vad: vadLevel
+      vad: vadLevel,
+      ts: captureTs, // capture time (epoch ms) for server-side latency tracing
+      speech: speech === undefined ? undefined : (speech ? 1 : 0),
+      silent: silentChunks
     });
 
     const response = await fetch(url, {
       method: 'POST',
-      body: blob,
+      body: blob || new Uint8Array(0),
       headers: {
         'Content-Type': 'application/octet-stream'
       }
@@ -215,4 +220,30 @@ export async function getQueueStatus(sessionId) {
   
   const response = await fetch(url.toString());
   return response.json();
-}
\ No newline at end of file
+}
+// Subscribe to server-pushed queue status (SSE). Returns the EventSource;
+// onStatus gets {status, position, size} until "active" or "none".
+export function subscribeQueueStatus(sessionId, onStatus, onError) {
+  const url = new URL('/queue/stream', window.location.origin);
+  url.searchParams.append('session', sessionId);
+
+  const source = new EventSource(url.toString());
+  const handle = (event) => onStatus(JSON.parse(event.data));
+  source.addEventListener('position', handle);
+  source.addEventListener('active', (event) => {
+    source.close();
+    handle(event);
+  });
+  source.addEventListener('none', (event) => {
+    source.close();
+    handle(event);
+  });
+  source.onerror = (error) => {
+    // Server closes the stream after the final event; anything else is a failure
+    if (source.readyState !== EventSource.CLOSED) {
+      source.close();
+      if (onError) onError(error);
+    }
+  };
+  return source;
+}
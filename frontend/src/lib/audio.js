@@ -25,7 +25,8 @@ export class WebmRecorder {
       this.mediaRecorder.ondataavailable = (event) => {
         if (event.data.size > 0 && this.onDataAvailable) {
           // Fire parallel POST - don't await
-          this.onDataAvailable(event.data, { lang, vad, session });
+          // The blob covers the last timeslice, so capture started that long ago
+          this.onDataAvailable(event.data, { lang, vad, session, captureTs: Date.now() - timeslice });
         }
       };
 
@@ -120,16 +121,28 @@ export class RawPcmRecorder {
     // Create worklet node
     this.workletNode = new AudioWorkletNode(this.audioContext, 'pcm-processor');
     
-    // Send sample rate to worklet
+    // Send sample rate and VAD level to worklet
     this.workletNode.port.postMessage({
       type: 'setSampleRate',
       sampleRate: this.sampleRate
     });
+    this.workletNode.port.postMessage({
+      type: 'setVad',
+      level: vad
+    });
     
     // Handle messages from worklet
     this.workletNode.port.onmessage = (event) => {
       if (event.data.type === 'audioChunk') {
-        this.sendPcmChunk(event.data.data, { lang, vad, session });
+        this.sendPcmChunk(event.data.data, { lang, vad, session, speech: event.data.speech });
+      } else if (event.data.type === 'heartbeat') {
+        // Silence suppressed by the worklet's VAD - keep the session alive without audio
+        if (this.onDataAvailable) {
+          this.onDataAvailable(null, {
+            lang, vad, session, isRawPcm: true, heartbeat: true,
+            silentChunks: event.data.silentChunks, captureTs: Date.now()
+          });
+        }
       }
     };
     
@@ -205,11 +218,14 @@ export class RawPcmRecorder {
     return new Uint8Array(buffer);
   }
 
-  async sendPcmChunk(pcmBytes, { lang, vad, session }) {
+  async sendPcmChunk(pcmBytes, { lang, vad, session, speech }) {
     if (this.onDataAvailable) {
       // Create a blob-like object for consistency with WebM recorder
       const pcmBlob = new Blob([pcmBytes], { type: 'application/octet-stream' });
-      this.onDataAvailable(pcmBlob, { lang, vad, session, isRawPcm: true });
+      // Chunk duration in ms (s16le = 2 bytes per sample) gives the capture start time.
+      // The worklet sends an Int16Array, the ScriptProcessor fallback a Uint8Array
+      const captureTs = Date.now() - Math.round((pcmBytes.byteLength / 2 / this.targetSampleRate) * 1000);
+      this.onDataAvailable(pcmBlob, { lang, vad, session, isRawPcm: true, captureTs, speech });
     }
   }
 
@@ -1,6 +1,6 @@
 import { create } from 'zustand';
 import { subscribeWithSelector } from 'zustand/middleware';
-import { ApiClient, LANGUAGE_MAP, generateSessionId, reserveSession, getQueueStatus } from '../lib/api';
+import { ApiClient, LANGUAGE_MAP, generateSessionId, reserveSession, getQueueStatus, subscribeQueueStatus } from '../lib/api';
 import { WebmRecorder, RawPcmRecorder } from '../lib/audio';
 
 // Create the session store with unified state management
@@ -30,6 +30,7 @@ export const useSessionStore = create(
     // Queue status
     queueStatus: null, // null | {status: "active"} | {status: "queued", position: N, size: Q}
     queuePolling: false,
+    queueStream: null, // EventSource pushing queue updates
 
     // API client
     apiClient: new ApiClient(),
@@ -150,31 +151,37 @@ export const useSessionStore = create(
       }
     },
 
-    // Start queue polling
-    startQueuePolling: async (sessionId) => {
-      const state = get();
-      
+    // Follow queue position via server-pushed updates, polling if SSE fails
+    startQueuePolling: (sessionId) => {
+      const handleStatus = async (status) => {
+        if (!get().queuePolling) return;
+
+        if (status.status === "active") {
+          // Session became active, start recording
+          set({ queuePolling: false, queueStream: null });
+          await get().startRecordingWithActiveSession(sessionId);
+        } else if (status.status === "queued") {
+          // Update queue position
+          set({ queueStatus: status });
+        } else {
+          // Session not found, stop waiting
+          set({
+            queuePolling: false,
+            queueStatus: null,
+            queueStream: null
+          });
+        }
+      };
+
       const poll = async () => {
-        if (!state.queuePolling) return;
-        
+        if (!get().queuePolling) return;
+
         try {
           const status = await getQueueStatus(sessionId);
-          
-          if (status.status === "active") {
-            // Session became active, start recording
-            set({ queuePolling: false });
-            await state.startRecordingWithActiveSession(sessionId);
-          } else if (status.status === "queued") {
-            // Update queue position
-            set({ queueStatus: status });
+          await handleStatus(status);
+          if (status.status === "queued") {
             // Poll again in 2 seconds
             setTimeout(poll, 2000);
-          } else {
-            // Session not found, stop polling
-            set({ 
-              queuePolling: false,
-              queueStatus: null 
-            });
           }
         } catch (error) {
           console.error('Queue polling error:', error);
@@ -182,16 +189,30 @@ export const useSessionStore = create(
           setTimeout(poll, 2000);
         }
       };
-      
-      // Start polling
-      setTimeout(poll, 2000);
+
+      if (typeof EventSource === 'undefined') {
+        setTimeout(poll, 2000);
+        return;
+      }
+
+      const stream = subscribeQueueStatus(sessionId, handleStatus, (error) => {
+        console.warn('Queue stream failed, falling back to polling:', error);
+        set({ queueStream: null });
+        setTimeout(poll, 2000);
+      });
+      set({ queueStream: stream });
     },
 
-    // Stop queue polling
+    // Stop queue updates
     stopQueuePolling: () => {
+      const { queueStream } = get();
+      if (queueStream) {
+        queueStream.close();
+      }
       set({ 
         queuePolling: false,
-        queueStatus: null 
+        queueStatus: null,
+        queueStream: null
       });
     },
 